@@ -9,3 +9,21 @@ def record_audit(*, actor, action, entity_type, entity_id, payload=None):
         entity_id=str(entity_id),
         payload=payload or {},
     )
+
+
+def record_audit_many(*, actor, records):
+    """Insert several audit rows in one statement; each record has ``action``, ``entity_type``, ``entity_id`` and ``payload``,
+    and may override ``actor``.
+    """
+    AuditLog.objects.bulk_create(
+        [
+            AuditLog(
+                actor=record.get("actor", actor),
+                action=record["action"],
+                entity_type=record["entity_type"],
+                entity_id=str(record["entity_id"]),
+                payload=record.get("payload") or {},
+            )
+            for record in records
+        ]
+    )
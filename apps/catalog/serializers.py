@@ -10,6 +10,29 @@ from apps.catalog.models import Brand, Product, ProductImage, ProductType
 from apps.inventory.models import InventoryMovement, MovementType
 
 
+class CartProductField(serializers.PrimaryKeyRelatedField):
+    """Product lookup served from ``context["cart_products"]``, loaded by ``load_cart_products`` in one query."""
+
+    def to_internal_value(self, data):
+        product = self.context.get("cart_products", {}).get(str(data).lower())
+        if product is not None:
+            return product
+        return super().to_internal_value(data)
+
+
+def load_cart_products(data, *, queryset=None):
+    """Products referenced by ``data["lines"][*]["product"]``, keyed by their id string."""
+    lines = data.get("lines") if hasattr(data, "get") else None
+    product_ids = set()
+    for line in lines if isinstance(lines, list) else []:
+        try:
+            product_ids.add(uuid.UUID(str(line.get("product"))))
+        except (AttributeError, ValueError):
+            continue
+    queryset = Product.objects.all() if queryset is None else queryset
+    return {str(product.pk): product for product in queryset.filter(pk__in=product_ids)} if product_ids else {}
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductImage
@@ -16,6 +16,7 @@ from apps.catalog.serializers import (
     PublicCatalogProductSerializer,
 )
 from apps.catalog.throttles import PublicCatalogAnonThrottle
+from apps.common.query_budget import QueryBudget
 from apps.common.permissions import RolePermission
 from apps.inventory.models import InventoryMovement
 
@@ -31,6 +32,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         "update": ["catalog.manage"],
         "destroy": ["catalog.manage"],
     }
+    query_budgets = {"list": QueryBudget(5)}
 
     def get_queryset(self):
         queryset = with_inventory_metrics(Product.objects.all()).prefetch_related("images")
@@ -215,6 +217,7 @@ class ProductTypeViewSet(viewsets.ModelViewSet):
 class PublicCatalogListView(generics.ListAPIView):
     serializer_class = PublicCatalogProductSerializer
     permission_classes = [AllowAny]
+    query_budgets = {"get": QueryBudget(3)}
     authentication_classes = []
     throttle_classes = [PublicCatalogAnonThrottle]
 
@@ -0,0 +1,29 @@
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def local_day_start(day: date) -> datetime:
+    """Aware datetime for 00:00 of ``day`` in the current timezone (America/Mexico_City)."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def local_date_bounds(date_from: date | None = None, date_to: date | None = None) -> tuple[datetime | None, datetime | None]:
+    """Half-open ``[start, end)`` timestamps covering whole local days; either side may be open."""
+    start = local_day_start(date_from) if date_from else None
+    end = local_day_start(date_to + timedelta(days=1)) if date_to else None
+    return start, end
+
+
+def filter_local_date_range(queryset, field: str, date_from: date | None = None, date_to: date | None = None):
+    """Filter ``field`` by local calendar days without wrapping the column in a cast.
+
+    ``field__date__gte/lte`` converts every row to the local timezone before comparing,
+    which keeps the database from using a range scan on the column's index.
+    """
+    start, end = local_date_bounds(date_from, date_to)
+    if start is not None:
+        queryset = queryset.filter(**{f"{field}__gte": start})
+    if end is not None:
+        queryset = queryset.filter(**{f"{field}__lt": end})
+    return queryset
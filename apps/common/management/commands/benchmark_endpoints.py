@@ -0,0 +1,202 @@
+import json
+import statistics
+import time
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts.models import UserRole
+from apps.catalog.models import Product
+
+ENDPOINTS = ["sales_list", "sales_create_and_confirm", "metrics", "sales_report", "products_list", "public_catalog"]
+
+
+def _percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia p50/p95, numero de queries y planes EXPLAIN de los endpoints criticos y guarda un baseline JSON. "
+        "Crea y confirma ventas reales: usar sobre una base generada con generate_load_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"Lista separada por comas: {', '.join(ENDPOINTS)}.")
+        parser.add_argument("--output", default="", help="Ruta del archivo JSON de baseline.")
+        parser.add_argument("--explain-top", type=int, default=3, help="Queries SELECT mas lentas con EXPLAIN por endpoint.")
+        parser.add_argument("--warm-cache", action="store_true", help="No limpiar la cache entre iteraciones.")
+        parser.add_argument("--date-from", default="", help="date_from para metrics/reporte (default: mes actual).")
+        parser.add_argument("--date-to", default="")
+        parser.add_argument("--username", default="", help="Usuario ADMIN a usar (default: el primero disponible).")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options["endpoints"].split(",") if name.strip()]
+        unknown = sorted(set(names) - set(ENDPOINTS))
+        if unknown:
+            raise CommandError(f"Endpoints desconocidos: {', '.join(unknown)}")
+        if options["iterations"] < 1:
+            raise CommandError("--iterations debe ser mayor a 0.")
+
+        self.user = self._admin_user(options["username"])
+        self.range_params = {key: options[key] for key in ("date_from", "date_to") if options[key]}
+        self.host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != "*" else "localhost"
+        if "sales_create_and_confirm" in names:
+            self.product = self._stocked_product(options["iterations"] + 1)
+
+        results = {}
+        for name in names:
+            results[name] = self._benchmark(name, getattr(self, f"_request_{name}"), options)
+            stats = results[name]
+            self.stdout.write(
+                f"{name}: p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms max={stats['max_ms']}ms "
+                f"queries={stats['queries']}"
+            )
+
+        baseline = {
+            "captured_at": timezone.now().isoformat(),
+            "database_vendor": connection.vendor,
+            "iterations": options["iterations"],
+            "warm_cache": options["warm_cache"],
+            "data_volume": {
+                "products": Product.objects.count(),
+                "sales": self._model_count("sales", "Sale"),
+                "inventory_movements": self._model_count("inventory", "InventoryMovement"),
+                "ledger_entries": self._model_count("ledger", "LedgerEntry"),
+            },
+            "endpoints": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                json.dump(baseline, handle, indent=2, default=str)
+            self.stdout.write(self.style.SUCCESS(f"Baseline guardado en {options['output']}"))
+        else:
+            self.stdout.write(json.dumps(baseline, indent=2, default=str))
+
+    @staticmethod
+    def _model_count(app_label, model_name):
+        return apps.get_model(app_label, model_name).objects.count()
+
+    def _admin_user(self, username):
+        users = get_user_model().objects.filter(role=UserRole.ADMIN, is_active=True).order_by("date_joined")
+        if username:
+            users = users.filter(username=username)
+        user = users.first()
+        if user is None:
+            raise CommandError("No hay usuario ADMIN activo para autenticar el benchmark.")
+        return user
+
+    def _client(self, *, authenticated=True):
+        client = APIClient(HTTP_HOST=self.host)
+        if authenticated:
+            client.force_authenticate(self.user)
+        return client
+
+    def _get(self, path, params=None, *, authenticated=True):
+        response = self._client(authenticated=authenticated).get(path, params or {}, secure=True)
+        return [response]
+
+    def _request_sales_list(self):
+        return self._get("/api/v1/sales/")
+
+    def _request_metrics(self):
+        return self._get("/api/v1/metrics/", self.range_params)
+
+    def _request_sales_report(self):
+        return self._get("/api/v1/reports/sales/", self.range_params)
+
+    def _request_products_list(self):
+        return self._get("/api/v1/products/")
+
+    def _request_public_catalog(self):
+        return self._get("/api/v1/public/catalog/", authenticated=False)
+
+    def _request_sales_create_and_confirm(self):
+        product = self.product
+        response = self._client().post(
+            "/api/v1/sales/create-and-confirm/",
+            {
+                "lines": [
+                    {
+                        "product": str(product.id),
+                        "qty": "1.00",
+                        "unit_price": str(product.default_price),
+                        "unit_cost": str(product.cost_price or Decimal("0.00")),
+                        "discount_pct": "0.00",
+                    }
+                ],
+                "payments": [{"method": "CASH", "amount": str(product.default_price)}],
+            },
+            format="json",
+            secure=True,
+        )
+        return [response]
+
+    def _stocked_product(self, iterations):
+        product = (
+            Product.objects.filter(is_active=True)
+            .annotate(stock=Sum("movements__quantity_delta"))
+            .filter(stock__gte=iterations)
+            .order_by("-stock")
+            .first()
+        )
+        if product is None:
+            raise CommandError(f"No hay productos activos con stock >= {iterations} para sales_create_and_confirm.")
+        return product
+
+    def _benchmark(self, name, request, options):
+        timings = []
+        statuses = set()
+        for _ in range(options["iterations"]):
+            if not options["warm_cache"]:
+                cache.clear()
+            started = time.perf_counter()
+            responses = request()
+            timings.append((time.perf_counter() - started) * 1000)
+            statuses.update(response.status_code for response in responses)
+
+        # Report sections run on worker threads with their own connections, which the
+        # capture below cannot see; the profiling pass runs them inline instead.
+        if not options["warm_cache"]:
+            cache.clear()
+        with override_settings(REPORT_SECTION_WORKERS=1), CaptureQueriesContext(connection) as captured:
+            request()
+
+        return {
+            "p50_ms": round(_percentile(timings, 50), 2),
+            "p95_ms": round(_percentile(timings, 95), 2),
+            "mean_ms": round(statistics.fmean(timings), 2),
+            "max_ms": round(max(timings), 2),
+            "queries": len(captured.captured_queries),
+            "status_codes": sorted(statuses),
+            "slowest_queries": self._explain(captured.captured_queries, options["explain_top"]),
+        }
+
+    def _explain(self, queries, top):
+        selects = [query for query in queries if query["sql"].lstrip().upper().startswith("SELECT")]
+        selects.sort(key=lambda query: float(query["time"]), reverse=True)
+        prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+        explained = []
+        for query in selects[:top]:
+            entry = {"time_ms": round(float(query["time"]) * 1000, 2), "sql": query["sql"]}
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(prefix + query["sql"])
+                    entry["plan"] = [" ".join(str(column) for column in row) for row in cursor.fetchall()]
+            except DatabaseError as exc:
+                # Captured SQL has parameters inlined and does not always round-trip (e.g. binary values).
+                entry["plan_error"] = str(exc)
+            explained.append(entry)
+        return explained
@@ -0,0 +1,409 @@
+import math
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from apps.accounts.models import UserRole
+from apps.catalog.models import Product
+from apps.common.metrics_cache import bump_metrics_data_version
+from apps.expenses.models import Expense, ExpenseStatus, ExpenseType
+from apps.inventory.models import InventoryMovement, MovementType
+from apps.investors.models import Investor, InvestorAssignment
+from apps.layaway.models import Customer, Layaway, LayawayLine, LayawayPayment, LayawayStatus, normalize_phone
+from apps.ledger.models import LedgerEntry, LedgerEntryType
+from apps.ledger.services import create_capital_deposit
+from apps.sales.models import (
+    CardCommissionPlan,
+    Payment,
+    PaymentMethod,
+    Sale,
+    SaleLine,
+    SaleProfitabilitySnapshot,
+    SaleStatus,
+    VoidEvent,
+)
+from apps.sales.profitability import apply_sale_profitability, money, revert_sale_profitability
+
+CATEGORIES = ["Casco", "Guantes", "Chamarra", "Llanta", "Aceite", "Balata", "Cadena", "Espejo", "Faro", "Bujia", "Filtro", "Impermeable"]
+BRANDS = ["Italika", "Honda", "Yamaha", "Suzuki", "Bajaj", "Vento", "LS2", "HJC", "Pirelli", "Motul"]
+VARIABLE_EXPENSES = [("Papeleria", 150, 900), ("Limpieza", 200, 1200), ("Mantenimiento", 500, 4500), ("Fletes", 300, 2500)]
+WEEKDAY_FACTOR = [0.9, 0.9, 1.0, 1.0, 1.15, 1.35, 0.6]
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _backdate(model, stamps, field="created_at"):
+    """Overwrite ``auto_now_add`` timestamps after insert; ``stamps`` maps pk -> datetime."""
+    for chunk in _chunks(list(stamps.items()), 500):
+        model.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+            **{field: Case(*[When(pk=pk, then=Value(stamp)) for pk, stamp in chunk], output_field=DateTimeField())}
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sinteticos con volumenes y distribuciones realistas (productos, ventas con pagos y rentabilidad, "
+        "movimientos, apartados, ledger y gastos) para pruebas de carga. No usar en produccion."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=500)
+        parser.add_argument("--days", type=int, default=730, help="Dias de historial hacia atras desde hoy.")
+        parser.add_argument("--sales-per-day", type=float, default=30.0, help="Promedio de ventas por dia habil.")
+        parser.add_argument("--investors", type=int, default=5)
+        parser.add_argument("--customers", type=int, default=300)
+        parser.add_argument("--layaways-per-week", type=float, default=4.0)
+        parser.add_argument("--void-rate", type=float, default=0.015)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--prefix", default="LOAD", help="Prefijo de SKUs y usuarios generados.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.prefix = options["prefix"]
+        if Product.objects.filter(sku__startswith=f"{self.prefix}-").exists():
+            raise CommandError(f"Ya existen datos con prefijo {self.prefix}; usa otro --prefix.")
+
+        self.today = timezone.localdate()
+        self.start_day = self.today - timedelta(days=options["days"])
+        self.stock = {}
+        self.counts = {"sales": 0, "voids": 0, "layaways": 0, "expenses": 0, "restocks": 0}
+
+        self._create_users()
+        self._create_products(options["products"], options["sales_per_day"])
+        self._create_customers(options["customers"])
+        self._create_investors(options["investors"])
+        self.plans = {plan.code: plan for plan in CardCommissionPlan.objects.filter(is_active=True)}
+
+        day = self.start_day
+        while day < self.today:
+            with transaction.atomic():
+                self._generate_day(day, options)
+            day += timedelta(days=1)
+
+        call_command("rebuild_sales_rollups", stdout=self.stdout)
+        call_command("rebuild_layaway_counters", stdout=self.stdout)
+        bump_metrics_data_version()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Datos generados desde {self.start_day}: {len(self.products)} productos, {self.counts['sales']} ventas "
+                f"({self.counts['voids']} anuladas), {self.counts['layaways']} apartados, {self.counts['expenses']} gastos, "
+                f"{self.counts['restocks']} reabastos."
+            )
+        )
+
+    def _at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+    def _create_users(self):
+        User = get_user_model()
+        self.admin, _ = User.objects.get_or_create(username=f"{self.prefix.lower()}_admin", defaults={"role": UserRole.ADMIN})
+        self.cashiers = []
+        for index in range(3):
+            cashier, _ = User.objects.get_or_create(username=f"{self.prefix.lower()}_cashier_{index + 1}", defaults={"role": UserRole.CASHIER})
+            self.cashiers.append(cashier)
+        for user in [self.admin, *self.cashiers]:
+            user.set_unusable_password()
+            user.save(update_fields=["password"])
+
+    def _create_products(self, count, sales_per_day):
+        products = []
+        for index in range(count):
+            # Log-normal prices (median ~$400) and 45-75% cost ratios, like a parts/accessories catalog.
+            price = Decimal(max(35, round(math.exp(self.rng.gauss(6.0, 0.9))))).quantize(Decimal("0.01"))
+            category = CATEGORIES[index % len(CATEGORIES)]
+            products.append(
+                Product(
+                    sku=f"{self.prefix}-{index + 1:05d}",
+                    name=f"{category} {self.rng.choice(BRANDS)} {self.rng.randint(100, 999)}",
+                    default_price=price,
+                    cost_price=money(price * Decimal(str(round(self.rng.uniform(0.45, 0.75), 2)))),
+                    product_type_label=category,
+                    is_active=self.rng.random() > 0.03,
+                )
+            )
+        Product.objects.bulk_create(products, batch_size=1000)
+        self.products = [product for product in products if product.is_active]
+        # Zipf-like popularity: a few best sellers and a long tail.
+        ranks = list(range(1, len(self.products) + 1))
+        self.rng.shuffle(ranks)
+        weights = [1 / rank**1.1 for rank in ranks]
+        total_weight = sum(weights)
+        self.daily_demand = {
+            product.id: sales_per_day * 1.9 * weight / total_weight for product, weight in zip(self.products, weights)
+        }
+        self.cum_weights = []
+        running = 0.0
+        for weight in weights:
+            running += weight
+            self.cum_weights.append(running)
+
+        opening = self._at(self.start_day, 8)
+        movements = []
+        for product in self.products:
+            qty = Decimal(math.ceil(self.daily_demand[product.id] * 45) + 3)
+            self.stock[product.id] = qty
+            movements.append(self._movement(product, qty, MovementType.INBOUND, "load_opening", f"{product.sku}"))
+        InventoryMovement.objects.bulk_create(movements, batch_size=1000)
+        _backdate(InventoryMovement, {movement.pk: opening for movement in movements})
+
+    def _create_customers(self, count):
+        customers = []
+        for index in range(count):
+            # The index suffix keeps generated phones unique within a run.
+            phone = f"55{self.rng.randint(100, 999)}{index:05d}"
+            customers.append(
+                Customer(phone=phone, phone_normalized=normalize_phone(phone), name=f"Cliente {self.prefix} {index + 1}")
+            )
+        self.customers = Customer.objects.bulk_create(customers, batch_size=1000)
+
+    def _create_investors(self, count):
+        stamp = self._at(self.start_day, 9)
+        entries = {}
+        backed = self.rng.sample(self.products, k=max(1, len(self.products) * 15 // 100)) if count else []
+        investors = [Investor.objects.create(display_name=f"Inversionista {self.prefix} {index + 1}") for index in range(count)]
+        assignments_by_investor = {investor.id: [] for investor in investors}
+        for product in backed:
+            investor = self.rng.choice(investors)
+            qty = Decimal(max(1, min(int(self.stock[product.id]) - 1, math.ceil(self.daily_demand[product.id] * 60))))
+            assignments_by_investor[investor.id].append((product, qty))
+
+        for investor in investors:
+            purchase_total = sum((qty * product.cost_price for product, qty in assignments_by_investor[investor.id]), Decimal("0"))
+            deposit = create_capital_deposit(
+                investor=investor,
+                amount=money(purchase_total * Decimal("1.5") + Decimal("10000")),
+                reference_type="load_seed",
+                reference_id=str(investor.id),
+                note="Aportacion inicial (datos de carga)",
+            )
+            entries[deposit.pk] = stamp
+            for product, qty in assignments_by_investor[investor.id]:
+                assignment = InvestorAssignment.objects.create(investor=investor, product=product, qty_assigned=qty, unit_cost=product.cost_price)
+                line_total = money(qty * product.cost_price)
+                entry = LedgerEntry.objects.create(
+                    investor=investor,
+                    entry_type=LedgerEntryType.CAPITAL_TO_INVENTORY,
+                    capital_delta=-line_total,
+                    inventory_delta=line_total,
+                    profit_delta=Decimal("0.00"),
+                    reference_type="investor_assignment",
+                    reference_id=str(assignment.id),
+                    note=f"Investor purchase {product.sku}",
+                )
+                entries[entry.pk] = stamp
+        _backdate(LedgerEntry, entries)
+        _backdate(InvestorAssignment, {assignment.pk: stamp for assignment in InvestorAssignment.objects.filter(investor__in=investors)})
+
+    def _movement(self, product, qty, movement_type, reference_type, reference_id):
+        return InventoryMovement(
+            product=product,
+            movement_type=movement_type,
+            quantity_delta=qty,
+            reference_type=reference_type,
+            reference_id=reference_id,
+            note="Datos de carga",
+            created_by=self.admin,
+        )
+
+    def _pick_product(self):
+        return self.rng.choices(self.products, cum_weights=self.cum_weights, k=1)[0]
+
+    def _generate_day(self, day, options):
+        movements = {}
+        # Seasonality (+/-20% over the year) on top of the weekday pattern.
+        expected = options["sales_per_day"] * WEEKDAY_FACTOR[day.weekday()] * (1 + 0.2 * math.sin(2 * math.pi * day.timetuple().tm_yday / 365))
+        sales_count = max(0, round(self.rng.gauss(expected, math.sqrt(max(expected, 1)))))
+        for _ in range(sales_count):
+            self._generate_sale(day, movements, void=self.rng.random() < options["void_rate"])
+
+        if self.rng.random() < options["layaways_per_week"] / 7:
+            self._generate_layaway(day, movements)
+        self._generate_expenses(day)
+
+        InventoryMovement.objects.bulk_create(list(movements), batch_size=1000)
+        _backdate(InventoryMovement, {movement.pk: stamp for movement, stamp in movements.items()})
+
+    def _restock_if_needed(self, product, qty, stamp, movements):
+        if self.stock[product.id] >= qty:
+            return
+        restock = Decimal(math.ceil(self.daily_demand[product.id] * 30) + int(qty) + 2)
+        self.stock[product.id] += restock
+        self.counts["restocks"] += 1
+        reference_id = f"{product.sku}-{stamp:%Y%m%d%H%M%S}-{self.counts['restocks']}"
+        movements[self._movement(product, restock, MovementType.INBOUND, "load_restock", reference_id)] = stamp - timedelta(hours=1)
+
+    def _generate_sale(self, day, movements, *, void):
+        # Store hours 10:00-20:00 with an afternoon peak.
+        minutes = int(self.rng.triangular(10 * 60, 20 * 60, 17 * 60))
+        confirmed_at = self._at(day, minutes // 60, minutes % 60)
+        lines = {}
+        line_count = min(5, 1 + int(self.rng.expovariate(1.6)))
+        for _ in range(line_count):
+            product = self._pick_product()
+            qty = Decimal(self.rng.choices([1, 2, 3, 4], weights=[80, 14, 4, 2])[0])
+            lines[product] = lines.get(product, Decimal("0")) + qty
+
+        discount_pct = Decimal(self.rng.choice([5, 10])) if self.rng.random() < 0.08 else Decimal("0")
+        subtotal = money(sum((product.default_price * qty for product, qty in lines.items()), Decimal("0")))
+        total = money(sum((money(product.default_price * qty * (1 - discount_pct / 100)) for product, qty in lines.items()), Decimal("0")))
+        sale = Sale.objects.create(
+            cashier=self.rng.choice(self.cashiers),
+            customer=self.rng.choice(self.customers) if self.customers and self.rng.random() < 0.15 else None,
+            status=SaleStatus.CONFIRMED,
+            subtotal=subtotal,
+            discount_amount=subtotal - total,
+            total=total,
+            confirmed_at=confirmed_at,
+        )
+        SaleLine.objects.bulk_create(
+            [
+                SaleLine(
+                    sale=sale,
+                    product=product,
+                    qty=qty,
+                    unit_price=product.default_price,
+                    unit_cost=product.cost_price,
+                    discount_pct=discount_pct,
+                )
+                for product, qty in lines.items()
+            ]
+        )
+        Payment.objects.bulk_create(self._payments(sale, total))
+
+        for product, qty in lines.items():
+            self._restock_if_needed(product, qty, confirmed_at, movements)
+            self.stock[product.id] -= qty
+            movements[self._movement(product, -qty, MovementType.OUTBOUND, "sale_confirm", str(sale.id))] = confirmed_at
+
+        apply_sale_profitability(sale=sale)
+        stamps = {entry.pk: confirmed_at for entry in LedgerEntry.objects.filter(reference_type="sale", reference_id=str(sale.id))}
+        _backdate(LedgerEntry, stamps)
+        _backdate(Sale, {sale.pk: confirmed_at})
+        _backdate(SaleProfitabilitySnapshot, {sale.profitability_snapshot.pk: confirmed_at}, field="calculated_at")
+        self.counts["sales"] += 1
+
+        if void:
+            voided_at = confirmed_at + timedelta(minutes=self.rng.randint(2, 40))
+            revert_sale_profitability(sale=sale)
+            Sale.objects.filter(pk=sale.pk).update(status=SaleStatus.VOID, voided_at=voided_at)
+            event = VoidEvent.objects.create(sale=sale, reason="Datos de carga", actor=self.admin)
+            _backdate(VoidEvent, {event.pk: voided_at})
+            reversals = LedgerEntry.objects.filter(reference_type="sale_void", reference_id=str(sale.id))
+            _backdate(LedgerEntry, {entry.pk: voided_at for entry in reversals})
+            for product, qty in lines.items():
+                self.stock[product.id] += qty
+                movements[self._movement(product, qty, MovementType.INBOUND, "sale_void", str(sale.id))] = voided_at
+            self.counts["voids"] += 1
+
+    def _payments(self, sale, total):
+        roll = self.rng.random()
+        if roll < 0.55 or not self.plans:
+            return [Payment(sale=sale, method=PaymentMethod.CASH, amount=total)]
+        card_amount = total if roll < 0.9 else money(total * Decimal(str(round(self.rng.uniform(0.3, 0.7), 2))))
+        plan = self.plans.get("MSI_3") if "MSI_3" in self.plans and total > 1500 and self.rng.random() < 0.4 else self.plans.get("NORMAL")
+        plan = plan or next(iter(self.plans.values()))
+        payments = [
+            Payment(
+                sale=sale,
+                method=PaymentMethod.CARD,
+                amount=card_amount,
+                card_type=plan.code if plan.code in {"NORMAL", "MSI_3"} else None,
+                card_commission_plan=plan,
+                commission_rate=plan.commission_rate,
+                card_plan_code=plan.code,
+                card_plan_label=plan.label,
+                installments_months=plan.installments_months,
+            )
+        ]
+        if card_amount < total:
+            payments.append(Payment(sale=sale, method=PaymentMethod.CASH, amount=total - card_amount))
+        return payments
+
+    def _generate_layaway(self, day, movements):
+        if not self.customers:
+            return
+        customer = self.rng.choice(self.customers)
+        product = self._pick_product()
+        created_at = self._at(day, self.rng.randint(10, 19), self.rng.randint(0, 59))
+        expires_at = created_at + timedelta(days=30)
+        total = product.default_price
+        deposit = money(total * Decimal("0.3"))
+        if expires_at.date() >= self.today:
+            status, amount_paid = LayawayStatus.ACTIVE, deposit
+        elif self.rng.random() < 0.65:
+            status, amount_paid = LayawayStatus.SETTLED, total
+        else:
+            status, amount_paid = LayawayStatus.EXPIRED, deposit
+
+        layaway = Layaway.objects.create(
+            customer=customer,
+            product=product,
+            qty=Decimal("1"),
+            customer_name=customer.name,
+            customer_phone=customer.phone,
+            subtotal=total,
+            total=total,
+            amount_paid=amount_paid,
+            total_price=total,
+            deposit_amount=deposit,
+            expires_at=expires_at,
+            status=status,
+            created_by=self.admin,
+        )
+        LayawayLine.objects.create(layaway=layaway, product=product, qty=Decimal("1"), unit_price=total, unit_cost=product.cost_price)
+        payment = LayawayPayment.objects.create(
+            layaway=layaway, amount=deposit, created_by=self.admin, reference_type="layaway_create", reference_id=str(layaway.id)
+        )
+        _backdate(Layaway, {layaway.pk: created_at})
+        _backdate(LayawayPayment, {payment.pk: created_at})
+
+        self._restock_if_needed(product, Decimal("1"), created_at, movements)
+        self.stock[product.id] -= 1
+        movements[self._movement(product, Decimal("-1"), MovementType.RESERVED, "layaway_reserve", str(layaway.id))] = created_at
+        if status == LayawayStatus.EXPIRED:
+            self.stock[product.id] += 1
+            movements[self._movement(product, Decimal("1"), MovementType.RELEASED, "layaway_expire", str(layaway.id))] = expires_at
+        self.counts["layaways"] += 1
+
+    def _generate_expenses(self, day):
+        expenses = []
+        month_bucket = day.replace(day=1)
+
+        def add(category, description, amount, expense_type):
+            expenses.append(
+                Expense(
+                    category=category,
+                    description=description,
+                    amount=money(Decimal(str(amount))),
+                    expense_date=day,
+                    expense_type=expense_type,
+                    status=ExpenseStatus.PAID,
+                    paid_at=self._at(day, 12),
+                    paid_by=self.admin,
+                    month_bucket=month_bucket,
+                    created_by=self.admin,
+                )
+            )
+
+        if day.day == 1:
+            add("Renta", "Renta del local", 18000, ExpenseType.FIXED)
+            add("Servicios", "Luz y agua", round(self.rng.uniform(1800, 3200), 2), ExpenseType.FIXED)
+        if day.day in (15, 28):
+            add("Nomina", "Nomina quincenal", 14000, ExpenseType.FIXED)
+        if day.weekday() < 6 and self.rng.random() < 0.3:
+            category, low, high = self.rng.choice(VARIABLE_EXPENSES)
+            add(category, f"{category} {day:%d/%m}", round(self.rng.uniform(low, high), 2), ExpenseType.VARIABLE)
+
+        Expense.objects.bulk_create(expenses)
+        _backdate(Expense, {expense.pk: self._at(day, 12) for expense in expenses})
+        self.counts["expenses"] += len(expenses)
@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from apps.common.models import MetricsDataVersion
+
+METRICS_DATA_VERSION_PK = 1
+CACHE_HIT = "HIT"
+CACHE_MISS = "MISS"
+
+
+def _seed_version() -> int:
+    # Seed from the clock so a recreated row never restarts at a version that a
+    # shared cache still has entries under.
+    return time.time_ns() // 1_000_000
+
+
+def metrics_data_versions() -> tuple[int, int]:
+    """``(version, today_version)`` of ``MetricsDataVersion``; zeros before the row exists."""
+    row = MetricsDataVersion.objects.filter(pk=METRICS_DATA_VERSION_PK).values_list("version", "today_version").first()
+    return row or (0, 0)
+
+
+def bump_metrics_data_version(day=None) -> None:
+    """Invalidate cached metrics/report results affected by a write.
+
+    ``day`` is the earliest local day the write changes. Today or later only moves
+    ``today_version``, leaving ranges that ended before today cached; a past day, or ``None``
+    when the write is not tied to one, moves ``version`` and drops every entry. One UPDATE
+    inside the caller's transaction: the new version becomes visible to every process
+    together with the data that caused it.
+    """
+    field = "today_version" if day is not None and day >= timezone.localdate() else "version"
+    versions = MetricsDataVersion.objects.filter(pk=METRICS_DATA_VERSION_PK)
+    if not versions.update(**{field: F(field) + 1}):
+        MetricsDataVersion.objects.bulk_create(
+            [MetricsDataVersion(pk=METRICS_DATA_VERSION_PK, version=_seed_version())], ignore_conflicts=True
+        )
+        versions.update(**{field: F(field) + 1})
+
+
+def cached_metrics_result(namespace, params, build):
+    """Return ``(payload, CACHE_HIT | CACHE_MISS)`` for normalized query params.
+
+    Every param is part of the key. Ranges whose ``date_to`` is before today are keyed by
+    ``version`` alone and kept for ``METRICS_CACHE_CLOSED_TTL_SECONDS``; ranges that include
+    today are also keyed by ``today_version`` and expire after ``METRICS_CACHE_TODAY_TTL_SECONDS``.
+    Both TTLs are finite so entries orphaned by a bump are evicted on any backend.
+    """
+    date_to = params.get("date_to")
+    normalized = ":".join(
+        f"{name}={value.isoformat() if hasattr(value, 'isoformat') else value}"
+        for name, value in sorted(params.items())
+        if value is not None
+    )
+    version, today_version = metrics_data_versions()
+    is_closed_range = date_to is not None and date_to < timezone.localdate()
+    if is_closed_range:
+        key = f"metrics:{namespace}:v{version}:{normalized}"
+        timeout = settings.METRICS_CACHE_CLOSED_TTL_SECONDS
+    else:
+        key = f"metrics:{namespace}:v{version}.{today_version}:{normalized}"
+        timeout = settings.METRICS_CACHE_TODAY_TTL_SECONDS
+    payload = cache.get(key)
+    if payload is not None:
+        return payload, CACHE_HIT
+
+    payload = build()
+    cache.set(key, payload, timeout=timeout)
+    return payload, CACHE_MISS
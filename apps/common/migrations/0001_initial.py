@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:13
+
+import time
+
+from django.db import migrations, models
+
+
+def create_metrics_data_version(apps, schema_editor):
+    MetricsDataVersion = apps.get_model("common", "MetricsDataVersion")
+    # Start from the clock so versions never repeat keys a shared cache already holds.
+    MetricsDataVersion.objects.create(pk=1, version=time.time_ns() // 1_000_000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricsDataVersion',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, editable=False, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_metrics_data_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metricsdataversion',
+            name='today_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
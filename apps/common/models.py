@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class MetricsDataVersion(models.Model):
+    """Single row (``pk=1``) whose versions key every cached metrics/report result.
+
+    ``version`` moves with writes that touch a past day and keys every entry; ``today_version``
+    moves with writes dated today or later and only keys ranges that reach today, so a checkout
+    leaves closed ranges cached. Kept in the database so all web workers and management commands
+    agree on them, whatever cache backend each process uses.
+    """
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1, editable=False)
+    version = models.BigIntegerField(default=0)
+    today_version = models.BigIntegerField(default=0)
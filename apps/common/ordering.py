@@ -0,0 +1,16 @@
+from django.db.models import F
+from rest_framework.filters import OrderingFilter
+
+
+class NullsLastOrderingFilter(OrderingFilter):
+    """``?ordering=`` with NULLs last in both directions and ``pk`` as the tie-breaker for stable pages."""
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        expressions = [
+            F(field[1:]).desc(nulls_last=True) if field.startswith("-") else F(field).asc(nulls_last=True)
+            for field in ordering
+        ]
+        return queryset.order_by(*expressions, "pk")
@@ -53,11 +53,17 @@ ROLE_CAPABILITIES = {
 class RolePermission(BasePermission):
     @staticmethod
     def _resolve_role(user):
+        # Permission checks, serializers and views all ask within one request; read the groups once per user object.
+        cached = getattr(user, "_resolved_role", None)
+        if cached is not None:
+            return cached
         group_names = set(user.groups.values_list("name", flat=True))
-        for role in (UserRole.ADMIN, UserRole.CASHIER, UserRole.INVESTOR):
-            if role in group_names:
-                return role
-        return getattr(user, "role", UserRole.CASHIER)
+        role = next(
+            (role for role in (UserRole.ADMIN, UserRole.CASHIER, UserRole.INVESTOR) if role in group_names),
+            getattr(user, "role", UserRole.CASHIER),
+        )
+        user._resolved_role = role
+        return role
 
     def has_permission(self, request, view):
         if not request.user or not request.user.is_authenticated:
@@ -0,0 +1,72 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\?, )*\?\)")
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    """Maximum queries for one request: ``base`` plus ``per_item`` for each item of input.
+
+    Views declare them next to ``capability_map`` as ``query_budgets = {action: QueryBudget(...)}``;
+    ``per_item`` stays 0 for endpoints that must not grow with page or cart size.
+    """
+
+    base: int
+    per_item: int = 0
+
+    def limit(self, size=0):
+        return self.base + self.per_item * size
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def view_query_budget(view_class, action):
+    budgets = getattr(view_class, "query_budgets", {})
+    if action not in budgets:
+        raise KeyError(f"{view_class.__name__} declares no query budget for {action!r}")
+    return budgets[action]
+
+
+def normalize_sql(sql):
+    """Collapse literals so the same statement issued for different rows compares equal."""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def duplicated_queries(queries):
+    """``[(count, normalized_sql)]`` for statements executed more than once, most repeated first."""
+    counts = Counter(normalize_sql(query["sql"]) for query in queries)
+    return sorted(((count, sql) for sql, count in counts.items() if count > 1), key=lambda item: (-item[0], item[1]))
+
+
+@contextmanager
+def assert_query_budget(budget, size=0, *, label="", using=DEFAULT_DB_ALIAS):
+    """Fail with the repeated SQL when the wrapped block runs more queries than ``budget`` allows."""
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+
+    executed = len(captured.captured_queries)
+    limit = budget.limit(size)
+    if executed <= limit:
+        return
+
+    lines = [f"{label or 'block'} ran {executed} queries, budget is {limit} (base={budget.base}, per_item={budget.per_item}, size={size})."]
+    duplicates = duplicated_queries(captured.captured_queries)
+    if duplicates:
+        lines.append("Duplicated SQL:")
+        lines.extend(f"  {count}x {sql}" for count, sql in duplicates)
+    else:
+        lines.append("No statement repeats; the endpoint issues too many distinct queries:")
+        lines.extend(f"  {query['sql']}" for query in captured.captured_queries)
+    raise QueryBudgetExceeded("\n".join(lines))
@@ -0,0 +1,45 @@
+from django.db import connections, router
+
+
+def accumulate(bucket: dict, key, **deltas) -> None:
+    """Add ``deltas`` to ``bucket[key]``, starting it from them when the key is new."""
+    current = bucket.get(key)
+    if current is None:
+        bucket[key] = dict(deltas)
+        return
+    for name, value in deltas.items():
+        current[name] += value
+
+
+def apply_rollup_deltas(model, rows) -> None:
+    """Add ``rows`` of ``(keys, deltas)`` to one counter table in a single statement.
+
+    ``keys`` must match a unique constraint of ``model`` and every row carries the same fields.
+
+    ``INSERT ... ON CONFLICT (keys) DO UPDATE SET field = field + EXCLUDED.field``: a missing
+    row starts at its delta, an existing one is incremented under the row lock the upsert takes.
+    Rows are sent in key order so concurrent writers lock them in the same order.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    key_fields = [model._meta.get_field(name) for name in rows[0][0]]
+    delta_fields = [model._meta.get_field(name) for name in rows[0][1]]
+    fields = key_fields + delta_fields
+
+    params = []
+    for keys, deltas in sorted(rows, key=lambda row: tuple(str(value) for value in row[0].values())):
+        values = [*keys.values(), *deltas.values()]
+        params.extend(field.get_db_prep_save(value, connection) for field, value in zip(fields, values))
+
+    table = quote(model._meta.db_table)
+    row_placeholder = f"({', '.join(['%s'] * len(fields))})"
+    increments = ", ".join(
+        f"{quote(field.column)} = {table}.{quote(field.column)} + EXCLUDED.{quote(field.column)}" for field in delta_fields
+    )
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quote(field.column) for field in fields)}) "
+        f"VALUES {', '.join([row_placeholder] * len(rows))} "
+        f"ON CONFLICT ({', '.join(quote(field.column) for field in key_fields)}) DO UPDATE SET {increments}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
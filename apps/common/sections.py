@@ -0,0 +1,85 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connection, connections
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+SECTION_OK = "ok"
+SECTION_TIMEOUT = "timeout"
+_POLL_SECONDS = 0.02
+
+
+class SectionTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "El reporte tardo demasiado en calcularse; intenta con un rango menor."
+    default_code = "report_section_timeout"
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def _run_in_own_connection(func, started_at, name, timeout_seconds):
+    started_at[name] = time.perf_counter()
+    try:
+        if connection.vendor == "postgresql":
+            # Let the main thread report the timeout first; this only stops an abandoned query.
+            with connection.cursor() as cursor:
+                cursor.execute("SET statement_timeout = %s", [int((timeout_seconds + 1) * 1000)])
+        return func(), _elapsed_ms(started_at[name])
+    finally:
+        connections.close_all()
+
+
+def run_sections(sections, *, max_workers=None, timeout_seconds=None):
+    """Run independent zero-argument callables and return ``(results, timings)``.
+
+    Each section runs in its own thread with its own database connection and must
+    finish within ``timeout_seconds`` of starting, otherwise ``SectionTimeout`` is
+    raised. Inside an atomic block the sections run inline instead: other
+    connections cannot see the caller's uncommitted rows.
+
+    Threaded sections each read their own snapshot, so while writes are landing a
+    value derived from two sections can disagree with either one, e.g. the metrics
+    ``all_sales_have_snapshot`` flag comparing the sales count with the snapshot
+    count. Payloads built this way are as of "roughly now", not a single instant.
+    """
+    max_workers = settings.REPORT_SECTION_WORKERS if max_workers is None else max_workers
+    timeout_seconds = settings.REPORT_SECTION_TIMEOUT_SECONDS if timeout_seconds is None else timeout_seconds
+    results = {}
+    timings = {}
+
+    if max_workers <= 1 or len(sections) <= 1 or connection.in_atomic_block:
+        for name, func in sections.items():
+            started = time.perf_counter()
+            results[name] = func()
+            timings[name] = {"elapsed_ms": _elapsed_ms(started), "status": SECTION_OK}
+        return results, timings
+
+    started_at = {}
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(sections)), thread_name_prefix="report-section")
+    try:
+        futures = {
+            executor.submit(_run_in_own_connection, func, started_at, name, timeout_seconds): name
+            for name, func in sections.items()
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                results[name], elapsed_ms = future.result()
+                timings[name] = {"elapsed_ms": elapsed_ms, "status": SECTION_OK}
+            now = time.perf_counter()
+            expired = [future for future in pending if now - started_at.get(futures[future], now) > timeout_seconds]
+            if expired:
+                for future in pending:
+                    name = futures[future]
+                    status_value = SECTION_TIMEOUT if future in expired else "cancelled"
+                    timings[name] = {"elapsed_ms": _elapsed_ms(started_at.get(name, now)), "status": status_value}
+                raise SectionTimeout({"detail": SectionTimeout.default_detail, "sections": timings})
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results, timings
@@ -0,0 +1,303 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.catalog.models import Product
+from apps.inventory.models import InventoryMovement, MovementType
+from apps.catalog.views import ProductViewSet, PublicCatalogListView
+from apps.common.metrics_cache import bump_metrics_data_version, metrics_data_versions
+from apps.common.models import MetricsDataVersion
+from apps.common.query_budget import (
+    QueryBudget,
+    QueryBudgetExceeded,
+    assert_query_budget,
+    duplicated_queries,
+    normalize_sql,
+    view_query_budget,
+)
+from apps.investors.models import Investor, InvestorAssignment
+from apps.investors.views import InvestorPerformanceView, InvestorViewSet
+from apps.layaway.models import Customer, CustomerCredit, Layaway, LayawayStatus
+from apps.layaway.views import CustomerViewSet, LayawayViewSet
+from apps.ledger.models import LedgerEntry
+from apps.ledger.services import create_capital_deposit
+from apps.purchases.models import PurchaseReceipt, PurchaseReceiptLine, ReceiptStatus
+from apps.purchases.views import PurchaseReceiptViewSet
+from apps.sales.models import Sale, SaleStatus
+from apps.sales.views import SaleViewSet
+from apps.suppliers.models import Supplier
+
+User = get_user_model()
+
+
+class QueryBudgetHelperTests(TestCase):
+    def test_budget_scales_with_input_size(self):
+        self.assertEqual(QueryBudget(5).limit(100), 5)
+        self.assertEqual(QueryBudget(5, per_item=2).limit(3), 11)
+
+    def test_normalize_sql_collapses_literals_and_in_lists(self):
+        first = normalize_sql("SELECT * FROM t WHERE id = 'abc' AND qty > 2 AND x IN ('a', 'b')")
+        second = normalize_sql("SELECT * FROM t WHERE id = 'xyz' AND qty > 7 AND x IN ('c')")
+        self.assertEqual(first, second)
+
+    def test_exceeded_budget_lists_duplicated_sql(self):
+        products = [Product.objects.create(sku=f"QB-{index}", name="Budget", default_price=Decimal("10.00")) for index in range(3)]
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with assert_query_budget(QueryBudget(1), label="n+1 loop"):
+                for product in products:
+                    Product.objects.get(pk=product.pk)
+        message = str(raised.exception)
+        self.assertIn("n+1 loop ran 3 queries, budget is 1", message)
+        self.assertIn("3x SELECT", message)
+
+    def test_within_budget_passes_and_exposes_queries(self):
+        with assert_query_budget(QueryBudget(2)) as captured:
+            Product.objects.count()
+        self.assertEqual(len(captured.captured_queries), 1)
+        self.assertEqual(duplicated_queries(captured.captured_queries), [])
+
+    def test_missing_declaration_is_an_error(self):
+        with self.assertRaises(KeyError):
+            view_query_budget(SaleViewSet, "destroy")
+
+
+class MetricsDataVersionTests(TestCase):
+    def test_bump_is_stored_in_the_database_not_the_cache(self):
+        version, today_version = metrics_data_versions()
+        bump_metrics_data_version()
+        cache.clear()
+        self.assertEqual(metrics_data_versions(), (version + 1, today_version))
+
+    def test_writes_dated_today_only_move_the_today_version(self):
+        version, today_version = metrics_data_versions()
+        bump_metrics_data_version(timezone.localdate())
+        self.assertEqual(metrics_data_versions(), (version, today_version + 1))
+        bump_metrics_data_version(timezone.localdate() - timedelta(days=1))
+        self.assertEqual(metrics_data_versions(), (version + 1, today_version + 1))
+
+    def test_bump_recreates_a_missing_row(self):
+        MetricsDataVersion.objects.all().delete()
+        self.assertEqual(metrics_data_versions(), (0, 0))
+        bump_metrics_data_version()
+        self.assertGreater(metrics_data_versions()[0], 0)
+
+
+class EndpointQueryBudgetTests(APITestCase):
+    """Every budgeted endpoint, exercised against ``generate_load_data`` fixtures at more than one input size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "generate_load_data",
+            "--products=40",
+            "--days=6",
+            "--sales-per-day=8",
+            "--investors=2",
+            "--customers=25",
+            "--layaways-per-week=14",
+            "--seed=7",
+            stdout=StringIO(),
+        )
+        cls.admin = User.objects.create_user(username="budget_admin", password="admin123", role="ADMIN")
+        cls.cashier = User.objects.create_user(username="budget_cashier", password="cashier123", role="CASHIER")
+        cls.cart_products = list(
+            Product.objects.filter(is_active=True)
+            .annotate(stock=Sum("movements__quantity_delta"))
+            .filter(stock__gte=20)
+            .order_by("sku")[:8]
+        )
+
+        supplier = Supplier.objects.create(code="QB", name="Budget Supplier")
+        for index in range(5):
+            receipt = PurchaseReceipt.objects.create(
+                supplier=supplier,
+                invoice_number=f"QB-{index}",
+                status=ReceiptStatus.POSTED,
+                created_by=cls.cashier,
+            )
+            for product in cls.cart_products[:4]:
+                PurchaseReceiptLine.objects.create(receipt=receipt, product=product, qty=Decimal("1"), unit_cost=Decimal("10.00"))
+
+    def setUp(self):
+        cache.clear()
+
+    def auth_as(self, username, password):
+        token = self.client.post("/api/v1/auth/token/", {"username": username, "password": password}, format="json").data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def within_budget(self, view_class, action, call, size=0):
+        with assert_query_budget(view_query_budget(view_class, action), size, label=f"{view_class.__name__}.{action}"):
+            response = call()
+        self.assertLess(response.status_code, 300, getattr(response, "data", None))
+        return response
+
+    def cart(self, size, **extra):
+        products = self.cart_products[:size]
+        total = sum((product.default_price for product in products), Decimal("0.00"))
+        return {
+            "lines": [
+                {
+                    "product": str(product.id),
+                    "qty": "1.00",
+                    "unit_price": str(product.default_price),
+                    "unit_cost": str(product.cost_price),
+                    "discount_pct": "0.00",
+                }
+                for product in products
+            ],
+            "payments": [{"method": "CASH", "amount": str(total)}],
+            **extra,
+        }
+
+    def test_sale_writes_stay_within_budget_regardless_of_line_count(self):
+        self.auth_as("budget_cashier", "cashier123")
+        for size in (1, 8):
+            with self.subTest(size=size):
+                self.within_budget(
+                    SaleViewSet,
+                    "create_and_confirm",
+                    lambda: self.client.post(
+                        "/api/v1/sales/create-and-confirm/", self.cart(size, customer_phone="5550001111"), format="json"
+                    ),
+                    size,
+                )
+                created = self.within_budget(
+                    SaleViewSet, "create", lambda: self.client.post("/api/v1/sales/", self.cart(size), format="json"), size
+                )
+                sale_id = created.data["id"]
+                self.within_budget(
+                    SaleViewSet, "confirm", lambda: self.client.post(f"/api/v1/sales/{sale_id}/confirm/", {}, format="json"), size
+                )
+                self.within_budget(
+                    SaleViewSet,
+                    "void",
+                    lambda: self.client.post(f"/api/v1/sales/{sale_id}/void/", {"reason": "budget"}, format="json"),
+                    size,
+                )
+
+    def test_investor_backed_credit_void_stays_within_budget(self):
+        investor = Investor.objects.create(display_name="Void Budget Investor")
+        InvestorAssignment.objects.bulk_create(
+            [
+                InvestorAssignment(investor=investor, product=product, qty_assigned=Decimal("5.00"), unit_cost=product.cost_price)
+                for product in self.cart_products
+            ]
+        )
+        customer = Customer.objects.create(phone="5550002222", phone_normalized="5550002222", name="Void Budget")
+        CustomerCredit.objects.create(customer=customer, customer_name=customer.name, balance=Decimal("100.00"))
+        self.auth_as("budget_admin", "admin123")
+
+        for size in (1, 8):
+            with self.subTest(size=size):
+                cart = self.cart(size, customer_phone=customer.phone)
+                cash = cart["payments"][0]
+                cash["amount"] = str(Decimal(cash["amount"]) - Decimal("1.00"))
+                cart["payments"].append({"method": "CUSTOMER_CREDIT", "amount": "1.00"})
+                sale_id = self.client.post("/api/v1/sales/create-and-confirm/", cart, format="json").data["id"]
+                self.assertEqual(LedgerEntry.objects.filter(reference_type="sale", reference_id=sale_id).count(), 2 * size)
+
+                self.within_budget(
+                    SaleViewSet,
+                    "void",
+                    lambda: self.client.post(f"/api/v1/sales/{sale_id}/void/", {"reason": "budget"}, format="json"),
+                    size,
+                )
+                self.assertEqual(LedgerEntry.objects.filter(reference_type="sale_void", reference_id=sale_id).count(), 2 * size)
+        self.assertFalse(InvestorAssignment.objects.filter(investor=investor, qty_sold__gt=0).exists())
+        self.assertEqual(CustomerCredit.objects.get(customer=customer).balance, Decimal("100.00"))
+
+    def test_sale_reads_stay_within_budget(self):
+        self.auth_as("budget_cashier", "cashier123")
+        response = self.within_budget(SaleViewSet, "list", lambda: self.client.get("/api/v1/sales/"), 20)
+        self.assertEqual(len(response.data["results"]), 20)
+
+        sale = Sale.objects.filter(status=SaleStatus.CONFIRMED, customer__isnull=False).order_by("-confirmed_at").first()
+        response = self.within_budget(SaleViewSet, "retrieve", lambda: self.client.get(f"/api/v1/sales/{sale.id}/"))
+        self.assertEqual(response.data["customer_summary"]["sales_count"], sale.customer.sales.count())
+
+    def test_receipt_endpoints_stay_within_budget(self):
+        self.auth_as("budget_cashier", "cashier123")
+        response = self.within_budget(PurchaseReceiptViewSet, "list", lambda: self.client.get("/api/v1/purchase-receipts/"), 5)
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertTrue(all(receipt["can_delete"] for receipt in response.data["results"]))
+
+        self.auth_as("budget_admin", "admin123")
+        receipt = PurchaseReceipt.objects.create(
+            supplier=Supplier.objects.get(code="QB"), invoice_number="QB-DRAFT", status=ReceiptStatus.DRAFT, created_by=self.admin
+        )
+        for product in self.cart_products:
+            PurchaseReceiptLine.objects.create(receipt=receipt, product=product, qty=Decimal("2"), unit_cost=Decimal("10.00"))
+        self.within_budget(
+            PurchaseReceiptViewSet,
+            "confirm",
+            lambda: self.client.post(f"/api/v1/purchase-receipts/{receipt.id}/confirm/", {}, format="json"),
+            len(self.cart_products),
+        )
+
+    def test_catalog_and_customer_lists_stay_within_budget(self):
+        self.auth_as("budget_admin", "admin123")
+        self.within_budget(ProductViewSet, "list", lambda: self.client.get("/api/v1/products/"), 20)
+        self.within_budget(LayawayViewSet, "list", lambda: self.client.get("/api/v1/layaways/"), 20)
+        response = self.within_budget(LayawayViewSet, "dashboard", lambda: self.client.get("/api/v1/layaways/dashboard/"))
+        self.assertEqual(response.data["active_count"], Layaway.objects.filter(status=LayawayStatus.ACTIVE).count())
+        self.within_budget(CustomerViewSet, "list", lambda: self.client.get("/api/v1/customers/"), 20)
+        self.within_budget(CustomerViewSet, "autocomplete", lambda: self.client.get("/api/v1/customers/autocomplete/", {"q": "cli"}))
+        self.client.credentials()
+        self.within_budget(PublicCatalogListView, "get", lambda: self.client.get("/api/v1/public/catalog/"), 20)
+
+    def test_investor_balances_and_performance_stay_within_budget(self):
+        call_command("write_ledger_checkpoints", "--backfill", stdout=StringIO())
+        self.auth_as("budget_admin", "admin123")
+        response = self.within_budget(
+            InvestorViewSet, "balances", lambda: self.client.get("/api/v1/investors/balances/", {"as_of": "2030-01-01"})
+        )
+        self.assertEqual(len(response.data["results"]), Investor.objects.count())
+
+        investor = Investor.objects.filter(assignments__performance__isnull=False).distinct().first()
+        response = self.within_budget(
+            InvestorPerformanceView, "get", lambda: self.client.get(f"/api/v1/investors/{investor.id}/performance/"), 20
+        )
+        self.assertTrue(any(row["sales_count"] for row in response.data["results"]))
+
+    def test_investor_purchase_stays_within_budget_at_200_lines(self):
+        products = Product.objects.bulk_create(
+            [Product(sku=f"QB-INV-{index:03d}", name=f"Budget {index}", default_price=Decimal("50.00")) for index in range(200)]
+        )
+        InventoryMovement.objects.bulk_create(
+            [
+                InventoryMovement(
+                    product=product,
+                    movement_type=MovementType.INBOUND,
+                    quantity_delta=Decimal("5.00"),
+                    reference_type="qb_stock",
+                    reference_id=product.sku,
+                    created_by=self.admin,
+                )
+                for product in products
+            ]
+        )
+        investor = Investor.objects.create(display_name="Budget Investor")
+        create_capital_deposit(investor=investor, amount="100000.00", reference_type="seed", reference_id="qb")
+        self.auth_as("budget_admin", "admin123")
+
+        for size, batch in ((1, products[:1]), (200, products)):
+            with self.subTest(size=size):
+                payload = {
+                    "tax_rate_pct": "16.00",
+                    "lines": [{"product": str(product.id), "qty": "1.00", "unit_cost_gross": "20.00"} for product in batch],
+                }
+                response = self.within_budget(
+                    InvestorViewSet,
+                    "purchases",
+                    lambda: self.client.post(f"/api/v1/investors/{investor.id}/purchases/", payload, format="json"),
+                    size,
+                )
+                self.assertEqual(len(response.data["ledger_entries"]), size)
@@ -10,6 +10,7 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from apps.audit.services import record_audit
+from apps.common.metrics_cache import bump_metrics_data_version
 from apps.common.permissions import RolePermission
 from apps.expenses.models import Expense, ExpenseStatus, ExpenseType, FixedExpenseTemplate
 from apps.expenses.serializers import (
@@ -193,6 +194,7 @@ class ExpenseViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         expense = serializer.save()
+        bump_metrics_data_version(expense.expense_date)
         record_audit(
             actor=self.request.user,
             action="expenses.create",
@@ -219,7 +221,9 @@ class ExpenseViewSet(viewsets.ModelViewSet):
             "status": expense.status,
             "template_id": str(expense.template_id) if expense.template_id else None,
         }
+        before_date = expense.expense_date
         expense = serializer.save()
+        bump_metrics_data_version(min(before_date, expense.expense_date))
         after = {
             "category": expense.category,
             "description": expense.description,
@@ -267,6 +271,8 @@ class ExpenseViewSet(viewsets.ModelViewSet):
             else:
                 existing_count += 1
 
+        if created_count:
+            bump_metrics_data_version(month_bucket)
         summary = self.build_summary_payload(month_bucket)
         record_audit(
             actor=request.user,
@@ -37,17 +37,35 @@ def _compute_public_price(unit_cost):
     return _quantize(unit_cost * VAT_RATE * PUBLIC_PRICE_MARKUP)
 
 
-def _resolve_match(sku):
+def match_products_by_sku(skus):
+    """Existing products for normalized ``skus`` in one query, with brand and product type loaded."""
+    wanted = {sku for sku in skus if sku}
+    if not wanted:
+        return {}
+    return {product.sku: product for product in Product.objects.filter(sku__in=wanted).select_related("brand", "product_type")}
+
+
+def _resolve_match(sku, products):
     if not sku:
         return None, MatchStatus.INVALID
 
-    normalized_sku = sku.strip().upper()
-    product = Product.objects.filter(sku=normalized_sku).first()
+    product = products.get(sku.strip().upper())
     if product:
         return product, MatchStatus.MATCHED_PRODUCT
     return None, MatchStatus.NEW_PRODUCT
 
 
+def resolve_matches(parsed_rows):
+    """Fill ``matched_product``/``match_status`` of ``(raw_line, parsed)`` rows with a single ``sku__in`` query."""
+    products = match_products_by_sku(parsed["sku"] for _, parsed in parsed_rows)
+    for _, parsed in parsed_rows:
+        product, status = _resolve_match(parsed["sku"], products)
+        parsed["matched_product"] = product
+        if parsed["match_status"] != MatchStatus.INVALID:
+            parsed["match_status"] = status
+    return parsed_rows
+
+
 def _build_parsed_row(sku, name, qty, unit_cost, unit_price):
     normalized_sku = (sku or "").strip().upper()
     qty_value = _to_decimal(qty)
@@ -57,7 +75,8 @@ def _build_parsed_row(sku, name, qty, unit_cost, unit_price):
     if unit_price_value is None and unit_cost_value is not None:
         unit_price_value = _quantize(unit_cost_value * VAT_RATE)
 
-    product, status = _resolve_match(normalized_sku)
+    # The SKU is matched later, for all rows at once, by ``resolve_matches``.
+    status = MatchStatus.NEW_PRODUCT
     if not normalized_sku or qty_value is None or unit_cost_value is None:
         status = MatchStatus.INVALID
 
@@ -69,7 +88,7 @@ def _build_parsed_row(sku, name, qty, unit_cost, unit_price):
         "unit_price": unit_price_value,
         "public_price": _compute_public_price(unit_cost_value),
         "match_status": status,
-        "matched_product": product,
+        "matched_product": None,
     }
 
 
@@ -136,7 +155,7 @@ def parse_myesa_text(raw_text):
         parsed_rows.append((line, parsed))
         index = scan
 
-    return parsed_rows
+    return resolve_matches(parsed_rows)
 
 
 def parse_invoice_text(raw_text, parser_key):
@@ -162,4 +181,4 @@ def parse_invoice_text(raw_text, parser_key):
         parsed = parse_invoice_line(line)
         if parsed is not None:
             parsed_rows.append((raw_line, parsed))
-    return parsed_rows
+    return resolve_matches(parsed_rows)
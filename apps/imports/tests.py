@@ -1,10 +1,13 @@
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 
 from apps.catalog.models import Brand, Product, ProductType
+from apps.imports.models import InvoiceImportLine, MatchStatus
 from apps.inventory.models import InventoryMovement
 from apps.suppliers.models import Supplier, SupplierInvoiceParser
 
@@ -378,3 +381,27 @@ CLAVE PRODUCTO: 46181705 CLAVE PEDIMENTO: 25 16 1767 5003910
         )
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.data["code"], "taxonomy_not_found")
+
+    def test_parse_matches_skus_in_one_query_regardless_of_line_count(self):
+        products = Product.objects.bulk_create(
+            [
+                Product(sku=f"MATCH-{index:02d}", name=f"Match {index}", default_price=Decimal("10"), brand=self.brand_ls2)
+                for index in range(20)
+            ]
+        )
+
+        def parse_queries(count):
+            raw_text = "\\n".join(f"{product.sku}|{product.name}|1|5|8" for product in products[:count])
+            batch_id = self.client.post(
+                "/api/v1/import-batches/",
+                {"supplier": str(self.supplier_a.id), "parser": str(self.parser_pipe.id), "raw_text": raw_text},
+                format="json",
+            ).data["id"]
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.post(f"/api/v1/import-batches/{batch_id}/parse/", {}, format="json")
+            self.assertEqual(response.status_code, 200)
+            lines = InvoiceImportLine.objects.filter(batch_id=batch_id)
+            self.assertEqual(lines.filter(match_status=MatchStatus.MATCHED_PRODUCT, brand=self.brand_ls2).count(), count)
+            return len(captured.captured_queries)
+
+        self.assertEqual(parse_queries(2), parse_queries(20))
@@ -8,6 +8,7 @@ from rest_framework.response import Response
 
 from apps.audit.services import record_audit
 from apps.catalog.models import Brand, Product, ProductType, normalize_taxonomy_name
+from apps.common.metrics_cache import bump_metrics_data_version
 from apps.common.permissions import RolePermission
 from apps.imports.models import ImportStatus, InvoiceImportBatch, InvoiceImportLine, MatchStatus
 from apps.imports.serializers import (
@@ -15,7 +16,7 @@ from apps.imports.serializers import (
     InvoiceImportLineUpdateSerializer,
     PreviewConfirmBatchSerializer,
 )
-from apps.imports.services import parse_invoice_text
+from apps.imports.services import match_products_by_sku, parse_invoice_text
 from apps.inventory.models import InventoryMovement, MovementType
 from apps.purchases.models import PurchaseReceipt, PurchaseReceiptLine, ReceiptStatus
 
@@ -152,7 +153,7 @@ class InvoiceImportBatchViewSet(viewsets.ModelViewSet):
         return computed_subtotal
 
     def _confirm_batch(self, batch: InvoiceImportBatch, actor) -> PurchaseReceipt:
-        selected = list(batch.lines.filter(is_selected=True).order_by("line_no"))
+        selected = list(batch.lines.filter(is_selected=True).select_related("matched_product").order_by("line_no"))
         computed_subtotal = self._validate_selected_lines(selected, batch.subtotal)
         taxonomy_by_line = self._resolve_taxonomy(selected)
 
@@ -169,6 +170,10 @@ class InvoiceImportBatchViewSet(viewsets.ModelViewSet):
             source_import_batch=batch,
         )
 
+        existing_by_sku = match_products_by_sku(
+            (line.sku or "").strip().upper() for line in selected if line.matched_product_id is None
+        )
+        movements = []
         for line in selected:
             normalized_sku = (line.sku or "").strip().upper()
             brand, product_type, brand_label, product_type_label = taxonomy_by_line[line.id]
@@ -181,7 +186,7 @@ class InvoiceImportBatchViewSet(viewsets.ModelViewSet):
                 else line.unit_cost
             )
             if product is None:
-                existing = Product.objects.filter(sku=normalized_sku).first()
+                existing = existing_by_sku.get(normalized_sku)
                 if existing:
                     product = existing
                 else:
@@ -225,14 +230,16 @@ class InvoiceImportBatchViewSet(viewsets.ModelViewSet):
                 unit_price=line.unit_price,
             )
 
-            InventoryMovement.objects.create(
-                product=product,
-                movement_type=MovementType.INBOUND,
-                quantity_delta=line.qty,
-                reference_type="import_batch_confirm",
-                reference_id=str(batch.id),
-                note=f"Import batch line {line.line_no}",
-                created_by=actor,
+            movements.append(
+                InventoryMovement(
+                    product=product,
+                    movement_type=MovementType.INBOUND,
+                    quantity_delta=line.qty,
+                    reference_type="import_batch_confirm",
+                    reference_id=str(batch.id),
+                    note=f"Import batch line {line.line_no}",
+                    created_by=actor,
+                )
             )
 
             line.matched_product = product
@@ -254,9 +261,12 @@ class InvoiceImportBatchViewSet(viewsets.ModelViewSet):
                 ]
             )
 
+        InventoryMovement.bulk_record(movements)
+
         batch.status = ImportStatus.CONFIRMED
         batch.confirmed_at = timezone.now()
         batch.save(update_fields=["status", "confirmed_at"])
+        bump_metrics_data_version(timezone.localdate(batch.confirmed_at))
 
         record_audit(
             actor=actor,
@@ -280,8 +290,8 @@ class InvoiceImportBatchViewSet(viewsets.ModelViewSet):
 
         with transaction.atomic():
             batch.lines.all().delete()
-            for idx, (raw_line, parsed) in enumerate(parsed_rows, start=1):
-                InvoiceImportLine.objects.create(
+            InvoiceImportLine.objects.bulk_create(
+                InvoiceImportLine(
                     batch=batch,
                     line_no=idx,
                     raw_line=raw_line,
@@ -311,6 +321,8 @@ class InvoiceImportBatchViewSet(viewsets.ModelViewSet):
                     matched_product=parsed["matched_product"],
                     match_status=parsed["match_status"],
                 )
+                for idx, (raw_line, parsed) in enumerate(parsed_rows, start=1)
+            )
 
             batch.status = ImportStatus.PARSED
             batch.save(update_fields=["status"])
@@ -320,7 +332,7 @@ class InvoiceImportBatchViewSet(viewsets.ModelViewSet):
                 action="import.parse",
                 entity_type="import_batch",
                 entity_id=batch.id,
-                payload={"lines": batch.lines.count()},
+                payload={"lines": len(parsed_rows)},
             )
 
         return Response(self.get_serializer(batch).data)
@@ -370,9 +382,11 @@ class InvoiceImportBatchViewSet(viewsets.ModelViewSet):
                 created_by=request.user,
             )
 
-            for idx, line_data in enumerate(payload["lines"], start=1):
-                normalized_sku = (line_data.get("sku") or "").strip().upper()
-                matched_product = Product.objects.filter(sku=normalized_sku).first() if normalized_sku else None
+            normalized_skus = [(line_data.get("sku") or "").strip().upper() for line_data in payload["lines"]]
+            products = match_products_by_sku(normalized_skus)
+            lines = []
+            for idx, (line_data, normalized_sku) in enumerate(zip(payload["lines"], normalized_skus), start=1):
+                matched_product = products.get(normalized_sku)
                 if not normalized_sku:
                     match_status = MatchStatus.INVALID
                 elif matched_product:
@@ -380,30 +394,33 @@ class InvoiceImportBatchViewSet(viewsets.ModelViewSet):
                 else:
                     match_status = MatchStatus.NEW_PRODUCT
 
-                InvoiceImportLine.objects.create(
-                    batch=batch,
-                    line_no=idx,
-                    raw_line=f"{normalized_sku} {line_data.get('name', '')}".strip(),
-                    parsed_sku=normalized_sku,
-                    parsed_name=line_data.get("name", "") or "",
-                    parsed_qty=line_data.get("qty"),
-                    parsed_unit_cost=line_data.get("unit_cost"),
-                    parsed_unit_price=line_data.get("unit_price"),
-                    sku=normalized_sku,
-                    name=line_data.get("name", "") or "",
-                    qty=line_data.get("qty"),
-                    unit_cost=line_data.get("unit_cost"),
-                    unit_price=line_data.get("unit_price"),
-                    public_price=line_data.get("public_price"),
-                    brand_name=(line_data.get("brand_name") or "").strip(),
-                    product_type_name=(line_data.get("product_type_name") or "").strip(),
-                    brand=line_data.get("brand"),
-                    product_type=line_data.get("product_type"),
-                    matched_product=matched_product,
-                    match_status=match_status,
-                    is_selected=line_data.get("is_selected", True),
-                    notes=line_data.get("notes", "") or "",
+                lines.append(
+                    InvoiceImportLine(
+                        batch=batch,
+                        line_no=idx,
+                        raw_line=f"{normalized_sku} {line_data.get('name', '')}".strip(),
+                        parsed_sku=normalized_sku,
+                        parsed_name=line_data.get("name", "") or "",
+                        parsed_qty=line_data.get("qty"),
+                        parsed_unit_cost=line_data.get("unit_cost"),
+                        parsed_unit_price=line_data.get("unit_price"),
+                        sku=normalized_sku,
+                        name=line_data.get("name", "") or "",
+                        qty=line_data.get("qty"),
+                        unit_cost=line_data.get("unit_cost"),
+                        unit_price=line_data.get("unit_price"),
+                        public_price=line_data.get("public_price"),
+                        brand_name=(line_data.get("brand_name") or "").strip(),
+                        product_type_name=(line_data.get("product_type_name") or "").strip(),
+                        brand=line_data.get("brand"),
+                        product_type=line_data.get("product_type"),
+                        matched_product=matched_product,
+                        match_status=match_status,
+                        is_selected=line_data.get("is_selected", True),
+                        notes=line_data.get("notes", "") or "",
+                    )
                 )
+            InvoiceImportLine.objects.bulk_create(lines)
 
             try:
                 receipt = self._confirm_batch(batch, request.user)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.inventory.valuation import take_inventory_valuation_snapshot
+
+
+class Command(BaseCommand):
+    help = "Guarda la valuacion del inventario (costo, venta, propio vs inversionistas). Programar una vez por noche."
+
+    def handle(self, *args, **options):
+        snapshot = take_inventory_valuation_snapshot()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Valuacion guardada ({snapshot.products_count} productos): "
+                f"costo {snapshot.cost_value}, venta {snapshot.retail_value}."
+            )
+        )
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:57
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_product_cost_price'),
+        ('inventory', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryValuationLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_units', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('store_owned_units', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('investor_assigned_units', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('retail_value', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('store_owned_cost_value', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('investor_assigned_cost_value', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('store_owned_potential_profit', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('investor_assigned_potential_profit', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InventoryValuationSnapshot',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('taken_at', models.DateTimeField()),
+                ('cost_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('retail_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('potential_profit', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('gross_margin_pct', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('total_units', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('store_owned_units', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('investor_assigned_units', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('store_owned_cost_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('investor_assigned_cost_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('store_owned_potential_profit', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('investor_assigned_potential_profit', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('products_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-taken_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='inventorymovement',
+            index=models.Index(fields=['created_at'], name='inv_movement_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='inventoryvaluationline',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.product'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryvaluationsnapshot',
+            index=models.Index(fields=['taken_at'], name='inv_valuation_taken_idx'),
+        ),
+        migrations.AddField(
+            model_name='inventoryvaluationline',
+            name='snapshot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='inventory.inventoryvaluationsnapshot'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventoryvaluationline',
+            constraint=models.UniqueConstraint(fields=('snapshot', 'product'), name='unique_inv_valuation_line_product'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 import uuid
+from decimal import Decimal
 
 from django.core.exceptions import ValidationError
 from django.db import models
@@ -28,6 +29,7 @@ class InventoryMovement(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["created_at"], name="inv_movement_created_idx")]
         constraints = [
             models.UniqueConstraint(
                 fields=["reference_type", "reference_id", "product"],
@@ -58,3 +60,87 @@ class InventoryMovement(models.Model):
             )
         )
         return result["total"]
+
+    @staticmethod
+    def current_stock_many(product_ids):
+        """Stock keyed by product id for several products in one query; products without movements map to 0."""
+        product_ids = set(product_ids)
+        totals = dict(
+            InventoryMovement.objects.filter(product_id__in=product_ids)
+            .values("product_id")
+            .annotate(total=Sum("quantity_delta"))
+            .order_by()
+            .values_list("product_id", "total")
+        )
+        return {product_id: totals.get(product_id) or Decimal("0.00") for product_id in product_ids}
+
+    @classmethod
+    def lock_products(cls, product_ids):
+        """``SELECT ... FOR UPDATE`` the products in id order (a stable order avoids deadlocks)."""
+        Product = cls._meta.get_field("product").related_model
+        return list(Product.objects.select_for_update().filter(pk__in=set(product_ids)).order_by("pk"))
+
+    @classmethod
+    def bulk_record(cls, movements):
+        """Insert several movements in one statement, applying the ``clean`` rules ``save`` runs per row.
+
+        Every product drawn down is row-locked and its stock checked with a single aggregate;
+        the unique reference constraint is left to the database.
+        """
+        outbound = {}
+        for movement in movements:
+            if movement.quantity_delta == 0:
+                raise ValidationError("quantity_delta cannot be zero")
+            if movement.quantity_delta < 0:
+                outbound[movement.product_id] = outbound.get(movement.product_id, Decimal("0.00")) + movement.quantity_delta
+        if outbound:
+            # Lock the drawn-down products in id order so concurrent sales and investor purchases
+            # serialize on them before reading stock.
+            cls.lock_products(outbound)
+            available = cls.current_stock_many(outbound)
+            if any(available[product_id] + delta < 0 for product_id, delta in outbound.items()):
+                raise ValidationError("insufficient stock")
+        return cls.objects.bulk_create(movements)
+
+
+class InventoryValuationSnapshot(models.Model):
+    """Point-in-time valuation totals written by ``snapshot_inventory_valuation``."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    taken_at = models.DateTimeField()
+    cost_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    retail_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    potential_profit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    gross_margin_pct = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    total_units = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    store_owned_units = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    investor_assigned_units = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    store_owned_cost_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    investor_assigned_cost_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    store_owned_potential_profit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    investor_assigned_potential_profit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    products_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-taken_at"]
+        indexes = [models.Index(fields=["taken_at"], name="inv_valuation_taken_idx")]
+
+
+class InventoryValuationLine(models.Model):
+    """Per-product contribution to a snapshot, kept only for the latest one to compute live deltas."""
+
+    snapshot = models.ForeignKey(InventoryValuationSnapshot, on_delete=models.CASCADE, related_name="lines")
+    product = models.ForeignKey("catalog.Product", on_delete=models.CASCADE, related_name="+")
+    total_units = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    store_owned_units = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    investor_assigned_units = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    retail_value = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    store_owned_cost_value = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    investor_assigned_cost_value = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    store_owned_potential_profit = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    investor_assigned_potential_profit = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["snapshot", "product"], name="unique_inv_valuation_line_product"),
+        ]
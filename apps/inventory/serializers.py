@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from apps.inventory.models import InventoryMovement
+from apps.inventory.models import InventoryMovement, InventoryValuationSnapshot
 
 
 class InventoryMovementSerializer(serializers.ModelSerializer):
@@ -29,3 +29,37 @@ class InventoryMovementSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data["created_by"] = self.context["request"].user
         return super().create(validated_data)
+
+
+class InventoryValuationSnapshotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = InventoryValuationSnapshot
+        fields = [
+            "id",
+            "taken_at",
+            "cost_value",
+            "retail_value",
+            "potential_profit",
+            "gross_margin_pct",
+            "total_units",
+            "store_owned_units",
+            "investor_assigned_units",
+            "store_owned_cost_value",
+            "investor_assigned_cost_value",
+            "store_owned_potential_profit",
+            "investor_assigned_potential_profit",
+            "products_count",
+        ]
+        read_only_fields = fields
+
+
+class InventoryValuationHistoryQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        date_from = attrs.get("date_from")
+        date_to = attrs.get("date_to")
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError({"date_from": "date_from must be before or equal to date_to."})
+        return attrs
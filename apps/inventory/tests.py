@@ -1,12 +1,19 @@
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from apps.audit.models import AuditLog
 from apps.catalog.models import Product
-from apps.inventory.models import InventoryMovement, MovementType
+from apps.inventory.models import InventoryMovement, InventoryValuationLine, InventoryValuationSnapshot, MovementType
+from apps.inventory.valuation import current_inventory_valuation
+from apps.investors.models import Investor, InvestorAssignment
+from apps.sales.views_metrics import SalesMetricsMixin
 
 User = get_user_model()
 
@@ -103,3 +110,81 @@ class InventoryAuditTests(APITestCase):
     def test_inventory_movements_require_authentication(self):
         response = self.client.get("/api/v1/inventory/movements/")
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class InventoryValuationSnapshotTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin", password="admin123", role="ADMIN")
+        self.helmet = Product.objects.create(sku="VAL-001", name="Casco", default_price=Decimal("100.00"), cost_price=Decimal("60.00"))
+        self.gloves = Product.objects.create(sku="VAL-002", name="Guantes", default_price=Decimal("80.00"), cost_price=Decimal("33.33"))
+        self.visor = Product.objects.create(sku="VAL-003", name="Mica", default_price=Decimal("45.50"))
+        for index, (product, qty) in enumerate(((self.helmet, "5.00"), (self.gloves, "3.00"), (self.visor, "7.00"))):
+            self._move(product, qty, f"seed-{index}")
+        investor = Investor.objects.create(display_name="Inversionista")
+        self.assignment = InvestorAssignment.objects.create(
+            investor=investor,
+            product=self.helmet,
+            qty_assigned=Decimal("2.00"),
+            unit_cost=Decimal("55.00"),
+        )
+
+    def _move(self, product, qty, reference_id):
+        InventoryMovement.objects.create(
+            product=product,
+            movement_type=MovementType.INBOUND if Decimal(qty) > 0 else MovementType.OUTBOUND,
+            quantity_delta=Decimal(qty),
+            reference_type="test",
+            reference_id=reference_id,
+            created_by=self.admin,
+        )
+
+    def assertMatchesLiveValuation(self):
+        live = SalesMetricsMixin._live_inventory_snapshot()
+        valuation = current_inventory_valuation()
+        for key, value in live.items():
+            with self.subTest(key=key):
+                self.assertEqual(valuation[key], Decimal(str(value)).quantize(Decimal("0.01")))
+
+    def test_snapshot_plus_live_deltas_matches_full_valuation(self):
+        self.assertIsNone(current_inventory_valuation())
+        # Age the seed data so only rows changed after the snapshot are revalued live.
+        yesterday = timezone.now() - timedelta(days=1)
+        InventoryMovement.objects.update(created_at=yesterday)
+        Product.objects.update(updated_at=yesterday)
+        InvestorAssignment.objects.update(created_at=yesterday)
+        call_command("snapshot_inventory_valuation", stdout=StringIO())
+        snapshot = InventoryValuationSnapshot.objects.get()
+        self.assertEqual(snapshot.products_count, 3)
+        self.assertEqual(snapshot.investor_assigned_units, Decimal("2.00"))
+        self.assertMatchesLiveValuation()
+
+        self._move(self.gloves, "-1.00", "sale-1")
+        self.visor.default_price = Decimal("50.00")
+        self.visor.save(update_fields=["default_price", "updated_at"])
+        self.assignment.qty_sold = Decimal("1.00")
+        self.assignment.save(update_fields=["qty_sold"])
+        Product.objects.create(sku="VAL-004", name="Chaleco", default_price=Decimal("300.00"), cost_price=Decimal("200.00"))
+        self.assertMatchesLiveValuation()
+
+        self.assignment.delete()
+        self.gloves.is_active = False
+        self.gloves.save(update_fields=["is_active", "updated_at"])
+        self.assertMatchesLiveValuation()
+
+    def test_only_latest_snapshot_keeps_lines_and_history_lists_all(self):
+        call_command("snapshot_inventory_valuation", stdout=StringIO())
+        self._move(self.helmet, "4.00", "restock")
+        call_command("snapshot_inventory_valuation", stdout=StringIO())
+        latest = InventoryValuationSnapshot.objects.order_by("-taken_at").first()
+        self.assertEqual(set(InventoryValuationLine.objects.values_list("snapshot_id", flat=True)), {latest.id})
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get("/api/v1/inventory/valuation-history/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(response.data["results"][0]["id"], str(latest.id))
+        self.assertEqual(response.data["results"][0]["total_units"], "19.00")
+
+        metrics = self.client.get("/api/v1/metrics/")
+        self.assertEqual(metrics.data["inventory_snapshot"]["snapshot_taken_at"], latest.taken_at)
+        self.assertEqual(metrics.data["inventory_snapshot"]["total_units"], Decimal("19.00"))
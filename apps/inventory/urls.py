@@ -1,12 +1,13 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from apps.inventory.views import InventoryMovementViewSet, InventoryStockView
+from apps.inventory.views import InventoryMovementViewSet, InventoryStockView, InventoryValuationHistoryView
 
 router = DefaultRouter()
 router.register("movements", InventoryMovementViewSet, basename="inventory-movement")
 
 urlpatterns = [
     path("stocks/", InventoryStockView.as_view(), name="inventory-stock"),
+    path("valuation-history/", InventoryValuationHistoryView.as_view(), name="inventory-valuation-history"),
 ]
 urlpatterns += router.urls
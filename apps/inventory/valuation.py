@@ -0,0 +1,149 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from apps.catalog.models import Product
+from apps.inventory.models import InventoryMovement, InventoryValuationLine, InventoryValuationSnapshot
+from apps.investors.models import InvestorAssignment
+
+ZERO = Decimal("0")
+CENT = Decimal("0.01")
+UNIT_FIELDS = ("total_units", "store_owned_units", "investor_assigned_units")
+VALUE_FIELDS = (
+    "retail_value",
+    "store_owned_cost_value",
+    "investor_assigned_cost_value",
+    "store_owned_potential_profit",
+    "investor_assigned_potential_profit",
+)
+LINE_FIELDS = UNIT_FIELDS + VALUE_FIELDS
+# Rows inserted by a transaction that commits after the snapshot read carry an earlier
+# created_at; looking back a little further keeps those products in the live delta.
+CHANGE_DETECTION_MARGIN = timedelta(minutes=5)
+
+
+def _to_decimal(value):
+    return Decimal(str(value)) if value is not None else ZERO
+
+
+def product_valuations(product_ids=None):
+    """Per-product valuation contributions keyed by product id.
+
+    Follows the rules of the live metrics snapshot: stock, retail value and the
+    store-owned bucket count active products only, while open investor assignments
+    count regardless of the product's status. Products contributing nothing are omitted.
+    """
+    movements = InventoryMovement.objects.all()
+    assignments = InvestorAssignment.objects.all()
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+        assignments = assignments.filter(product_id__in=product_ids)
+
+    stock = dict(movements.values("product_id").annotate(total=Sum("quantity_delta")).order_by().values_list("product_id", "total"))
+    remaining_expr = F("qty_assigned") - F("qty_sold")
+    assigned = {
+        row["product_id"]: row
+        for row in assignments.values("product_id")
+        .annotate(
+            remaining=Sum(remaining_expr),
+            cost=Sum(ExpressionWrapper(remaining_expr * F("unit_cost"), output_field=DecimalField(max_digits=18, decimal_places=4))),
+        )
+        .order_by()
+    }
+
+    products = Product.objects.filter(Q(is_active=True) | Q(pk__in=[pk for pk, row in assigned.items() if row["remaining"]]))
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+
+    valuations = {}
+    for product in products.values("id", "is_active", "default_price", "cost_price").iterator(chunk_size=2000):
+        price = _to_decimal(product["default_price"])
+        cost = _to_decimal(product["cost_price"])
+        assignment = assigned.get(product["id"], {})
+        remaining = _to_decimal(assignment.get("remaining"))
+        row = dict.fromkeys(LINE_FIELDS, ZERO)
+        if product["is_active"]:
+            units = _to_decimal(stock.get(product["id"]))
+            store_units = max(units - remaining, ZERO)
+            row.update(
+                total_units=units,
+                store_owned_units=store_units,
+                retail_value=units * price,
+                store_owned_cost_value=store_units * cost,
+                store_owned_potential_profit=store_units * (price - cost),
+            )
+        if remaining:
+            assigned_cost = _to_decimal(assignment.get("cost"))
+            row.update(
+                investor_assigned_units=remaining,
+                investor_assigned_cost_value=assigned_cost,
+                investor_assigned_potential_profit=remaining * price - assigned_cost,
+            )
+        if any(row.values()):
+            valuations[product["id"]] = row
+    return valuations
+
+
+def _sum_rows(rows):
+    totals = dict.fromkeys(LINE_FIELDS, ZERO)
+    for row in rows:
+        for field in LINE_FIELDS:
+            totals[field] += row[field]
+    return totals
+
+
+def valuation_summary(totals):
+    """Snapshot-shaped totals (the ``inventory_snapshot`` metrics payload) from summed line fields."""
+    summary = {field: _to_decimal(totals[field]).quantize(CENT) for field in LINE_FIELDS}
+    summary["cost_value"] = (
+        _to_decimal(totals["store_owned_cost_value"]) + _to_decimal(totals["investor_assigned_cost_value"])
+    ).quantize(CENT)
+    summary["potential_profit"] = (
+        _to_decimal(totals["store_owned_potential_profit"]) + _to_decimal(totals["investor_assigned_potential_profit"])
+    ).quantize(CENT)
+    summary["gross_margin_pct"] = (
+        (summary["potential_profit"] / summary["retail_value"] * Decimal("100.00")).quantize(CENT)
+        if summary["retail_value"] > 0
+        else Decimal("0.00")
+    )
+    return summary
+
+
+@transaction.atomic
+def take_inventory_valuation_snapshot():
+    """Store current valuation totals and per-product lines; older snapshots keep only their totals."""
+    taken_at = timezone.now()
+    valuations = product_valuations()
+    snapshot = InventoryValuationSnapshot.objects.create(
+        taken_at=taken_at,
+        products_count=len(valuations),
+        **valuation_summary(_sum_rows(valuations.values())),
+    )
+    InventoryValuationLine.objects.bulk_create(
+        [InventoryValuationLine(snapshot=snapshot, product_id=product_id, **row) for product_id, row in valuations.items()],
+        batch_size=1000,
+    )
+    InventoryValuationLine.objects.exclude(snapshot=snapshot).delete()
+    return snapshot
+
+
+def current_inventory_valuation():
+    """Latest snapshot with products changed since then revalued live, or ``None`` without snapshots."""
+    snapshot = InventoryValuationSnapshot.objects.order_by("-taken_at").first()
+    if snapshot is None:
+        return None
+
+    since = snapshot.taken_at - CHANGE_DETECTION_MARGIN
+    touched = set(InventoryMovement.objects.filter(created_at__gte=since).values_list("product_id", flat=True))
+    touched.update(Product.objects.filter(updated_at__gte=since).values_list("id", flat=True))
+    touched.update(InvestorAssignment.objects.filter(created_at__gte=since).values_list("product_id", flat=True))
+    # Assignment edits and deletions leave no timestamp behind, so investor-backed products are always revalued.
+    touched.update(snapshot.lines.filter(investor_assigned_units__gt=0).values_list("product_id", flat=True))
+
+    untouched = snapshot.lines.exclude(product_id__in=touched).aggregate(**{field: Sum(field) for field in LINE_FIELDS})
+    live = _sum_rows(product_valuations(touched).values()) if touched else dict.fromkeys(LINE_FIELDS, ZERO)
+    totals = {field: _to_decimal(untouched[field]) + live[field] for field in LINE_FIELDS}
+    return {**valuation_summary(totals), "snapshot_taken_at": snapshot.taken_at}
@@ -4,9 +4,14 @@ from rest_framework import generics, viewsets
 from rest_framework.response import Response
 
 from apps.audit.services import record_audit
+from apps.common.dates import filter_local_date_range
 from apps.common.permissions import RolePermission
-from apps.inventory.models import InventoryMovement, MovementType
-from apps.inventory.serializers import InventoryMovementSerializer
+from apps.inventory.models import InventoryMovement, InventoryValuationSnapshot, MovementType
+from apps.inventory.serializers import (
+    InventoryMovementSerializer,
+    InventoryValuationHistoryQuerySerializer,
+    InventoryValuationSnapshotSerializer,
+)
 
 
 class InventoryMovementViewSet(viewsets.ModelViewSet):
@@ -60,3 +65,21 @@ class InventoryStockView(generics.GenericAPIView):
             stock=Coalesce(Sum("quantity_delta"), 0, output_field=DecimalField(max_digits=12, decimal_places=2))
         )
         return Response(list(queryset))
+
+
+class InventoryValuationHistoryView(generics.ListAPIView):
+    """Valuation totals over time, one row per ``snapshot_inventory_valuation`` run."""
+
+    serializer_class = InventoryValuationSnapshotSerializer
+    permission_classes = [RolePermission]
+    capability_map = {"get": ["metrics.view"]}
+
+    def get_queryset(self):
+        query_serializer = InventoryValuationHistoryQuerySerializer(data=self.request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        return filter_local_date_range(
+            InventoryValuationSnapshot.objects.order_by("-taken_at"),
+            "taken_at",
+            query_serializer.validated_data.get("date_from"),
+            query_serializer.validated_data.get("date_to"),
+        )
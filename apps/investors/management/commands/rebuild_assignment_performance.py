@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.investors.performance import rebuild_assignment_performance
+
+
+class Command(BaseCommand):
+    help = "Recalcula el desempeno por asignacion de inversionista desde las ventas confirmadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Lineas de rentabilidad leidas por lote del cursor.")
+
+    def handle(self, *args, **options):
+        written, differed = rebuild_assignment_performance(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Desempeno recalculado para {written} asignaciones (diferencias corregidas: {differed}).")
+        )
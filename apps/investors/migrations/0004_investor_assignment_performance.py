@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0003_alter_investor_user_nullable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvestorAssignmentPerformance',
+            fields=[
+                ('assignment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='performance', serialize=False, to='investors.investorassignment')),
+                ('sales_count', models.IntegerField(default=0)),
+                ('units_sold', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cogs', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('investor_profit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('unit_days', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('roi', models.DecimalField(blank=True, decimal_places=4, max_digits=10, null=True)),
+                ('avg_days_to_sell', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('investor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignment_performance', to='investors.investor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['investor', 'investor_profit'], name='assignment_perf_inv_profit_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 import uuid
 
+from decimal import Decimal
+
 from django.db import models
 
 
@@ -30,3 +32,34 @@ class InvestorAssignment(models.Model):
             models.CheckConstraint(check=models.Q(qty_sold__gte=0), name="investor_assignment_qty_sold_gte_zero"),
             models.CheckConstraint(check=models.Q(qty_sold__lte=models.F("qty_assigned")), name="investor_assignment_qty_sold_lte_assigned"),
         ]
+
+
+class InvestorAssignmentPerformance(models.Model):
+    """Sales performance of one assignment, kept current by ``apply/revert_sale_profitability``.
+
+    Every column is an additive total over the assignment's confirmed sale lines, so voids subtract
+    exactly what confirmations added; ``roi`` and ``avg_days_to_sell`` are derived from them on
+    each update so they can be sorted on.
+    """
+
+    assignment = models.OneToOneField(InvestorAssignment, on_delete=models.CASCADE, primary_key=True, related_name="performance")
+    investor = models.ForeignKey(Investor, on_delete=models.CASCADE, related_name="assignment_performance")
+    sales_count = models.IntegerField(default=0)
+    units_sold = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cogs = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    investor_profit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Sum of units sold x whole local days between the assignment and the sale.
+    unit_days = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    roi = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
+    avg_days_to_sell = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["investor", "investor_profit"], name="assignment_perf_inv_profit_idx")]
+
+    def refresh_ratios(self):
+        self.roi = (Decimal(self.investor_profit) / Decimal(self.cogs)).quantize(Decimal("0.0001")) if self.cogs > 0 else None
+        self.avg_days_to_sell = (
+            (Decimal(self.unit_days) / Decimal(self.units_sold)).quantize(Decimal("0.01")) if self.units_sold > 0 else None
+        )
@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.investors.models import InvestorAssignmentPerformance
+from apps.sales.models import SaleLineProfitability, SaleStatus
+
+PERFORMANCE_FIELDS = ("sales_count", "units_sold", "revenue", "cogs", "investor_profit", "unit_days")
+
+
+def _accumulate(totals, seen, line, sold_at, sign):
+    assignment = line.assignment
+    row = totals.get(assignment.id)
+    if row is None:
+        row = totals[assignment.id] = {"investor_id": assignment.investor_id, **{name: Decimal("0.00") for name in PERFORMANCE_FIELDS}}
+        row["sales_count"] = 0
+    if (assignment.id, line.snapshot_id) not in seen:
+        seen.add((assignment.id, line.snapshot_id))
+        row["sales_count"] += sign
+    days = (timezone.localdate(sold_at) - timezone.localdate(assignment.created_at)).days
+    row["units_sold"] += sign * line.qty_consumed
+    row["revenue"] += sign * line.line_revenue
+    row["cogs"] += sign * line.line_cogs
+    row["investor_profit"] += sign * line.investor_profit_share
+    row["unit_days"] += sign * line.qty_consumed * max(days, 0)
+
+
+def record_assignment_performance(lines, *, sold_at, sign=1):
+    """Add (sign=1, confirm) or remove (sign=-1, void) one sale's profitability lines.
+
+    ``lines`` are ``SaleLineProfitability`` rows with ``assignment`` loaded; store-owned lines are
+    skipped. Runs inside the apply/revert transaction, which already holds the assignment locks.
+    """
+    totals, seen = {}, set()
+    for line in lines:
+        if line.assignment_id is not None:
+            _accumulate(totals, seen, line, sold_at, sign)
+    if not totals:
+        return
+
+    InvestorAssignmentPerformance.objects.bulk_create(
+        [InvestorAssignmentPerformance(assignment_id=assignment_id, investor_id=row["investor_id"]) for assignment_id, row in totals.items()],
+        ignore_conflicts=True,
+    )
+    rows = list(InvestorAssignmentPerformance.objects.select_for_update().filter(assignment_id__in=totals).order_by("pk"))
+    for performance in rows:
+        for name in PERFORMANCE_FIELDS:
+            setattr(performance, name, getattr(performance, name) + totals[performance.assignment_id][name])
+        performance.refresh_ratios()
+        performance.updated_at = timezone.now()
+    InvestorAssignmentPerformance.objects.bulk_update(rows, [*PERFORMANCE_FIELDS, "roi", "avg_days_to_sell", "updated_at"])
+
+
+def assignment_performance_from_sales(*, chunk_size=500):
+    """Performance totals recomputed from the profitability lines of every confirmed sale."""
+    lines = (
+        SaleLineProfitability.objects.filter(assignment__isnull=False, snapshot__sale__status=SaleStatus.CONFIRMED)
+        .select_related("assignment", "snapshot__sale")
+        .order_by("pk")
+    )
+    totals, seen = {}, set()
+    for line in lines.iterator(chunk_size=chunk_size):
+        _accumulate(totals, seen, line, line.snapshot.sale.confirmed_at, 1)
+    return totals
+
+
+@transaction.atomic
+def rebuild_assignment_performance(*, chunk_size=500):
+    """Replace every performance row with totals recomputed from confirmed sales.
+
+    Returns ``(rows_written, rows_that_differed)``.
+    """
+    totals = assignment_performance_from_sales(chunk_size=chunk_size)
+    stored = {
+        performance.assignment_id: performance
+        for performance in InvestorAssignmentPerformance.objects.select_for_update().order_by("pk")
+    }
+    zero = {name: Decimal("0.00") for name in PERFORMANCE_FIELDS}
+    differed = 0
+    for assignment_id in set(totals) | set(stored):
+        expected = totals.get(assignment_id, zero)
+        found = stored.get(assignment_id)
+        if any(Decimal(getattr(found, name) if found else 0) != Decimal(expected[name]) for name in PERFORMANCE_FIELDS):
+            differed += 1
+
+    InvestorAssignmentPerformance.objects.all().delete()
+    rows = []
+    for assignment_id, row in totals.items():
+        performance = InvestorAssignmentPerformance(assignment_id=assignment_id, **row)
+        performance.refresh_ratios()
+        rows.append(performance)
+    InvestorAssignmentPerformance.objects.bulk_create(rows, batch_size=chunk_size)
+    return len(rows), differed
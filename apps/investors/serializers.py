@@ -4,6 +4,7 @@ from django.db import transaction
 from rest_framework import serializers
 
 from apps.catalog.models import Product
+from apps.catalog.serializers import CartProductField, load_cart_products
 from apps.investors.models import Investor, InvestorAssignment
 from apps.ledger.models import LedgerEntry
 from apps.ledger.services import create_capital_deposit, current_balances
@@ -82,9 +83,32 @@ class LedgerEntrySerializer(serializers.ModelSerializer):
             "reference_id",
             "note",
             "created_at",
+            "sequence",
+            "capital_after",
+            "inventory_after",
+            "profit_after",
         ]
 
 
+class InvestorStatementQuerySerializer(serializers.Serializer):
+    """``?from=YYYY-MM-DD&to=YYYY-MM-DD`` in local days; both optional."""
+
+    def get_fields(self):
+        # ``from`` is a Python keyword, so the fields cannot be declared as class attributes.
+        return {"from": serializers.DateField(required=False), "to": serializers.DateField(required=False)}
+
+    def validate(self, attrs):
+        if attrs.get("from") and attrs.get("to") and attrs["from"] > attrs["to"]:
+            raise serializers.ValidationError({"from": "from must be before or equal to to."})
+        return attrs
+
+
+class InvestorBalancesQuerySerializer(serializers.Serializer):
+    """``?as_of=YYYY-MM-DD``: balances at the end of that local day (today by default)."""
+
+    as_of = serializers.DateField(required=False)
+
+
 class InvestorAssignmentSerializer(serializers.ModelSerializer):
     qty_available = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
     product_sku = serializers.CharField(source="product.sku", read_only=True)
@@ -121,6 +145,41 @@ class InvestorAssignmentSerializer(serializers.ModelSerializer):
         return format_decimal(obj.qty_assigned * obj.unit_cost)
 
 
+class InvestorAssignmentPerformanceSerializer(serializers.ModelSerializer):
+    """An assignment with the sales totals annotated by ``with_performance``."""
+
+    product_sku = serializers.CharField(source="product.sku", read_only=True)
+    product_name = serializers.CharField(source="product.name", read_only=True)
+    sales_count = serializers.IntegerField(read_only=True)
+    units_sold = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    cogs = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    investor_profit = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    roi = serializers.DecimalField(max_digits=10, decimal_places=4, read_only=True, allow_null=True)
+    avg_days_to_sell = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, allow_null=True)
+
+    class Meta:
+        model = InvestorAssignment
+        fields = [
+            "id",
+            "product",
+            "product_sku",
+            "product_name",
+            "qty_assigned",
+            "qty_sold",
+            "unit_cost",
+            "created_at",
+            "sales_count",
+            "units_sold",
+            "revenue",
+            "cogs",
+            "investor_profit",
+            "roi",
+            "avg_days_to_sell",
+        ]
+        read_only_fields = fields
+
+
 class InvestorAmountSerializer(serializers.Serializer):
     amount = serializers.DecimalField(max_digits=12, decimal_places=2)
     note = serializers.CharField(required=False, allow_blank=True)
@@ -132,7 +191,7 @@ class InvestorAmountSerializer(serializers.Serializer):
 
 
 class InvestorPurchaseLineSerializer(serializers.Serializer):
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    product = CartProductField(queryset=Product.objects.all())
     qty = serializers.DecimalField(max_digits=12, decimal_places=2)
     unit_cost_gross = serializers.DecimalField(max_digits=12, decimal_places=2)
 
@@ -156,6 +215,10 @@ class InvestorPurchaseSerializer(serializers.Serializer):
             raise serializers.ValidationError("La tasa de IVA debe ser mayor o igual a 0.")
         return value
 
+    def to_internal_value(self, data):
+        self.context["cart_products"] = load_cart_products(data)
+        return super().to_internal_value(data)
+
     def validate_lines(self, value):
         if not value:
             raise serializers.ValidationError("Debes enviar al menos una línea.")
@@ -0,0 +1,161 @@
+import csv
+import json
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+from apps.common.dates import local_date_bounds
+from apps.ledger.models import InvestorBalance, LedgerEntry
+from apps.ledger.services import BALANCE_FIELDS, balances_as_of
+
+STATEMENT_CHUNK_SIZE = 500
+
+STATEMENT_COLUMNS = [
+    "record_type",
+    "sequence",
+    "created_at",
+    "entry_type",
+    "reference_type",
+    "reference_id",
+    "note",
+    "entries_count",
+    "capital_delta",
+    "inventory_delta",
+    "profit_delta",
+    "capital_after",
+    "inventory_after",
+    "profit_after",
+]
+
+# JSON layout: record_type -> (top-level key, holds a list)
+STATEMENT_SECTIONS = {
+    "opening": ("opening", False),
+    "entry": ("entries", True),
+    "subtotal": ("subtotals", True),
+    "closing": ("closing", False),
+}
+
+
+def _after_columns(balances):
+    return {f"{name}_after": balances[name] for name, _ in BALANCE_FIELDS}
+
+
+def _local_iso(value):
+    return timezone.localtime(value).isoformat() if value else None
+
+
+def iter_statement_rows(investor, date_from=None, date_to=None, chunk_size=STATEMENT_CHUNK_SIZE):
+    """Yield ``opening``, ``entry``, per-type ``subtotal`` and ``closing`` rows for one investor.
+
+    The opening balance is the running balance stamped on the last entry before the period
+    (one index lookup); entries are read through ``iterator(chunk_size=...)`` (a server-side
+    cursor on PostgreSQL) and carry their own running balances, so memory stays bounded by
+    the chunk size.
+    """
+    start, end = local_date_bounds(date_from, date_to)
+    if start is not None:
+        opening = balances_as_of(investor, start, inclusive=False)
+    else:
+        opening = InvestorBalance(investor_id=investor.pk).as_dict()
+    yield {"record_type": "opening", "created_at": _local_iso(start), **_after_columns(opening)}
+
+    entries = LedgerEntry.objects.filter(investor_id=investor.pk)
+    if start is not None:
+        entries = entries.filter(created_at__gte=start)
+    if end is not None:
+        entries = entries.filter(created_at__lt=end)
+
+    closing = dict(opening)
+    subtotals = {}
+    for entry in entries.order_by("sequence").iterator(chunk_size=chunk_size):
+        subtotal = subtotals.setdefault(entry.entry_type, {"entries_count": 0, **{delta: Decimal("0.00") for _, delta in BALANCE_FIELDS}})
+        subtotal["entries_count"] += 1
+        for name, delta in BALANCE_FIELDS:
+            subtotal[delta] += getattr(entry, delta)
+            closing[name] = getattr(entry, f"{name}_after")
+        yield {
+            "record_type": "entry",
+            "sequence": entry.sequence,
+            "created_at": _local_iso(entry.created_at),
+            "entry_type": entry.entry_type,
+            "reference_type": entry.reference_type,
+            "reference_id": entry.reference_id,
+            "note": entry.note,
+            **{delta: getattr(entry, delta) for _, delta in BALANCE_FIELDS},
+            **_after_columns(closing),
+        }
+
+    for entry_type, subtotal in sorted(subtotals.items()):
+        yield {"record_type": "subtotal", "entry_type": entry_type, **subtotal}
+
+    yield {
+        "record_type": "closing",
+        "created_at": _local_iso(end),
+        "entries_count": sum(subtotal["entries_count"] for subtotal in subtotals.values()),
+        **{delta: closing[name] - opening[name] for name, delta in BALANCE_FIELDS},
+        **_after_columns(closing),
+    }
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the formatted line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+class StatementCSVRenderer(BaseRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+    def stream(self, rows):
+        writer = csv.DictWriter(_Echo(), fieldnames=STATEMENT_COLUMNS, restval="")
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow({key: "" if value is None else value for key, value in row.items()})
+
+
+class StatementJSONRenderer(BaseRenderer):
+    """One JSON document, ``{"opening", "entries", "subtotals", "closing"}``, written row by row."""
+
+    media_type = "application/json"
+    format = "json"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+    def stream(self, rows):
+        sections = list(dict.fromkeys(STATEMENT_SECTIONS.values()))
+        opened = -1
+        list_open = False
+        first_item = True
+        yield "{"
+        for row in rows:
+            target = sections.index(STATEMENT_SECTIONS[row["record_type"]])
+            # Open every section up to the row's one, so empty sections still appear.
+            while opened < target:
+                if list_open:
+                    yield "]"
+                    list_open = False
+                opened += 1
+                key, many = sections[opened]
+                yield f"{', ' if opened else ''}{json.dumps(key)}: "
+                if many:
+                    yield "["
+                    list_open = True
+                elif opened < target:
+                    yield "null"
+                first_item = True
+            payload = {name: value for name, value in row.items() if name != "record_type"}
+            yield ("" if first_item else ", ") + json.dumps(payload, cls=DjangoJSONEncoder)
+            first_item = False
+        if list_open:
+            yield "]"
+        yield "}"
@@ -1,13 +1,34 @@
+import csv
+import json
+from datetime import date, timedelta
 from decimal import Decimal
+from io import StringIO
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
+from django.utils import timezone
 from rest_framework.test import APITestCase
 
 from apps.audit.models import AuditLog
 from apps.catalog.models import Product
-from apps.investors.models import Investor
+from apps.common.dates import local_day_start
+from apps.investors.models import Investor, InvestorAssignment, InvestorAssignmentPerformance
 from apps.inventory.models import InventoryMovement, MovementType
-from apps.ledger.models import LedgerEntry, LedgerEntryType
+from apps.ledger.models import InvestorBalance, LedgerCheckpoint, LedgerEntry, LedgerEntryType
+from apps.investors.performance import rebuild_assignment_performance
+from apps.ledger.services import (
+    balances_as_of,
+    create_capital_deposit,
+    create_capital_withdrawal,
+    current_balances,
+    ledger_balances,
+    verify_investor_balances,
+    write_ledger_checkpoints,
+)
+
+from apps.sales.models import SaleLineProfitability
 
 User = get_user_model()
 
@@ -202,6 +223,43 @@ class InvestorLedgerTests(APITestCase):
         self.assertEqual(products.status_code, 200)
         self.assertEqual(Decimal(products.data["results"][0]["investor_assignable_qty"]), Decimal("8.00"))
 
+    def test_repeat_purchase_at_same_cost_tops_up_the_assignment(self):
+        InventoryMovement.objects.create(
+            product=self.product,
+            movement_type=MovementType.ADJUSTMENT,
+            quantity_delta=Decimal("10.00"),
+            reference_type="seed_stock",
+            reference_id="inv-stock-3",
+            created_by=self.admin,
+        )
+        self.auth_as("admin_inv", "admin123")
+        self.client.post(f"/api/v1/investors/{self.investor.id}/deposit/", {"amount": "500.00"}, format="json")
+        payload = {
+            "tax_rate_pct": "16.00",
+            "lines": [
+                {"product": str(self.product.id), "qty": "2.00", "unit_cost_gross": "50.00"},
+                {"product": str(self.product.id), "qty": "1.00", "unit_cost_gross": "60.00"},
+            ],
+        }
+        first = self.client.post(f"/api/v1/investors/{self.investor.id}/purchases/", payload, format="json")
+        self.assertEqual(first.status_code, 201)
+        second = self.client.post(f"/api/v1/investors/{self.investor.id}/purchases/", payload, format="json")
+        self.assertEqual(second.status_code, 201)
+
+        assignments = InvestorAssignment.objects.filter(investor=self.investor).order_by("unit_cost")
+        self.assertEqual([(a.unit_cost, a.qty_assigned) for a in assignments], [(Decimal("50.00"), Decimal("4.00")), (Decimal("60.00"), Decimal("2.00"))])
+        self.assertEqual(Decimal(second.data["balances"]["capital"]), Decimal("180.00"))
+        self.assertEqual(LedgerEntry.objects.filter(investor=self.investor, reference_type="investor_assignment").count(), 4)
+        self.assertEqual(AuditLog.objects.filter(action="investor.assignment.update").count(), 2)
+
+        over = self.client.post(
+            f"/api/v1/investors/{self.investor.id}/purchases/",
+            {"tax_rate_pct": "16.00", "lines": [{"product": str(self.product.id), "qty": "5.00", "unit_cost_gross": "1.00"}]},
+            format="json",
+        )
+        self.assertEqual(over.status_code, 400)
+        self.assertIn(str(self.product.id), over.data["fields"]["lines"])
+
     def test_purchase_rejected_when_insufficient_capital_or_assignable_stock(self):
         InventoryMovement.objects.create(
             product=self.product,
@@ -265,3 +323,468 @@ class InvestorLedgerTests(APITestCase):
             format="json",
         )
         self.assertEqual(purchase_response.status_code, 403)
+
+
+class InvestorBalanceTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_bal", password="admin123", role="ADMIN")
+        self.investor = Investor.objects.create(display_name="Balance Uno")
+        self.other = Investor.objects.create(display_name="Balance Dos")
+
+    def entry(self, investor, **deltas):
+        return LedgerEntry(
+            investor=investor,
+            entry_type=LedgerEntryType.PROFIT_SHARE,
+            capital_delta=deltas.get("capital", Decimal("0.00")),
+            inventory_delta=deltas.get("inventory", Decimal("0.00")),
+            profit_delta=deltas.get("profit", Decimal("0.00")),
+            reference_type="seed",
+            reference_id="balance",
+        )
+
+    def test_balance_follows_every_ledger_insert(self):
+        create_capital_deposit(investor=self.investor, amount="300.00", reference_type="seed", reference_id="1")
+        LedgerEntry.objects.bulk_create(
+            [
+                self.entry(self.investor, capital=Decimal("-50.00"), inventory=Decimal("50.00")),
+                self.entry(self.investor, profit=Decimal("12.50")),
+                self.entry(self.other, profit=Decimal("7.00")),
+            ]
+        )
+        create_capital_withdrawal(investor=self.investor, amount="100.00", reference_type="seed", reference_id="2")
+
+        self.assertEqual(
+            current_balances(self.investor),
+            {"capital": Decimal("150.00"), "inventory": Decimal("50.00"), "profit": Decimal("12.50")},
+        )
+        self.assertEqual(current_balances(self.other)["profit"], Decimal("7.00"))
+        self.assertEqual(ledger_balances([self.investor.id])[self.investor.id]["capital"], Decimal("150.00"))
+        self.assertEqual(verify_investor_balances(), [])
+
+    def test_withdrawal_checks_the_materialized_capital(self):
+        create_capital_deposit(investor=self.investor, amount="80.00", reference_type="seed", reference_id="1")
+        with self.assertRaises(ValueError):
+            create_capital_withdrawal(investor=self.investor, amount="80.01", reference_type="seed", reference_id="2")
+        create_capital_withdrawal(investor=self.investor, amount="80.00", reference_type="seed", reference_id="3")
+        self.assertEqual(current_balances(self.investor)["capital"], Decimal("0.00"))
+        self.assertEqual(self.investor.ledger_entries.count(), 2)
+
+    def test_investor_without_entries_reads_zero(self):
+        self.assertEqual(current_balances(self.investor)["capital"], Decimal("0.00"))
+        self.assertFalse(InvestorBalance.objects.filter(investor=self.investor).exists())
+
+    def test_list_and_detail_read_materialized_row(self):
+        create_capital_deposit(investor=self.investor, amount="500.00", reference_type="seed", reference_id="1")
+        InvestorBalance.objects.filter(investor=self.investor).update(capital=Decimal("499.00"))
+        token = self.client.post("/api/v1/auth/token/", {"username": "admin_bal", "password": "admin123"}, format="json").data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        listed = self.client.get("/api/v1/investors/?q=Balance Uno")
+        self.assertEqual(Decimal(listed.data["results"][0]["balances"]["capital"]), Decimal("499.00"))
+        detail = self.client.get(f"/api/v1/investors/{self.other.id}/")
+        self.assertEqual(Decimal(detail.data["balances"]["capital"]), Decimal("0.00"))
+
+    def test_verifier_reports_drift_and_rebuild_repairs_it(self):
+        create_capital_deposit(investor=self.investor, amount="200.00", reference_type="seed", reference_id="1")
+        InvestorBalance.objects.filter(investor=self.investor).update(capital=Decimal("150.00"))
+        InvestorBalance.objects.create(investor=self.other, profit=Decimal("3.00"))
+
+        mismatches = verify_investor_balances()
+        self.assertEqual(
+            [(row["investor_id"], row["field"], row["expected"], row["stored"]) for row in mismatches if row["investor_id"] == self.investor.id],
+            [(self.investor.id, "capital", Decimal("200.00"), Decimal("150.00"))],
+        )
+        self.assertIn((self.other.id, "profit"), {(row["investor_id"], row["field"]) for row in mismatches})
+
+        with self.assertRaises(SystemExit):
+            call_command("reconcile_ledger", stdout=StringIO(), stderr=StringIO())
+
+        call_command("rebuild_investor_balances", stdout=StringIO())
+        self.assertEqual(verify_investor_balances(), [])
+        self.assertEqual(current_balances(self.investor)["capital"], Decimal("200.00"))
+        self.assertEqual(current_balances(self.other)["profit"], Decimal("0.00"))
+
+    def test_entries_carry_sequence_and_running_balances(self):
+        create_capital_deposit(investor=self.investor, amount="300.00", reference_type="seed", reference_id="1")
+        LedgerEntry.objects.bulk_create(
+            [
+                self.entry(self.investor, capital=Decimal("-120.00"), inventory=Decimal("120.00")),
+                self.entry(self.other, profit=Decimal("5.00")),
+                self.entry(self.investor, profit=Decimal("9.99")),
+            ]
+        )
+
+        rows = list(
+            self.investor.ledger_entries.order_by("sequence").values_list("sequence", "capital_after", "inventory_after", "profit_after")
+        )
+        self.assertEqual(
+            rows,
+            [
+                (1, Decimal("300.00"), Decimal("0.00"), Decimal("0.00")),
+                (2, Decimal("180.00"), Decimal("120.00"), Decimal("0.00")),
+                (3, Decimal("180.00"), Decimal("120.00"), Decimal("9.99")),
+            ],
+        )
+        self.assertEqual(self.other.ledger_entries.get().sequence, 1)
+        self.assertEqual(InvestorBalance.objects.get(investor=self.investor).last_sequence, 3)
+
+        token = self.client.post("/api/v1/auth/token/", {"username": "admin_bal", "password": "admin123"}, format="json").data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        statement = self.client.get(f"/api/v1/investors/{self.investor.id}/ledger/")
+        self.assertEqual([row["sequence"] for row in statement.data["results"]], [3, 2, 1])
+        self.assertEqual(Decimal(statement.data["results"][1]["capital_after"]), Decimal("180.00"))
+
+    def test_balances_as_of_reads_the_last_entry_before_the_date(self):
+        first = create_capital_deposit(investor=self.investor, amount="100.00", reference_type="seed", reference_id="1")
+        create_capital_deposit(investor=self.investor, amount="50.00", reference_type="seed", reference_id="2")
+        LedgerEntry.objects.filter(pk=first.pk).update(created_at=timezone.now() - timedelta(days=3))
+
+        self.assertEqual(balances_as_of(self.investor, timezone.now() - timedelta(days=4))["capital"], Decimal("0.00"))
+        self.assertEqual(balances_as_of(self.investor, timezone.now() - timedelta(days=1))["capital"], Decimal("100.00"))
+        self.assertEqual(balances_as_of(self.investor, timezone.now())["capital"], Decimal("150.00"))
+
+    def test_verifier_flags_running_balance_drift(self):
+        entry = create_capital_deposit(investor=self.investor, amount="60.00", reference_type="seed", reference_id="1")
+        LedgerEntry.objects.filter(pk=entry.pk).update(capital_after=Decimal("61.00"))
+        self.assertEqual(
+            [(row["field"], row["stored"]) for row in verify_investor_balances()],
+            [("capital_after", Decimal("61.00"))],
+        )
+
+
+class ReconcileLedgerTests(APITestCase):
+    def setUp(self):
+        self.investor = Investor.objects.create(display_name="Reconcile Uno")
+        self.other = Investor.objects.create(display_name="Reconcile Dos")
+        self.product = Product.objects.create(sku="REC-001", name="Casco", default_price=Decimal("100.00"))
+        create_capital_deposit(investor=self.investor, amount="500.00", reference_type="seed", reference_id="1")
+        create_capital_deposit(investor=self.other, amount="300.00", reference_type="seed", reference_id="2")
+        self.assignment = InvestorAssignment.objects.create(
+            investor=self.investor, product=self.product, qty_assigned=Decimal("5.00"), unit_cost=Decimal("40.00")
+        )
+
+    def reconcile(self, *args):
+        out = StringIO()
+        try:
+            call_command("reconcile_ledger", "--json", *args, stdout=out, stderr=StringIO())
+            exit_code = 0
+        except SystemExit as exc:
+            exit_code = exc.code
+        return exit_code, json.loads(out.getvalue())
+
+    def test_consistent_ledger_reports_ok(self):
+        exit_code, report = self.reconcile()
+        self.assertEqual(exit_code, 0)
+        self.assertTrue(report["ok"])
+        self.assertEqual((report["investors_checked"], report["assignments_checked"]), (2, 1))
+
+    def test_reports_balance_and_assignment_drift_with_parallel_jobs(self):
+        InvestorAssignment.objects.filter(pk=self.assignment.pk).update(qty_sold=Decimal("2.00"))
+        InvestorBalance.objects.filter(investor=self.other).update(capital=Decimal("299.00"))
+
+        for jobs in ("1", "3"):
+            with self.subTest(jobs=jobs):
+                exit_code, report = self.reconcile(f"--jobs={jobs}")
+                self.assertEqual(exit_code, 1)
+                self.assertFalse(report["ok"])
+                self.assertEqual(
+                    report["balance_mismatches"],
+                    [{"investor_id": str(self.other.id), "field": "capital", "expected": "300.00", "stored": "299.00"}],
+                )
+                self.assertEqual(
+                    [(row["assignment_id"], row["expected"], row["found"]) for row in report["assignment_mismatches"]],
+                    [(str(self.assignment.id), "0.00", "2.00")],
+                )
+
+    def test_since_limits_the_check_to_recent_activity(self):
+        old = timezone.now() - timedelta(days=10)
+        LedgerEntry.objects.filter(investor=self.other).update(created_at=old)
+        InvestorBalance.objects.filter(investor=self.other).update(updated_at=old)
+        InvestorAssignment.objects.filter(pk=self.assignment.pk).update(created_at=old)
+
+        exit_code, report = self.reconcile(f"--since={timezone.localdate() - timedelta(days=2)}")
+        self.assertEqual(exit_code, 0)
+        self.assertEqual((report["investors_checked"], report["assignments_checked"]), (1, 0))
+
+    def test_text_output_summarizes(self):
+        out = StringIO()
+        call_command("reconcile_ledger", stdout=out)
+        self.assertIn("[OK] 2 inversionistas", out.getvalue())
+        self.assertIn("[OK] 1 asignaciones", out.getvalue())
+
+
+class InvestorStatementTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_stmt", password="admin123", role="ADMIN")
+        self.investor_user = User.objects.create_user(username="investor_stmt", password="investor123", role="INVESTOR")
+        self.investor = Investor.objects.create(user=self.investor_user, display_name="Statement Uno")
+
+        today = timezone.localdate()
+        self.period_from = today - timedelta(days=5)
+        self.period_to = today - timedelta(days=1)
+        stamps = [
+            (today - timedelta(days=10), "CAPITAL_DEPOSIT", Decimal("1000.00"), Decimal("0.00"), Decimal("0.00")),
+            (today - timedelta(days=4), "CAPITAL_TO_INVENTORY", Decimal("-300.00"), Decimal("300.00"), Decimal("0.00")),
+            (today - timedelta(days=3), "PROFIT_SHARE", Decimal("0.00"), Decimal("0.00"), Decimal("25.00")),
+            (today - timedelta(days=2), "PROFIT_SHARE", Decimal("0.00"), Decimal("0.00"), Decimal("15.00")),
+            (today, "CAPITAL_WITHDRAWAL", Decimal("-100.00"), Decimal("0.00"), Decimal("0.00")),
+        ]
+        for day, entry_type, capital, inventory, profit in stamps:
+            entry = LedgerEntry.objects.create(
+                investor=self.investor,
+                entry_type=entry_type,
+                capital_delta=capital,
+                inventory_delta=inventory,
+                profit_delta=profit,
+                reference_type="seed",
+                reference_id=entry_type,
+            )
+            moment = local_day_start(day) + timedelta(hours=12)
+            LedgerEntry.objects.filter(pk=entry.pk).update(created_at=moment)
+
+    def auth_as(self, username, password):
+        token = self.client.post("/api/v1/auth/token/", {"username": username, "password": password}, format="json").data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def period(self, **extra):
+        return {"from": self.period_from.isoformat(), "to": self.period_to.isoformat(), **extra}
+
+    def test_csv_statement_has_opening_entries_subtotals_and_closing(self):
+        self.auth_as("admin_stmt", "admin123")
+        response = self.client.get(f"/api/v1/investors/{self.investor.id}/statement/", self.period())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response["Content-Type"].startswith("text/csv"))
+
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([row["record_type"] for row in rows], ["opening", "entry", "entry", "entry", "subtotal", "subtotal", "closing"])
+        self.assertEqual(rows[0]["capital_after"], "1000.00")
+        self.assertEqual([row["capital_after"] for row in rows[1:4]], ["700.00", "700.00", "700.00"])
+        self.assertEqual(
+            [(row["entry_type"], row["entries_count"], row["profit_delta"]) for row in rows[4:6]],
+            [("CAPITAL_TO_INVENTORY", "1", "0.00"), ("PROFIT_SHARE", "2", "40.00")],
+        )
+        closing = rows[-1]
+        self.assertEqual((closing["entries_count"], closing["capital_delta"], closing["profit_delta"]), ("3", "-300.00", "40.00"))
+        self.assertEqual((closing["capital_after"], closing["inventory_after"], closing["profit_after"]), ("700.00", "300.00", "40.00"))
+
+    def test_json_statement_is_one_document(self):
+        self.auth_as("admin_stmt", "admin123")
+        response = self.client.get(f"/api/v1/investors/{self.investor.id}/statement/", self.period(format="json"))
+        self.assertEqual(response.status_code, 200)
+        document = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(list(document), ["opening", "entries", "subtotals", "closing"])
+        self.assertEqual(len(document["entries"]), 3)
+        self.assertEqual(document["closing"]["profit_after"], "40.00")
+
+        empty = self.client.get(
+            f"/api/v1/investors/{self.investor.id}/statement/",
+            {"from": "2001-01-01", "to": "2001-01-31", "format": "json"},
+        )
+        document = json.loads(b"".join(empty.streaming_content))
+        self.assertEqual((document["entries"], document["subtotals"]), ([], []))
+        self.assertEqual(document["opening"]["capital_after"], "0.00")
+        self.assertEqual(document["closing"]["capital_after"], "0.00")
+
+    def test_open_ended_statement_covers_the_whole_ledger(self):
+        self.auth_as("admin_stmt", "admin123")
+        response = self.client.get(f"/api/v1/investors/{self.investor.id}/statement/", {"format": "json"})
+        document = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(document["entries"]), 5)
+        self.assertEqual(document["closing"]["capital_after"], "600.00")
+
+    def test_investor_gets_own_statement_and_invalid_range_is_json(self):
+        self.auth_as("investor_stmt", "investor123")
+        response = self.client.get("/api/v1/investors/me/statement/", self.period(format="json"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(b"".join(response.streaming_content))["entries"]), 3)
+
+        denied = self.client.get(f"/api/v1/investors/{self.investor.id}/statement/")
+        self.assertEqual(denied.status_code, 403)
+
+        invalid = self.client.get("/api/v1/investors/me/statement/", {"from": "2026-02-01", "to": "2026-01-01"})
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(invalid.json()["code"], "invalid")
+        self.assertIn("from", invalid.json()["fields"])
+
+    def test_user_without_investor_profile_gets_json_404(self):
+        User.objects.create_user(username="orphan_stmt", password="investor123", role="INVESTOR")
+        self.auth_as("orphan_stmt", "investor123")
+        response = self.client.get("/api/v1/investors/me/statement/")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["code"], "investor_profile_not_found")
+
+
+class LedgerCheckpointTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_ckpt", password="admin123", role="ADMIN")
+        self.first = Investor.objects.create(display_name="Checkpoint A")
+        self.second = Investor.objects.create(display_name="Checkpoint B")
+        stamps = [
+            (self.first, date(2026, 1, 15), Decimal("1000.00"), Decimal("0.00")),
+            (self.first, date(2026, 2, 10), Decimal("-400.00"), Decimal("400.00")),
+            (self.second, date(2026, 2, 20), Decimal("500.00"), Decimal("0.00")),
+            (self.first, date(2026, 3, 5), Decimal("-100.00"), Decimal("100.00")),
+        ]
+        for investor, day, capital, inventory in stamps:
+            entry = LedgerEntry.objects.create(
+                investor=investor,
+                entry_type=LedgerEntryType.CAPITAL_DEPOSIT if inventory == 0 else LedgerEntryType.CAPITAL_TO_INVENTORY,
+                capital_delta=capital,
+                inventory_delta=inventory,
+                profit_delta=Decimal("0.00"),
+                reference_type="seed",
+                reference_id=str(day),
+            )
+            LedgerEntry.objects.filter(pk=entry.pk).update(created_at=local_day_start(day) + timedelta(hours=12))
+
+    def auth_as(self, username, password):
+        token = self.client.post("/api/v1/auth/token/", {"username": username, "password": password}, format="json").data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def balances_as_of(self, as_of):
+        self.auth_as("admin_ckpt", "admin123")
+        response = self.client.get("/api/v1/investors/balances/", {"as_of": as_of})
+        self.assertEqual(response.status_code, 200)
+        return response.data, {row["display_name"]: row["balances"] for row in response.data["results"]}
+
+    def test_backfill_writes_one_row_per_investor_and_closed_month(self):
+        out = StringIO()
+        call_command("write_ledger_checkpoints", "--backfill", stdout=out)
+        self.assertIn("Checkpoint 2026-01: 1 inversionistas", out.getvalue())
+        self.assertIn("Checkpoint 2026-02: 2 inversionistas", out.getvalue())
+
+        february = LedgerCheckpoint.objects.get(investor=self.first, period_end=local_day_start(date(2026, 3, 1)))
+        self.assertEqual((february.capital, february.inventory, february.last_sequence), (Decimal("600.00"), Decimal("400.00"), 2))
+
+        call_command("write_ledger_checkpoints", "--month", "2026-02", stdout=StringIO())
+        self.assertEqual(LedgerCheckpoint.objects.filter(period_end=local_day_start(date(2026, 3, 1))).count(), 2)
+
+    def test_balances_as_of_start_from_the_nearest_checkpoint(self):
+        call_command("write_ledger_checkpoints", "--month", "2026-01", stdout=StringIO())
+        call_command("write_ledger_checkpoints", "--month", "2026-02", stdout=StringIO())
+
+        data, balances = self.balances_as_of("2026-03-31")
+        self.assertEqual(data["as_of"], "2026-03-31")
+        self.assertEqual(data["checkpoint"], local_day_start(date(2026, 3, 1)).isoformat())
+        self.assertEqual(balances["Checkpoint A"], {"capital": "500.00", "inventory": "500.00", "profit": "0.00"})
+        self.assertEqual(balances["Checkpoint B"]["capital"], "500.00")
+
+        # Only the entries after the checkpoint are read, so a checkpoint moves the result.
+        LedgerCheckpoint.objects.filter(investor=self.second).update(capital=Decimal("1.00"))
+        _, balances = self.balances_as_of("2026-03-31")
+        self.assertEqual(balances["Checkpoint B"]["capital"], "1.00")
+
+        _, balances = self.balances_as_of("2026-01-31")
+        self.assertEqual(balances["Checkpoint A"]["capital"], "1000.00")
+        self.assertEqual(balances["Checkpoint B"]["capital"], "0.00")
+
+    def test_balances_without_checkpoints_sum_the_ledger(self):
+        data, balances = self.balances_as_of("2026-02-15")
+        self.assertIsNone(data["checkpoint"])
+        self.assertEqual(balances["Checkpoint A"], {"capital": "600.00", "inventory": "400.00", "profit": "0.00"})
+        self.assertEqual(balances["Checkpoint B"]["capital"], "0.00")
+
+    def test_open_months_are_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command("write_ledger_checkpoints", "--month", timezone.localdate().strftime("%Y-%m"), stdout=StringIO())
+
+    def test_boundaries_wait_for_in_flight_entries_to_settle(self):
+        # An entry stamped a minute before the boundary may still be uncommitted.
+        boundary = timezone.now() - timedelta(minutes=1)
+        with self.assertRaises(ValueError):
+            write_ledger_checkpoints(boundary)
+        self.assertFalse(LedgerCheckpoint.objects.filter(period_end=boundary).exists())
+
+        with override_settings(LEDGER_CHECKPOINT_SETTLE_MINUTES=0):
+            self.assertEqual(write_ledger_checkpoints(boundary), 2)
+
+
+class AssignmentPerformanceTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin_perf", password="admin123", role="ADMIN")
+        self.cashier = User.objects.create_user(username="cashier_perf", password="cashier123", role="CASHIER")
+        self.investor_user = User.objects.create_user(username="investor_perf", password="investor123", role="INVESTOR")
+        self.investor = Investor.objects.create(user=self.investor_user, display_name="Performance Uno")
+        self.product = Product.objects.create(sku="PERF-001", name="Casco", default_price=Decimal("100.00"))
+        self.idle_product = Product.objects.create(sku="PERF-002", name="Guantes", default_price=Decimal("50.00"))
+        for product in (self.product, self.idle_product):
+            InventoryMovement.objects.create(
+                product=product,
+                movement_type=MovementType.INBOUND,
+                quantity_delta=Decimal("10.00"),
+                reference_type="seed",
+                reference_id=product.sku,
+                created_by=self.admin,
+            )
+        self.assignment = InvestorAssignment.objects.create(
+            investor=self.investor, product=self.product, qty_assigned=Decimal("6.00"), unit_cost=Decimal("40.00")
+        )
+        InvestorAssignment.objects.filter(pk=self.assignment.pk).update(created_at=timezone.now() - timedelta(days=3))
+        self.idle = InvestorAssignment.objects.create(
+            investor=self.investor, product=self.idle_product, qty_assigned=Decimal("2.00"), unit_cost=Decimal("20.00")
+        )
+
+    def auth_as(self, username, password):
+        token = self.client.post("/api/v1/auth/token/", {"username": username, "password": password}, format="json").data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def sell(self, qty):
+        self.auth_as("cashier_perf", "cashier123")
+        response = self.client.post(
+            "/api/v1/sales/create-and-confirm/",
+            {
+                "lines": [
+                    {
+                        "product": str(self.product.id),
+                        "qty": qty,
+                        "unit_price": "100.00",
+                        "unit_cost": "40.00",
+                        "discount_pct": "0.00",
+                    }
+                ],
+                "payments": [{"method": "CASH", "amount": str(Decimal(qty) * 100)}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def test_confirm_and_void_keep_performance_in_step_with_sales(self):
+        self.sell("2.00")
+        voided = self.sell("1.00")
+        self.auth_as("admin_perf", "admin123")
+        self.assertEqual(self.client.post(f"/api/v1/sales/{voided}/void/", {"reason": "perf"}, format="json").status_code, 200)
+
+        performance = InvestorAssignmentPerformance.objects.get(assignment=self.assignment)
+        profit = sum(
+            line.investor_profit_share
+            for line in SaleLineProfitability.objects.filter(assignment=self.assignment, snapshot__sale__status="CONFIRMED")
+        )
+        self.assertEqual((performance.sales_count, performance.units_sold), (1, Decimal("2.00")))
+        self.assertEqual((performance.revenue, performance.cogs), (Decimal("200.00"), Decimal("80.00")))
+        self.assertEqual(performance.investor_profit, profit)
+        self.assertEqual(performance.roi, (profit / Decimal("80.00")).quantize(Decimal("0.0001")))
+        self.assertEqual(performance.avg_days_to_sell, Decimal("3.00"))
+
+        self.assertEqual(rebuild_assignment_performance(), (1, 0))
+
+    def test_investor_and_admin_list_sortable_performance(self):
+        self.sell("2.00")
+
+        self.auth_as("investor_perf", "investor123")
+        response = self.client.get("/api/v1/investors/me/performance/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual([row["product_sku"] for row in response.data["results"]], ["PERF-001", "PERF-002"])
+        self.assertEqual(response.data["results"][0]["units_sold"], "2.00")
+        self.assertEqual((response.data["results"][1]["units_sold"], response.data["results"][1]["roi"]), ("0.00", None))
+
+        roi_first = self.client.get("/api/v1/investors/me/performance/", {"ordering": "roi"})
+        self.assertEqual(roi_first.data["results"][0]["product_sku"], "PERF-001")
+        self.assertEqual(self.client.get(f"/api/v1/investors/{self.investor.id}/performance/").status_code, 403)
+
+        self.auth_as("admin_perf", "admin123")
+        response = self.client.get(f"/api/v1/investors/{self.investor.id}/performance/", {"ordering": "units_sold"})
+        self.assertEqual([row["product_sku"] for row in response.data["results"]], ["PERF-002", "PERF-001"])
+        self.assertEqual(self.client.get("/api/v1/investors/me/performance/").status_code, 404)
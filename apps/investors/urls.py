@@ -3,9 +3,12 @@ from rest_framework.routers import DefaultRouter
 
 from apps.investors.views import (
     InvestorAssignmentViewSet,
+    InvestorPerformanceView,
     InvestorViewSet,
     MyInvestorProfileView,
     MyLedgerView,
+    MyPerformanceView,
+    MyStatementView,
 )
 
 router = DefaultRouter()
@@ -15,5 +18,8 @@ router.register("", InvestorViewSet, basename="investor")
 urlpatterns = [
     path("me/", MyInvestorProfileView.as_view(), name="investor-me"),
     path("me/ledger/", MyLedgerView.as_view(), name="investor-me-ledger"),
+    path("me/statement/", MyStatementView.as_view(), name="investor-me-statement"),
+    path("me/performance/", MyPerformanceView.as_view(), name="investor-me-performance"),
+    path("<uuid:pk>/performance/", InvestorPerformanceView.as_view(), name="investor-performance"),
     path("", include(router.urls)),
 ]
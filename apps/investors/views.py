@@ -2,35 +2,101 @@ from collections import defaultdict
 from decimal import Decimal
 
 from django.db import transaction
-from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models import DecimalField, F, Q, Value
 from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import serializers, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.generics import GenericAPIView, ListAPIView
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import GenericAPIView, ListAPIView, get_object_or_404
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from apps.audit.services import record_audit
+from apps.audit.services import record_audit, record_audit_many
 from apps.catalog.models import Product
 from apps.catalog.querysets import with_inventory_metrics
+from apps.common.dates import local_date_bounds
+from apps.common.metrics_cache import bump_metrics_data_version
+from apps.common.ordering import NullsLastOrderingFilter
 from apps.common.permissions import RolePermission
+from apps.common.query_budget import QueryBudget
+from apps.inventory.models import InventoryMovement
 from apps.investors.models import Investor, InvestorAssignment
 from apps.investors.serializers import (
     InvestorAmountSerializer,
+    InvestorAssignmentPerformanceSerializer,
     InvestorAssignmentSerializer,
+    InvestorBalancesQuerySerializer,
     InvestorPurchaseSerializer,
     InvestorSerializer,
+    InvestorStatementQuerySerializer,
     LedgerEntrySerializer,
+    format_decimal,
 )
+from apps.investors.statements import StatementCSVRenderer, StatementJSONRenderer, iter_statement_rows
 from apps.ledger.models import LedgerEntry, LedgerEntryType
 from apps.ledger.services import (
+    BALANCE_FIELDS,
     create_capital_deposit,
     create_capital_withdrawal,
     create_reinvestment,
     current_balances,
+    ledger_balances_at,
 )
 
 
-class InvestorViewSet(viewsets.ModelViewSet):
+def with_balances(queryset):
+    """Annotate the materialized ``InvestorBalance`` read by ``InvestorSerializer.get_balances``."""
+    zero = Value(0, output_field=DecimalField(max_digits=14, decimal_places=2))
+    return queryset.annotate(
+        balance_capital=Coalesce(F("balance__capital"), zero),
+        balance_inventory=Coalesce(F("balance__inventory"), zero),
+        balance_profit=Coalesce(F("balance__profit"), zero),
+    )
+
+
+def with_performance(queryset):
+    """Annotate assignments with their ``InvestorAssignmentPerformance`` totals (zero before any sale)."""
+    zero = Value(0, output_field=DecimalField(max_digits=14, decimal_places=2))
+    return queryset.annotate(
+        sales_count=Coalesce(F("performance__sales_count"), 0),
+        units_sold=Coalesce(F("performance__units_sold"), zero),
+        revenue=Coalesce(F("performance__revenue"), zero),
+        cogs=Coalesce(F("performance__cogs"), zero),
+        investor_profit=Coalesce(F("performance__investor_profit"), zero),
+        roi=F("performance__roi"),
+        avg_days_to_sell=F("performance__avg_days_to_sell"),
+    )
+
+
+class StatementMixin:
+    """Stream an investor statement as CSV or JSON, chosen with ``?format=csv|json`` (CSV by default)."""
+
+    def handle_exception(self, exc):
+        # Errors are reported as regular JSON even when a statement format was negotiated.
+        if isinstance(getattr(self.request, "accepted_renderer", None), (StatementCSVRenderer, StatementJSONRenderer)):
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    def statement_response(self, request, investor):
+        query_serializer = InvestorStatementQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        date_from = query_serializer.validated_data.get("from")
+        date_to = query_serializer.validated_data.get("to")
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(iter_statement_rows(investor, date_from, date_to)),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        filename = f"estado_cuenta_{investor.id}_{date_from or 'inicio'}_{date_to or 'hoy'}.{renderer.format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class InvestorViewSet(StatementMixin, viewsets.ModelViewSet):
     queryset = Investor.objects.select_related("user")
     serializer_class = InvestorSerializer
     permission_classes = [RolePermission]
@@ -45,24 +111,16 @@ class InvestorViewSet(viewsets.ModelViewSet):
         "withdraw": ["ledger.manage"],
         "reinvest": ["ledger.manage"],
         "ledger": ["ledger.manage"],
+        "balances": ["ledger.manage"],
+        "statement": ["ledger.manage"],
         "purchases": ["investor.manage"],
     }
+    # Purchases are flat in line count (16 queries when each bulk insert is one statement);
+    # SQLite splits 200-line inserts into parameter-limited batches, hence the headroom.
+    query_budgets = {"purchases": QueryBudget(23), "balances": QueryBudget(7)}
 
     def get_queryset(self):
-        queryset = Investor.objects.select_related("user").annotate(
-            balance_capital=Coalesce(
-                Sum("ledger_entries__capital_delta"),
-                Value(0, output_field=DecimalField(max_digits=12, decimal_places=2)),
-            ),
-            balance_inventory=Coalesce(
-                Sum("ledger_entries__inventory_delta"),
-                Value(0, output_field=DecimalField(max_digits=12, decimal_places=2)),
-            ),
-            balance_profit=Coalesce(
-                Sum("ledger_entries__profit_delta"),
-                Value(0, output_field=DecimalField(max_digits=12, decimal_places=2)),
-            ),
-        )
+        queryset = with_balances(Investor.objects.select_related("user"))
         query = self.request.query_params.get("q")
         if query:
             queryset = queryset.filter(Q(display_name__icontains=query.strip()))
@@ -71,7 +129,7 @@ class InvestorViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"])
     def ledger(self, request, pk=None):
         investor = self.get_object()
-        entries = LedgerEntry.objects.filter(investor=investor).order_by("-created_at")
+        entries = LedgerEntry.objects.filter(investor=investor).order_by("-sequence")
         page = self.paginate_queryset(entries)
         if page is not None:
             serializer = LedgerEntrySerializer(page, many=True)
@@ -80,6 +138,35 @@ class InvestorViewSet(viewsets.ModelViewSet):
         serializer = LedgerEntrySerializer(entries, many=True)
         return Response({"count": len(serializer.data), "next": None, "previous": None, "results": serializer.data})
 
+    @action(detail=False, methods=["get"])
+    def balances(self, request):
+        """Every investor's balances at the end of ``?as_of`` (a local day), one page at a time."""
+        query_serializer = InvestorBalancesQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        as_of = query_serializer.validated_data.get("as_of") or timezone.localdate()
+        _, at = local_date_bounds(date_to=as_of)
+
+        investors = self.paginate_queryset(self.get_queryset())
+        checkpoint, balances = ledger_balances_at(at, [investor.id for investor in investors])
+        rows = [
+            {
+                "investor_id": str(investor.id),
+                "display_name": investor.display_name,
+                "balances": {
+                    name: format_decimal(balances.get(investor.id, {}).get(name)) for name, _ in BALANCE_FIELDS
+                },
+            }
+            for investor in investors
+        ]
+        response = self.get_paginated_response(rows)
+        response.data["as_of"] = as_of.isoformat()
+        response.data["checkpoint"] = timezone.localtime(checkpoint).isoformat() if checkpoint else None
+        return response
+
+    @action(detail=True, methods=["get"], renderer_classes=[StatementCSVRenderer, StatementJSONRenderer])
+    def statement(self, request, pk=None):
+        return self.statement_response(request, self.get_object())
+
     @action(detail=True, methods=["post"])
     def deposit(self, request, pk=None):
         investor = self.get_object()
@@ -161,47 +248,45 @@ class InvestorViewSet(viewsets.ModelViewSet):
         serializer = InvestorPurchaseSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        with transaction.atomic():
-            locked_investor = Investor.objects.select_for_update().get(pk=investor.pk)
-            raw_lines = serializer.validated_data["lines"]
-            lines_by_tuple = {}
-            requested_qty_by_product = defaultdict(lambda: Decimal("0.00"))
-
-            for line in raw_lines:
-                tuple_key = (str(line["product"].id), line["unit_cost_gross"])
-                if tuple_key in lines_by_tuple:
-                    lines_by_tuple[tuple_key]["qty"] += line["qty"]
-                else:
-                    lines_by_tuple[tuple_key] = {
-                        "product": line["product"],
-                        "qty": line["qty"],
-                        "unit_cost_gross": line["unit_cost_gross"],
-                    }
-
-            lines = list(lines_by_tuple.values())
+        lines_by_tuple = {}
+        requested_qty_by_product = defaultdict(lambda: Decimal("0.00"))
+        for line in serializer.validated_data["lines"]:
+            tuple_key = (line["product"].id, line["unit_cost_gross"])
+            if tuple_key in lines_by_tuple:
+                lines_by_tuple[tuple_key]["qty"] += line["qty"]
+            else:
+                lines_by_tuple[tuple_key] = {
+                    "product": line["product"],
+                    "qty": line["qty"],
+                    "unit_cost_gross": line["unit_cost_gross"],
+                }
+            requested_qty_by_product[line["product"].id] += line["qty"]
+        lines = list(lines_by_tuple.values())
 
-            for line in lines:
-                requested_qty_by_product[str(line["product"].id)] += line["qty"]
-
-            product_ids = list(requested_qty_by_product.keys())
-            products = with_inventory_metrics(Product.objects.filter(id__in=product_ids))
-            products_by_id = {str(product.id): product for product in products}
+        with transaction.atomic():
+            # Products first (id order, same as sale confirmation), then the investor balance:
+            # concurrent purchases and sales serialize on the rows whose stock they read.
+            InventoryMovement.lock_products(requested_qty_by_product)
+            products_by_id = {
+                product.id: product
+                for product in with_inventory_metrics(Product.objects.filter(id__in=requested_qty_by_product))
+            }
             line_errors: dict[str, str] = {}
 
             for product_id, requested_qty in requested_qty_by_product.items():
                 product = products_by_id.get(product_id)
                 if product is None:
-                    line_errors[product_id] = "Producto no encontrado."
+                    line_errors[str(product_id)] = "Producto no encontrado."
                     continue
                 if not product.is_active:
-                    line_errors[product_id] = f"{product.name} está inactivo."
+                    line_errors[str(product_id)] = f"{product.name} está inactivo."
                     continue
 
                 assignable_qty = product.stock - getattr(product, "investor_reserved_qty", Decimal("0.00"))
                 if assignable_qty < 0:
                     assignable_qty = Decimal("0.00")
                 if requested_qty > assignable_qty:
-                    line_errors[product_id] = (
+                    line_errors[str(product_id)] = (
                         f"{product.name} solo tiene {assignable_qty:.2f} unidades disponibles para inversionistas."
                     )
 
@@ -214,7 +299,7 @@ class InvestorViewSet(viewsets.ModelViewSet):
                 )
 
             purchase_total = sum(line["qty"] * line["unit_cost_gross"] for line in lines)
-            balances = current_balances(locked_investor)
+            balances = current_balances(investor, lock=True)
             if purchase_total > balances["capital"]:
                 raise serializers.ValidationError(
                     {
@@ -223,55 +308,96 @@ class InvestorViewSet(viewsets.ModelViewSet):
                     }
                 )
 
-            created_assignments = []
-            created_entries = []
+            # Lines matching an existing (investor, product, unit_cost) assignment top it up.
+            existing = {
+                (assignment.product_id, assignment.unit_cost): assignment
+                for assignment in InvestorAssignment.objects.select_for_update()
+                .filter(investor=investor, product_id__in=requested_qty_by_product)
+                .order_by("pk")
+            }
+            new_assignments = []
+            topped_up = []
+            audit_records = []
+            ledger_entries = []
+            assignments = []
+            tax_rate_pct = str(serializer.validated_data["tax_rate_pct"])
 
             for line in lines:
-                product = products_by_id[str(line["product"].id)]
-                assignment = InvestorAssignment.objects.create(
-                    investor=locked_investor,
-                    product=product,
-                    qty_assigned=line["qty"],
-                    unit_cost=line["unit_cost_gross"],
-                )
-                created_assignments.append(assignment)
+                product = products_by_id[line["product"].id]
+                assignment = existing.get((product.id, line["unit_cost_gross"]))
+                if assignment is None:
+                    assignment = InvestorAssignment(
+                        investor=investor,
+                        product=product,
+                        qty_assigned=line["qty"],
+                        unit_cost=line["unit_cost_gross"],
+                    )
+                    new_assignments.append(assignment)
+                    audit_records.append(
+                        {
+                            "action": "investor.assignment.create",
+                            "entity_type": "investor_assignment",
+                            "entity_id": assignment.id,
+                            "payload": {
+                                "investor_id": str(investor.id),
+                                "product_id": str(product.id),
+                                "qty_assigned": str(assignment.qty_assigned),
+                                "unit_cost": str(assignment.unit_cost),
+                                "tax_rate_pct": tax_rate_pct,
+                            },
+                        }
+                    )
+                else:
+                    before = str(assignment.qty_assigned)
+                    assignment.qty_assigned += line["qty"]
+                    topped_up.append(assignment)
+                    audit_records.append(
+                        {
+                            "action": "investor.assignment.update",
+                            "entity_type": "investor_assignment",
+                            "entity_id": assignment.id,
+                            "payload": {
+                                "before": {"qty_assigned": before},
+                                "after": {"qty_assigned": str(assignment.qty_assigned)},
+                                "tax_rate_pct": tax_rate_pct,
+                            },
+                        }
+                    )
+                assignments.append(assignment)
 
                 line_total = line["qty"] * line["unit_cost_gross"]
-                entry = LedgerEntry.objects.create(
-                    investor=locked_investor,
-                    entry_type=LedgerEntryType.CAPITAL_TO_INVENTORY,
-                    capital_delta=-line_total,
-                    inventory_delta=line_total,
-                    profit_delta=Decimal("0.00"),
-                    reference_type="investor_assignment",
-                    reference_id=str(assignment.id),
-                    note=f"Investor purchase {product.sku}",
-                )
-                created_entries.append(entry)
-
-                record_audit(
-                    actor=request.user,
-                    action="investor.assignment.create",
-                    entity_type="investor_assignment",
-                    entity_id=assignment.id,
-                    payload={
-                        "investor_id": str(assignment.investor_id),
-                        "product_id": str(assignment.product_id),
-                        "qty_assigned": str(assignment.qty_assigned),
-                        "unit_cost": str(assignment.unit_cost),
-                        "tax_rate_pct": str(serializer.validated_data["tax_rate_pct"]),
-                    },
+                ledger_entries.append(
+                    LedgerEntry(
+                        investor=investor,
+                        entry_type=LedgerEntryType.CAPITAL_TO_INVENTORY,
+                        capital_delta=-line_total,
+                        inventory_delta=line_total,
+                        profit_delta=Decimal("0.00"),
+                        reference_type="investor_assignment",
+                        reference_id=str(assignment.id),
+                        note=f"Investor purchase {product.sku}",
+                    )
                 )
 
-            balances = current_balances(locked_investor)
+            InvestorAssignment.objects.bulk_create(new_assignments)
+            if topped_up:
+                InvestorAssignment.objects.bulk_update(topped_up, ["qty_assigned"])
+            LedgerEntry.objects.bulk_create(ledger_entries)
+            record_audit_many(actor=request.user, records=audit_records)
+
+            balances = current_balances(investor)
+            # Topped-up assignments count on the day they were first created.
+            bump_metrics_data_version(
+                min((timezone.localdate(assignment.created_at) for assignment in topped_up), default=timezone.localdate())
+            )
 
         return Response(
             {
-                "investor_id": str(locked_investor.id),
+                "investor_id": str(investor.id),
                 "purchase_total": f"{purchase_total:.2f}",
                 "balances": balances,
-                "assignments": InvestorAssignmentSerializer(created_assignments, many=True).data,
-                "ledger_entries": LedgerEntrySerializer(created_entries, many=True).data,
+                "assignments": InvestorAssignmentSerializer(assignments, many=True).data,
+                "ledger_entries": LedgerEntrySerializer(ledger_entries, many=True).data,
             },
             status=status.HTTP_201_CREATED,
         )
@@ -305,6 +431,7 @@ class InvestorAssignmentViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         assignment = serializer.save()
+        bump_metrics_data_version(timezone.localdate(assignment.created_at))
         record_audit(
             actor=self.request.user,
             action="investor.assignment.create",
@@ -326,6 +453,7 @@ class InvestorAssignmentViewSet(viewsets.ModelViewSet):
             "unit_cost": str(assignment.unit_cost),
         }
         assignment = serializer.save()
+        bump_metrics_data_version(timezone.localdate(assignment.created_at))
         after = {
             "qty_assigned": str(assignment.qty_assigned),
             "qty_sold": str(assignment.qty_sold),
@@ -354,6 +482,7 @@ class InvestorAssignmentViewSet(viewsets.ModelViewSet):
             },
         )
         super().perform_destroy(instance)
+        bump_metrics_data_version(timezone.localdate(instance.created_at))
 
 
 class MyInvestorProfileView(GenericAPIView):
@@ -361,7 +490,7 @@ class MyInvestorProfileView(GenericAPIView):
     capability_map = {"get": ["investor.view.own"]}
 
     def get(self, request, *args, **kwargs):
-        investor = Investor.objects.filter(user=request.user).first()
+        investor = with_balances(Investor.objects.filter(user=request.user)).first()
         if investor is None:
             return Response(
                 {"code": "investor_profile_not_found", "detail": "No existe perfil de inversionista para este usuario.", "fields": {}},
@@ -380,4 +509,54 @@ class MyLedgerView(ListAPIView):
         investor = Investor.objects.filter(user=self.request.user).first()
         if investor is None:
             return LedgerEntry.objects.none()
-        return LedgerEntry.objects.filter(investor=investor)
+        return LedgerEntry.objects.filter(investor=investor).order_by("-sequence")
+
+
+class InvestorProfileNotFound(NotFound):
+    default_detail = "No existe perfil de inversionista para este usuario."
+    default_code = "investor_profile_not_found"
+
+
+class MyStatementView(StatementMixin, GenericAPIView):
+    permission_classes = [RolePermission]
+    capability_map = {"get": ["ledger.view.own"]}
+    renderer_classes = [StatementCSVRenderer, StatementJSONRenderer]
+
+    def get(self, request, *args, **kwargs):
+        investor = Investor.objects.filter(user=request.user).first()
+        if investor is None:
+            # Raised rather than returned so ``handle_exception`` renders it as JSON.
+            raise InvestorProfileNotFound()
+        return self.statement_response(request, investor)
+
+
+class AssignmentPerformanceMixin:
+    """Paginated per-assignment performance, sortable with ``?ordering=`` (best profit first by default)."""
+
+    serializer_class = InvestorAssignmentPerformanceSerializer
+    filter_backends = [NullsLastOrderingFilter]
+    ordering_fields = ["investor_profit", "revenue", "units_sold", "sales_count", "roi", "avg_days_to_sell", "created_at"]
+    ordering = ["-investor_profit"]
+    query_budgets = {"get": QueryBudget(5)}
+
+    def performance_queryset(self, investor):
+        return with_performance(InvestorAssignment.objects.filter(investor=investor).select_related("product"))
+
+
+class InvestorPerformanceView(AssignmentPerformanceMixin, ListAPIView):
+    permission_classes = [RolePermission]
+    capability_map = {"get": ["investor.manage"]}
+
+    def get_queryset(self):
+        return self.performance_queryset(get_object_or_404(Investor, pk=self.kwargs["pk"]))
+
+
+class MyPerformanceView(AssignmentPerformanceMixin, ListAPIView):
+    permission_classes = [RolePermission]
+    capability_map = {"get": ["investor.view.own"]}
+
+    def get_queryset(self):
+        investor = Investor.objects.filter(user=self.request.user).first()
+        if investor is None:
+            raise InvestorProfileNotFound()
+        return self.performance_queryset(investor)
@@ -0,0 +1,120 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.common.rollups import accumulate, apply_rollup_deltas
+from apps.layaway.models import CustomerCredit, CustomerCreditTotal, Layaway, LayawayDueDayRollup, LayawayStatus
+
+CREDIT_TOTAL_PK = 1
+
+
+class LayawayFacts:
+    """Additive per-due-day facts for active layaways, keyed like ``LayawayDueDayRollup``.
+
+    Add a layaway with ``sign=-1`` before changing it and ``sign=1`` afterwards; non-active
+    layaways contribute nothing, so status changes fall out of the same two calls.
+    """
+
+    def __init__(self):
+        self.days = {}
+
+    def add_layaway(self, layaway, *, sign=1):
+        if layaway.status != LayawayStatus.ACTIVE:
+            return
+        accumulate(
+            self.days,
+            timezone.localdate(layaway.expires_at),
+            active_count=sign,
+            outstanding=sign * layaway.balance_due,
+        )
+
+    def record(self):
+        rows = [({"day": day}, deltas) for day, deltas in self.days.items() if any(deltas.values())]
+        if rows:
+            apply_rollup_deltas(LayawayDueDayRollup, rows)
+
+
+def record_credit_changes(changes):
+    """Apply ``(balance_before, balance_after)`` pairs of ``CustomerCredit`` rows to the credit total.
+
+    One UPDATE with F() expressions, inside the caller's transaction.
+    """
+    balance = Decimal("0.00")
+    holders = 0
+    for before, after in changes:
+        balance += after - before
+        holders += int(after > 0) - int(before > 0)
+    if not balance and not holders:
+        return
+    totals = CustomerCreditTotal.objects.filter(pk=CREDIT_TOTAL_PK)
+    updates = {"balance": F("balance") + balance, "customers_with_credit": F("customers_with_credit") + holders}
+    if not totals.update(**updates):
+        CustomerCreditTotal.objects.bulk_create([CustomerCreditTotal(pk=CREDIT_TOTAL_PK)], ignore_conflicts=True)
+        totals.update(**updates)
+
+
+def layaway_dashboard(today=None):
+    """Layaway overview from the counters: two reads of small tables, no scan of ``Layaway``."""
+    today = today or timezone.localdate()
+    buckets = {"active": Q(), "due_today": Q(day=today), "overdue": Q(day__lt=today)}
+    aggregates = {}
+    for name, day_filter in buckets.items():
+        aggregates[f"{name}_layaways"] = Coalesce(Sum("active_count", filter=day_filter), 0)
+        aggregates[f"{name}_amount"] = Coalesce(Sum("outstanding", filter=day_filter), Decimal("0.00"))
+    totals = LayawayDueDayRollup.objects.aggregate(**aggregates)
+    credit = CustomerCreditTotal.objects.filter(pk=CREDIT_TOTAL_PK).first() or CustomerCreditTotal()
+
+    dashboard = {"as_of": today}
+    for name in buckets:
+        dashboard[f"{name}_count"] = totals[f"{name}_layaways"]
+        dashboard[f"{name}_outstanding"] = totals[f"{name}_amount"]
+    dashboard["credit_liability"] = credit.balance
+    dashboard["customers_with_credit"] = credit.customers_with_credit
+    return dashboard
+
+
+def expected_layaway_counters(*, chunk_size=500):
+    """Counters recomputed from ``Layaway`` and ``CustomerCredit``: ``(facts_by_day, credit_total)``."""
+    facts = LayawayFacts()
+    for layaway in Layaway.objects.filter(status=LayawayStatus.ACTIVE).only("status", "expires_at", "total", "amount_paid").iterator(
+        chunk_size=chunk_size
+    ):
+        facts.add_layaway(layaway)
+    credit = CustomerCredit.objects.aggregate(total=Coalesce(Sum("balance"), Decimal("0.00")), holders=Count("pk", filter=Q(balance__gt=0)))
+    return facts.days, CustomerCreditTotal(pk=CREDIT_TOTAL_PK, balance=credit["total"], customers_with_credit=credit["holders"])
+
+
+@transaction.atomic
+def rebuild_layaway_counters(*, dry_run=False, chunk_size=500):
+    """Compare the counters with a full recount and, unless ``dry_run``, replace them.
+
+    Returns the list of differences as ``(counter, expected, found)`` tuples.
+    """
+    days, credit = expected_layaway_counters(chunk_size=chunk_size)
+    stored_days = {row.day: row for row in LayawayDueDayRollup.objects.select_for_update().order_by("day")}
+    stored_credit = CustomerCreditTotal.objects.select_for_update().filter(pk=CREDIT_TOTAL_PK).first() or CustomerCreditTotal()
+
+    differences = []
+    for day in sorted(set(days) | set(stored_days)):
+        expected = days.get(day, {"active_count": 0, "outstanding": Decimal("0.00")})
+        found = stored_days.get(day, LayawayDueDayRollup(day=day))
+        for name in ("active_count", "outstanding"):
+            if Decimal(expected[name]) != Decimal(getattr(found, name)):
+                differences.append((f"{day.isoformat()}.{name}", expected[name], getattr(found, name)))
+    for name in ("balance", "customers_with_credit"):
+        if Decimal(getattr(credit, name)) != Decimal(getattr(stored_credit, name)):
+            differences.append((f"credit.{name}", getattr(credit, name), getattr(stored_credit, name)))
+
+    if not dry_run:
+        LayawayDueDayRollup.objects.all().delete()
+        LayawayDueDayRollup.objects.bulk_create(
+            [LayawayDueDayRollup(day=day, **deltas) for day, deltas in days.items() if deltas["active_count"]],
+            batch_size=chunk_size,
+        )
+        CustomerCreditTotal.objects.update_or_create(
+            pk=CREDIT_TOTAL_PK, defaults={"balance": credit.balance, "customers_with_credit": credit.customers_with_credit}
+        )
+    return differences
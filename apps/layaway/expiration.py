@@ -0,0 +1,128 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from apps.audit.services import record_audit_many
+from apps.inventory.models import InventoryMovement, MovementType
+from apps.layaway.counters import LayawayFacts, record_credit_changes
+from apps.layaway.models import CustomerCredit, Layaway, LayawayStatus
+
+EXPIRE_BATCH_SIZE = 200
+
+
+def expired_layaways(now=None):
+    return Layaway.objects.filter(status=LayawayStatus.ACTIVE, expires_at__lt=now or timezone.now())
+
+
+def claim_expired_layaways(*, now, batch_size=EXPIRE_BATCH_SIZE):
+    """Row-lock up to ``batch_size`` expired active layaways, skipping rows another transaction holds.
+
+    A layaway a cashier is taking a payment on is left for a later batch instead of blocking the
+    worker, and concurrent workers never claim the same row. Call inside a transaction.
+    """
+    return list(
+        expired_layaways(now)
+        .select_related("customer", "created_by")
+        .select_for_update(skip_locked=True, of=("self",))
+        .order_by("expires_at", "id")[:batch_size]
+    )
+
+
+def expire_claimed_layaways(layaways, *, now):
+    """Expire claimed layaways in a fixed number of queries: the dashboard counters, one status update,
+    one movement insert, the credit upserts and one audit insert. Returns the total credit added.
+    """
+    if not layaways:
+        return Decimal("0.00")
+    prefetch_related_objects(layaways, "lines")
+    facts = LayawayFacts()
+    for layaway in layaways:
+        facts.add_layaway(layaway, sign=-1)
+    facts.record()
+    Layaway.objects.filter(id__in=[layaway.id for layaway in layaways]).update(status=LayawayStatus.EXPIRED, updated_at=now)
+
+    InventoryMovement.bulk_record(
+        [
+            InventoryMovement(
+                product_id=line.product_id,
+                movement_type=MovementType.RELEASED,
+                quantity_delta=line.qty,
+                reference_type="layaway_expire",
+                reference_id=str(layaway.id),
+                note="Layaway expired release (auto)",
+                created_by_id=layaway.created_by_id,
+            )
+            for layaway in layaways
+            for line in layaway.lines.all()
+        ]
+    )
+
+    credit_by_customer = {}
+    customers = {}
+    for layaway in layaways:
+        if layaway.customer_id and layaway.amount_paid > 0:
+            customers[layaway.customer_id] = layaway.customer
+            credit_by_customer[layaway.customer_id] = credit_by_customer.get(layaway.customer_id, Decimal("0.00")) + layaway.amount_paid
+    if credit_by_customer:
+        CustomerCredit.objects.bulk_create(
+            [
+                CustomerCredit(customer=customer, customer_name=customer.name, customer_phone=customer.phone, balance=Decimal("0.00"))
+                for customer in customers.values()
+            ],
+            ignore_conflicts=True,
+        )
+        credits = list(CustomerCredit.objects.select_for_update().filter(customer_id__in=credit_by_customer).order_by("pk"))
+        changes = []
+        for credit in credits:
+            customer = customers[credit.customer_id]
+            credit.balance = (credit.balance + credit_by_customer[credit.customer_id]).quantize(Decimal("0.01"))
+            credit.customer_name = customer.name
+            credit.customer_phone = customer.phone
+            credit.updated_at = now
+            changes.append((credit.balance - credit_by_customer[credit.customer_id], credit.balance))
+        CustomerCredit.objects.bulk_update(credits, ["balance", "customer_name", "customer_phone", "updated_at"])
+        record_credit_changes(changes)
+
+    record_audit_many(
+        actor=None,
+        records=[
+            {
+                "actor": layaway.created_by,
+                "action": "layaway.expire.auto",
+                "entity_type": "layaway",
+                "entity_id": layaway.id,
+                "payload": {"credit_added": str(layaway.amount_paid)},
+            }
+            for layaway in layaways
+        ],
+    )
+    return sum(credit_by_customer.values(), Decimal("0.00"))
+
+
+def expire_layaways_batch(*, now=None, batch_size=EXPIRE_BATCH_SIZE):
+    """Claim and expire one batch in its own transaction. Returns ``(expired_count, credit_added)``."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        layaways = claim_expired_layaways(now=now, batch_size=batch_size)
+        credit_added = expire_claimed_layaways(layaways, now=now)
+    return len(layaways), credit_added
+
+
+def run_expiration(*, limit=None, batch_size=EXPIRE_BATCH_SIZE):
+    """Expire batches until none are left (or ``limit`` layaways are done). Returns ``(expired_count, credit_added)``.
+
+    Safe to run from several processes at once: each batch only claims unlocked rows.
+    """
+    expired_count = 0
+    credit_added = Decimal("0.00")
+    now = timezone.now()
+    while limit is None or expired_count < limit:
+        size = batch_size if limit is None else min(batch_size, limit - expired_count)
+        count, credit = expire_layaways_batch(now=now, batch_size=size)
+        if not count:
+            break
+        expired_count += count
+        credit_added += credit
+    return expired_count, credit_added
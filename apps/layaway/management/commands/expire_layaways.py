@@ -1,62 +1,65 @@
-from decimal import Decimal
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 
-from apps.audit.services import record_audit
-from apps.inventory.models import InventoryMovement, MovementType
-from apps.layaway.models import CustomerCredit, Layaway, LayawayStatus
+from apps.layaway.expiration import EXPIRE_BATCH_SIZE, expired_layaways, run_expiration
 
 
 class Command(BaseCommand):
-    help = "Expira apartados vencidos y convierte lo abonado a saldo a favor."
+    help = "Expira apartados vencidos y convierte lo abonado a saldo a favor, por lotes (FOR UPDATE SKIP LOCKED)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=EXPIRE_BATCH_SIZE, help="Apartados reclamados por transaccion.")
+        parser.add_argument("--limit", type=int, help="Maximo de apartados a expirar por pasada.")
+        parser.add_argument("--workers", type=int, default=1, help="Hilos en paralelo, cada uno con su conexion.")
+        parser.add_argument("--dry-run", action="store_true", help="Solo reporta cuantos apartados expirarian.")
+        parser.add_argument("--loop", action="store_true", help="Repite las pasadas hasta recibir Ctrl+C / SIGTERM.")
+        parser.add_argument("--interval", type=float, default=60.0, help="Segundos entre pasadas con --loop.")
+        parser.add_argument("--iterations", type=int, default=0, help="Con --loop, numero de pasadas (0 = sin limite).")
 
     def handle(self, *args, **options):
-        expired_count = 0
-        queryset = (
-            Layaway.objects.select_related("customer", "created_by")
-            .prefetch_related("lines")
-            .filter(status=LayawayStatus.ACTIVE, expires_at__lt=timezone.now())
-        )
-        for layaway in queryset:
-            with transaction.atomic():
-                locked = Layaway.objects.select_for_update().select_related("customer", "created_by").get(pk=layaway.pk)
-                if locked.status != LayawayStatus.ACTIVE or locked.expires_at >= timezone.now():
-                    continue
-                locked.status = LayawayStatus.EXPIRED
-                locked.save(update_fields=["status", "updated_at"])
-
-                for line in locked.lines.all():
-                    InventoryMovement.objects.create(
-                        product=line.product,
-                        movement_type=MovementType.RELEASED,
-                        quantity_delta=line.qty,
-                        reference_type="layaway_expire",
-                        reference_id=str(locked.id),
-                        note="Layaway expired release (auto)",
-                        created_by=locked.created_by,
-                    )
-
-                if locked.customer_id and locked.amount_paid > 0:
-                    credit, _ = CustomerCredit.objects.get_or_create(
-                        customer=locked.customer,
-                        defaults={
-                            "customer_name": locked.customer.name,
-                            "customer_phone": locked.customer.phone,
-                            "balance": Decimal("0.00"),
-                        },
-                    )
-                    credit.balance = (credit.balance + locked.amount_paid).quantize(Decimal("0.01"))
-                    credit.save(update_fields=["balance", "updated_at", "customer_name", "customer_phone"])
-
-                record_audit(
-                    actor=locked.created_by,
-                    action="layaway.expire.auto",
-                    entity_type="layaway",
-                    entity_id=locked.id,
-                    payload={"credit_added": str(locked.amount_paid)},
-                )
-                expired_count += 1
-
-        self.stdout.write(self.style.SUCCESS(f"Expired layaways: {expired_count}"))
+        for name in ("batch_size", "workers"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} debe ser mayor o igual a 1.")
+        if options["limit"] is not None and options["limit"] < 1:
+            raise CommandError("--limit debe ser mayor o igual a 1.")
+
+        if options["dry_run"]:
+            pending = expired_layaways().count()
+            if options["limit"] is not None:
+                pending = min(pending, options["limit"])
+            self.stdout.write(f"Dry run: {pending} apartados vencidos por expirar.")
+            return
+
+        iteration = 0
+        try:
+            while True:
+                iteration += 1
+                expired_count, credit_added = self._run_pass(options)
+                self.stdout.write(self.style.SUCCESS(f"Expired layaways: {expired_count} (saldo a favor: ${credit_added:.2f})"))
+                if not options["loop"] or iteration == options["iterations"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Detenido.")
+
+    @staticmethod
+    def _run_pass(options):
+        workers = options["workers"]
+        limit = options["limit"]
+        if workers == 1:
+            return run_expiration(limit=limit, batch_size=options["batch_size"])
+
+        def worker(share):
+            try:
+                return run_expiration(limit=share, batch_size=options["batch_size"])
+            finally:
+                connections.close_all()
+
+        # Split --limit across workers; SKIP LOCKED keeps them from claiming the same rows.
+        shares = [None] * workers if limit is None else [limit // workers + (1 if index < limit % workers else 0) for index in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="expire-layaways") as executor:
+            results = list(executor.map(worker, [share for share in shares if share != 0]))
+        return sum(count for count, _ in results), sum(credit for _, credit in results)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.layaway.counters import rebuild_layaway_counters
+
+
+class Command(BaseCommand):
+    help = "Verifica y recalcula los contadores del tablero de apartados (vencimientos activos y saldo a favor)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Solo verifica; termina con error si hay diferencias.")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Apartados leidos por lote del cursor.")
+
+    def handle(self, *args, **options):
+        differences = rebuild_layaway_counters(dry_run=options["check"], chunk_size=options["chunk_size"])
+        for counter, expected, found in differences:
+            self.stdout.write(f"{counter}: esperado {expected}, encontrado {found}")
+        if options["check"]:
+            if differences:
+                raise CommandError(f"Contadores de apartados con {len(differences)} diferencias.")
+            self.stdout.write(self.style.SUCCESS("Contadores de apartados consistentes."))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Contadores de apartados recalculados (diferencias corregidas: {len(differences)})."))
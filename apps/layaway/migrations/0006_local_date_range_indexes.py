@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('layaway', '0005_layaway_status_refunded'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='layaway',
+            index=models.Index(fields=['expires_at'], name='layaway_expires_idx'),
+        ),
+    ]
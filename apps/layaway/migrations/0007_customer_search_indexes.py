@@ -0,0 +1,35 @@
+from django.db import migrations
+
+# PostgreSQL-only: icontains/istartswith compile to ``UPPER(col::text) LIKE UPPER(%s)``, which a
+# trigram GIN index on the same expression serves; ``varchar_pattern_ops`` serves ``LIKE 'abc%'``
+# whatever the database collation. Other backends keep the plain btree indexes from 0004.
+CREATE_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS customer_name_trgm_idx ON layaway_customer USING gin (UPPER(name::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS customer_phone_prefix_idx ON layaway_customer (phone_normalized varchar_pattern_ops)",
+]
+DROP_SQL = [
+    "DROP INDEX IF EXISTS customer_phone_prefix_idx",
+    "DROP INDEX IF EXISTS customer_name_trgm_idx",
+]
+
+
+def _run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('layaway', '0006_local_date_range_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run_on_postgres(CREATE_SQL), _run_on_postgres(DROP_SQL)),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:37
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+
+def backfill_layaway_counters(apps, schema_editor):
+    Layaway = apps.get_model("layaway", "Layaway")
+    CustomerCredit = apps.get_model("layaway", "CustomerCredit")
+    LayawayDueDayRollup = apps.get_model("layaway", "LayawayDueDayRollup")
+    CustomerCreditTotal = apps.get_model("layaway", "CustomerCreditTotal")
+
+    days = {}
+    for expires_at, total, amount_paid in Layaway.objects.filter(status="ACTIVE").values_list("expires_at", "total", "amount_paid"):
+        row = days.setdefault(timezone.localdate(expires_at), {"active_count": 0, "outstanding": Decimal("0.00")})
+        row["active_count"] += 1
+        row["outstanding"] += total - amount_paid
+    LayawayDueDayRollup.objects.bulk_create([LayawayDueDayRollup(day=day, **row) for day, row in days.items()], batch_size=500)
+
+    credit = CustomerCredit.objects.aggregate(total=Sum("balance"), holders=Count("pk", filter=Q(balance__gt=0)))
+    CustomerCreditTotal.objects.create(pk=1, balance=credit["total"] or 0, customers_with_credit=credit["holders"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('layaway', '0007_customer_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerCreditTotal',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, editable=False, primary_key=True, serialize=False)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('customers_with_credit', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LayawayDueDayRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('active_count', models.IntegerField(default=0)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.RunPython(backfill_layaway_counters, migrations.RunPython.noop),
+    ]
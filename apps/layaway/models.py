@@ -3,7 +3,8 @@ import uuid
 from decimal import Decimal
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connections, models, router
+from django.utils import timezone
 
 
 def normalize_phone(value):
@@ -50,26 +51,51 @@ class Customer(models.Model):
         super().save(*args, **kwargs)
 
     @classmethod
-    def get_or_create_by_phone(cls, phone, name="", notes=""):
-        normalized = normalize_phone(phone)
-        customer = cls.objects.filter(phone_normalized=normalized).first()
-        if customer:
-            updated_fields = []
-            if phone and customer.phone != str(phone).strip():
-                customer.phone = str(phone).strip()
-                updated_fields.append("phone")
-            if name and customer.name != str(name).strip():
-                customer.name = str(name).strip()
-                updated_fields.append("name")
-            if notes and customer.notes != str(notes).strip():
-                customer.notes = str(notes).strip()
-                updated_fields.append("notes")
-            if updated_fields:
-                customer.phone_normalized = normalize_phone(customer.phone)
-                updated_fields.extend(["phone_normalized", "updated_at"])
-                customer.save(update_fields=updated_fields)
-            return customer
-        return cls.objects.create(phone=str(phone).strip(), name=str(name).strip(), notes=str(notes).strip())
+    def upsert_by_phone(cls, phone, name="", notes=""):
+        """Fetch or create the customer for ``phone`` in one race-free statement.
+
+        ``INSERT ... ON CONFLICT (phone_normalized) DO UPDATE ... RETURNING``: the stored phone
+        always takes the latest formatting, ``name``/``notes`` only when given, and ``updated_at``
+        only moves when something changed. Two terminals registering the same phone at once both
+        get the same row instead of an ``IntegrityError``.
+        """
+        phone = str(phone or "").strip()
+        name = str(name or "").strip()
+        notes = str(notes or "").strip()
+        if not phone:
+            raise ValidationError("phone is required")
+
+        connection = connections[router.db_for_write(cls)]
+        now = timezone.now()
+        values = {
+            "id": uuid.uuid4(),
+            "phone": phone,
+            "phone_normalized": normalize_phone(phone),
+            "name": name,
+            "notes": notes,
+            "created_at": now,
+            "updated_at": now,
+        }
+        table = cls._meta.db_table
+        sql = f"""
+            INSERT INTO {table} (id, phone, phone_normalized, name, notes, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (phone_normalized) DO UPDATE SET
+                phone = EXCLUDED.phone,
+                name = CASE WHEN EXCLUDED.name <> '' THEN EXCLUDED.name ELSE {table}.name END,
+                notes = CASE WHEN EXCLUDED.notes <> '' THEN EXCLUDED.notes ELSE {table}.notes END,
+                updated_at = CASE
+                    WHEN {table}.phone <> EXCLUDED.phone
+                        OR (EXCLUDED.name <> '' AND {table}.name <> EXCLUDED.name)
+                        OR (EXCLUDED.notes <> '' AND {table}.notes <> EXCLUDED.notes)
+                    THEN EXCLUDED.updated_at
+                    ELSE {table}.updated_at
+                END
+            RETURNING id, phone, phone_normalized, name, notes, created_at, updated_at
+        """
+        params = [cls._meta.get_field(field_name).get_db_prep_save(value, connection) for field_name, value in values.items()]
+        # raw() applies the backend's converters, so RETURNING yields a regular instance.
+        return next(iter(cls.objects.db_manager(connection.alias).raw(sql, params)))
 
     def __str__(self):
         return f"{self.name} ({self.phone})"
@@ -98,6 +124,7 @@ class Layaway(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["status", "expires_at"], name="layaway_status_expires_idx"),
+            models.Index(fields=["expires_at"], name="layaway_expires_idx"),
             models.Index(fields=["customer_phone"], name="layaway_customer_phone_idx"),
             models.Index(fields=["customer", "status"], name="layaway_customer_status_idx"),
         ]
@@ -177,3 +204,19 @@ class CustomerCredit(models.Model):
             self.customer_name = self.customer.name
             self.customer_phone = self.customer.phone
         super().save(*args, **kwargs)
+
+
+class LayawayDueDayRollup(models.Model):
+    """Active layaways grouped by the local day they expire; kept current by ``apps.layaway.counters``."""
+
+    day = models.DateField(unique=True)
+    active_count = models.IntegerField(default=0)
+    outstanding = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+
+class CustomerCreditTotal(models.Model):
+    """Single row (``pk=1``): total customer credit owed and how many customers hold some."""
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1, editable=False)
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    customers_with_credit = models.IntegerField(default=0)
@@ -22,6 +22,14 @@ class CustomerSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "phone_normalized", "created_at", "updated_at"]
 
 
+class CustomerAutocompleteSerializer(serializers.ModelSerializer):
+    credit_balance = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Customer
+        fields = ["id", "name", "phone", "phone_normalized", "credit_balance"]
+
+
 class CustomerUpsertSerializer(serializers.Serializer):
     phone = serializers.CharField()
     name = serializers.CharField()
@@ -33,6 +41,18 @@ class CustomerUpsertSerializer(serializers.Serializer):
         return value
 
 
+class LayawayDashboardSerializer(serializers.Serializer):
+    as_of = serializers.DateField()
+    active_count = serializers.IntegerField()
+    active_outstanding = serializers.DecimalField(max_digits=14, decimal_places=2)
+    due_today_count = serializers.IntegerField()
+    due_today_outstanding = serializers.DecimalField(max_digits=14, decimal_places=2)
+    overdue_count = serializers.IntegerField()
+    overdue_outstanding = serializers.DecimalField(max_digits=14, decimal_places=2)
+    credit_liability = serializers.DecimalField(max_digits=14, decimal_places=2)
+    customers_with_credit = serializers.IntegerField()
+
+
 class LayawayLineSerializer(serializers.ModelSerializer):
     product_sku = serializers.CharField(source="product.sku", read_only=True)
     product_name = serializers.CharField(source="product.name", read_only=True)
@@ -1,14 +1,18 @@
 from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
 
 from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.db.models import Sum
 from django.utils import timezone
 from rest_framework.test import APITestCase
 
+from apps.audit.models import AuditLog
 from apps.catalog.models import Product
+from apps.layaway.counters import expected_layaway_counters, layaway_dashboard, rebuild_layaway_counters
 from apps.inventory.models import InventoryMovement
-from apps.layaway.models import Customer, CustomerCredit, Layaway
+from apps.layaway.models import Customer, CustomerCredit, CustomerCreditTotal, Layaway, LayawayStatus
 from apps.investors.models import Investor, InvestorAssignment
 from apps.ledger.models import LedgerEntry
 
@@ -142,6 +146,23 @@ class LayawayFlowTests(APITestCase):
         credit = CustomerCredit.objects.get(customer=customer)
         self.assertEqual(credit.balance, Decimal("300.00"))
 
+    def test_forced_expire_keeps_the_credit_counters_in_step(self):
+        response = self.create_layaway(customer_name="Lucia", customer_phone="777")
+        layaway = Layaway.objects.get(id=response.data["id"])
+        self.assertGreater(layaway.amount_paid, 0)
+        CustomerCredit.objects.create(customer=layaway.customer, customer_name="Lucia", customer_phone="777")
+
+        self.auth_as("admin_lay", "admin123")
+        expire = self.client.post(f"/api/v1/layaways/{layaway.id}/expire/", {"force": True}, format="json")
+        self.assertEqual(expire.status_code, 200)
+        self.assertEqual(expire.data["customer_credit_balance"], str(layaway.amount_paid))
+
+        _, expected_credit = expected_layaway_counters()
+        stored_credit = CustomerCreditTotal.objects.get()
+        self.assertEqual(stored_credit.balance, expected_credit.balance)
+        self.assertEqual(stored_credit.customers_with_credit, expected_credit.customers_with_credit)
+        self.assertEqual(rebuild_layaway_counters(dry_run=True), [])
+
     def test_customer_credit_apply_endpoint(self):
         self.auth_as("cashier_lay", "cashier123")
         customer = Customer.objects.create(phone="999", name="Eva")
@@ -205,3 +226,122 @@ class LayawayFlowTests(APITestCase):
         self.assertEqual(assignment.qty_sold, Decimal("0.00"))
         self.assertEqual(layaway.status, "REFUNDED")
         self.assertTrue(LedgerEntry.objects.filter(reference_type="sale_void", reference_id=sale_id).exists())
+
+    def expired_layaway(self, customer_name, customer_phone):
+        layaway = Layaway.objects.get(id=self.create_layaway(customer_name=customer_name, customer_phone=customer_phone).data["id"])
+        layaway.expires_at = timezone.now() - timedelta(minutes=1)
+        layaway.save(update_fields=["expires_at"])
+        return layaway
+
+    def test_expire_layaways_command_expires_in_batches(self):
+        first = self.expired_layaway("Maria", "444")
+        second = self.expired_layaway("Maria", "444")
+        third = self.expired_layaway("Luis", "555")
+        pending = Layaway.objects.get(id=self.create_layaway(customer_name="Ana", customer_phone="666").data["id"])
+        self.assertEqual(self.stock(self.product), Decimal("6.00"))
+
+        out = StringIO()
+        call_command("expire_layaways", "--batch-size=2", stdout=out)
+        self.assertIn("Expired layaways: 3", out.getvalue())
+
+        statuses = dict(Layaway.objects.values_list("id", "status"))
+        self.assertEqual({statuses[item.id] for item in (first, second, third)}, {LayawayStatus.EXPIRED})
+        self.assertEqual(statuses[pending.id], LayawayStatus.ACTIVE)
+        self.assertEqual(self.stock(self.product), Decimal("9.00"))
+        self.assertEqual(CustomerCredit.objects.get(customer__phone_normalized="444").balance, Decimal("400.00"))
+        self.assertEqual(CustomerCredit.objects.get(customer__phone_normalized="555").balance, Decimal("200.00"))
+        self.assertEqual(AuditLog.objects.filter(action="layaway.expire.auto", actor=self.cashier).count(), 3)
+
+        call_command("expire_layaways", stdout=out)
+        self.assertIn("Expired layaways: 0", out.getvalue())
+        self.assertEqual(self.stock(self.product), Decimal("9.00"))
+
+    def test_expire_layaways_command_dry_run_and_limit(self):
+        for phone in ("444", "555", "666"):
+            self.expired_layaway("Cliente", phone)
+
+        out = StringIO()
+        call_command("expire_layaways", "--dry-run", stdout=out)
+        self.assertIn("Dry run: 3", out.getvalue())
+        self.assertEqual(Layaway.objects.filter(status=LayawayStatus.EXPIRED).count(), 0)
+
+        call_command("expire_layaways", "--limit=2", "--batch-size=1", stdout=out)
+        self.assertIn("Expired layaways: 2", out.getvalue())
+        self.assertEqual(Layaway.objects.filter(status=LayawayStatus.ACTIVE).count(), 1)
+
+    def test_customer_autocomplete_ranks_prefix_matches(self):
+        Customer.objects.create(phone="555-100-2000", name="Juan Perez")
+        Customer.objects.create(phone="555-100-3000", name="Ana Juarez")
+        beto = Customer.objects.create(phone="777-000-1111", name="Beto Juanes")
+        CustomerCredit.objects.create(customer=beto, customer_name=beto.name, customer_phone=beto.phone, balance=Decimal("50.00"))
+        self.auth_as("cashier_lay", "cashier123")
+
+        response = self.client.get("/api/v1/customers/autocomplete/", {"q": "jua"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["name"] for row in response.data["results"]], ["Juan Perez", "Ana Juarez", "Beto Juanes"])
+        self.assertEqual(response.data["results"][2]["credit_balance"], "50.00")
+        self.assertEqual(response.data["results"][0]["credit_balance"], "0.00")
+
+        response = self.client.get("/api/v1/customers/autocomplete/", {"q": "555 100"})
+        self.assertEqual([row["name"] for row in response.data["results"]], ["Juan Perez", "Ana Juarez"])
+
+        response = self.client.get("/api/v1/customers/autocomplete/", {"q": "j"})
+        self.assertEqual(response.data["results"], [])
+
+    def test_customer_upsert_reuses_row_and_keeps_fields_not_given(self):
+        created = Customer.upsert_by_phone(phone="555 123 4567", name="Lucia", notes="Prefiere WhatsApp")
+        created.refresh_from_db()
+        stamped = created.updated_at
+
+        same = Customer.upsert_by_phone(phone="555 123 4567", name="Lucia")
+        self.assertEqual(same.pk, created.pk)
+        self.assertEqual(same.notes, "Prefiere WhatsApp")
+        self.assertEqual(same.updated_at, stamped)
+
+        renamed = Customer.upsert_by_phone(phone="(555) 123-4567", name="Lucia Gomez")
+        self.assertEqual(renamed.pk, created.pk)
+        self.assertEqual((renamed.phone, renamed.name, renamed.notes), ("(555) 123-4567", "Lucia Gomez", "Prefiere WhatsApp"))
+        self.assertGreater(renamed.updated_at, stamped)
+        self.assertEqual(Customer.objects.filter(phone_normalized="5551234567").count(), 1)
+
+        self.auth_as("cashier_lay", "cashier123")
+        response = self.client.post("/api/v1/customers/", {"phone": "5551234567", "name": "Lucia G."}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["id"], str(created.pk))
+        self.assertEqual(response.data["name"], "Lucia G.")
+
+    def test_dashboard_counters_follow_layaway_and_credit_changes(self):
+        first = Layaway.objects.get(id=self.create_layaway(customer_name="Maria", customer_phone="444").data["id"])
+        second = Layaway.objects.get(id=self.create_layaway(customer_name="Luis", customer_phone="555").data["id"])
+        third = Layaway.objects.get(id=self.create_layaway(customer_name="Ana", customer_phone="666").data["id"])
+        self.client.post(f"/api/v1/layaways/{first.id}/payments/", {"payments": [{"method": "CASH", "amount": "100.00"}]}, format="json")
+        self.client.post(f"/api/v1/layaways/{third.id}/settle/", {"payments": [{"method": "CASH", "amount": "600.00"}]}, format="json")
+        self.client.post(
+            f"/api/v1/layaways/{second.id}/extend/",
+            {"new_expires_at": (timezone.now() + timedelta(days=30)).isoformat()},
+            format="json",
+        )
+
+        dashboard = self.client.get("/api/v1/layaways/dashboard/")
+        self.assertEqual(dashboard.status_code, 200)
+        self.assertEqual((dashboard.data["active_count"], dashboard.data["active_outstanding"]), (2, "1100.00"))
+        self.assertEqual((dashboard.data["due_today_count"], dashboard.data["overdue_count"]), (0, 0))
+        self.assertEqual(dashboard.data["credit_liability"], "0.00")
+        due_later = layaway_dashboard(today=timezone.localdate(timezone.now() + timedelta(days=20)))
+        self.assertEqual((due_later["overdue_count"], due_later["overdue_outstanding"]), (1, Decimal("500.00")))
+
+        # Editing rows behind the API's back is caught by the check and fixed by the rebuild.
+        Layaway.objects.filter(pk=first.pk).update(expires_at=timezone.now() - timedelta(days=1))
+        with self.assertRaises(CommandError):
+            call_command("rebuild_layaway_counters", "--check", stdout=StringIO())
+        call_command("rebuild_layaway_counters", stdout=StringIO())
+        self.assertEqual(self.client.get("/api/v1/layaways/dashboard/").data["overdue_count"], 1)
+
+        call_command("expire_layaways", stdout=StringIO())
+        credit = CustomerCredit.objects.get(customer__phone_normalized="444")
+        self.client.post(f"/api/v1/customer-credits/{credit.id}/apply/", {"amount": "50.00"}, format="json")
+
+        dashboard = self.client.get("/api/v1/layaways/dashboard/").data
+        self.assertEqual((dashboard["active_count"], dashboard["active_outstanding"], dashboard["overdue_count"]), (1, "600.00", 0))
+        self.assertEqual((dashboard["credit_liability"], dashboard["customers_with_credit"]), ("250.00", 1))
+        call_command("rebuild_layaway_counters", "--check", stdout=StringIO())
@@ -1,7 +1,8 @@
 from decimal import Decimal
 
 from django.db import models, transaction
-from django.db.models import Prefetch, Q
+from django.db.models import Prefetch, Q, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
@@ -9,7 +10,10 @@ from rest_framework.response import Response
 
 from apps.accounts.models import UserRole
 from apps.audit.services import record_audit
+from apps.common.dates import filter_local_date_range
+from apps.common.query_budget import QueryBudget
 from apps.common.permissions import RolePermission
+from apps.layaway.counters import LayawayFacts, layaway_dashboard, record_credit_changes
 from apps.inventory.models import InventoryMovement, MovementType
 from apps.layaway.models import (
     Customer,
@@ -22,15 +26,22 @@ from apps.layaway.models import (
     normalize_phone,
 )
 from apps.layaway.serializers import (
+    CustomerAutocompleteSerializer,
     CustomerCreditSerializer,
     CustomerSerializer,
     LayawayCreateSerializer,
+    LayawayDashboardSerializer,
     LayawayExtendSerializer,
     LayawayPaymentCreateSerializer,
     LayawaySerializer,
 )
 from apps.sales.models import Payment, PaymentMethod, Sale, SaleLine, SaleStatus
 from apps.sales.profitability import apply_sale_profitability
+from apps.sales.rollups import record_sale_rollups
+
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MIN_LENGTH = 2
 
 
 class CustomerViewSet(viewsets.ModelViewSet):
@@ -38,7 +49,13 @@ class CustomerViewSet(viewsets.ModelViewSet):
     serializer_class = CustomerSerializer
     permission_classes = [RolePermission]
     http_method_names = ["get", "post", "head", "options"]
-    capability_map = {"list": ["layaway.manage"], "retrieve": ["layaway.manage"], "create": ["layaway.manage"]}
+    capability_map = {
+        "list": ["layaway.manage"],
+        "retrieve": ["layaway.manage"],
+        "create": ["layaway.manage"],
+        "autocomplete": ["layaway.manage"],
+    }
+    query_budgets = {"list": QueryBudget(4), "autocomplete": QueryBudget(3)}
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -57,14 +74,40 @@ class CustomerViewSet(viewsets.ModelViewSet):
         notes = str(request.data.get("notes", "")).strip()
         if not phone or not name:
             return Response({"code": "invalid_customer", "detail": "Nombre y telefono son obligatorios.", "fields": {}}, status=400)
-        customer = Customer.get_or_create_by_phone(phone=phone, name=name, notes=notes)
+        customer = Customer.upsert_by_phone(phone=phone, name=name, notes=notes)
         serializer = self.get_serializer(customer)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request):
+        """Top matches for ``?q`` in one query, for search-as-you-type at the counter.
+
+        A query without letters is a phone prefix (``phone_normalized`` prefix index); anything
+        else matches names, prefix matches first (trigram index on PostgreSQL).
+        """
+        query = str(request.query_params.get("q", "")).strip()
+        if len(query) < AUTOCOMPLETE_MIN_LENGTH:
+            return Response({"results": []})
+
+        customers = Customer.objects.annotate(credit_balance=Coalesce("credit__balance", Value(Decimal("0.00"))))
+        if not any(char.isalpha() for char in query):
+            digits = normalize_phone(query)
+            customers = customers.filter(phone_normalized__startswith=digits).order_by("phone_normalized", "name")
+        else:
+            customers = customers.filter(name__icontains=query).annotate(
+                rank=models.Case(
+                    models.When(name__istartswith=query, then=0),
+                    default=1,
+                    output_field=models.IntegerField(),
+                )
+            ).order_by("rank", "name", "phone_normalized")
+        serializer = CustomerAutocompleteSerializer(customers[:AUTOCOMPLETE_LIMIT], many=True)
+        return Response({"results": serializer.data})
+
 
 class LayawayViewSet(viewsets.ModelViewSet):
     queryset = (
-        Layaway.objects.select_related("product", "created_by", "customer")
+        Layaway.objects.select_related("product", "created_by", "customer__credit")
         .prefetch_related(
             Prefetch("lines", queryset=LayawayLine.objects.select_related("product")),
             "payments",
@@ -92,7 +135,9 @@ class LayawayViewSet(viewsets.ModelViewSet):
         "settle": ["layaway.manage"],
         "extend": ["layaway.manage"],
         "expire": ["layaway.manage"],
+        "dashboard": ["layaway.manage"],
     }
+    query_budgets = {"list": QueryBudget(7), "dashboard": QueryBudget(4)}
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -128,7 +173,7 @@ class LayawayViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(expires_at__gte=expires_after)
         if str(due_today).lower() in {"1", "true", "yes"}:
             today = timezone.localdate()
-            queryset = queryset.filter(expires_at__date=today)
+            queryset = filter_local_date_range(queryset, "expires_at", today, today)
         if str(expired).lower() in {"1", "true", "yes"}:
             queryset = queryset.filter(status=LayawayStatus.ACTIVE, expires_at__lt=timezone.now())
         if str(exclude_settled).lower() in {"1", "true", "yes"}:
@@ -142,18 +187,18 @@ class LayawayViewSet(viewsets.ModelViewSet):
 
     @staticmethod
     def _resolve_role(user):
-        group_names = set(user.groups.values_list("name", flat=True))
-        for role in (UserRole.ADMIN, UserRole.CASHIER, UserRole.INVESTOR):
-            if role in group_names:
-                return role
-        return getattr(user, "role", UserRole.CASHIER)
+        return RolePermission._resolve_role(user)
 
     @staticmethod
     def _get_or_create_credit(customer):
+        """The customer's credit row, created at zero if missing, row-locked until the transaction ends."""
         credit = CustomerCredit.objects.filter(customer=customer).first()
-        if credit:
-            return credit
-        return CustomerCredit.objects.create(customer=customer, customer_name=customer.name, customer_phone=customer.phone)
+        if credit is None:
+            credit = CustomerCredit.objects.create(customer=customer, customer_name=customer.name, customer_phone=customer.phone)
+        credit = CustomerCredit.objects.select_for_update().get(pk=credit.pk)
+        # Serializers read ``customer.credit``; point it at the locked row that is about to change.
+        customer.credit = credit
+        return credit
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -161,7 +206,7 @@ class LayawayViewSet(viewsets.ModelViewSet):
 
         with transaction.atomic():
             customer_data = serializer.validated_data["customer"]
-            customer = Customer.get_or_create_by_phone(
+            customer = Customer.upsert_by_phone(
                 phone=customer_data["phone"],
                 name=customer_data["name"],
                 notes=customer_data.get("notes", ""),
@@ -189,6 +234,9 @@ class LayawayViewSet(viewsets.ModelViewSet):
                 notes=serializer.validated_data.get("notes", ""),
                 created_by=request.user,
             )
+            facts = LayawayFacts()
+            facts.add_layaway(layaway)
+            facts.record()
 
             for line in lines:
                 line_obj = LayawayLine.objects.create(layaway=layaway, **line)
@@ -222,6 +270,11 @@ class LayawayViewSet(viewsets.ModelViewSet):
         response_serializer = LayawaySerializer(layaway, context=self.get_serializer_context())
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=["get"])
+    def dashboard(self, request):
+        """Active, due-today and overdue layaways plus customer credit owed, read from the counters."""
+        return Response(LayawayDashboardSerializer(layaway_dashboard()).data)
+
     @action(detail=True, methods=["post"])
     def payments(self, request, pk=None):
         serializer = LayawayPaymentCreateSerializer(data=request.data)
@@ -283,9 +336,16 @@ class LayawayViewSet(viewsets.ModelViewSet):
             )
 
         with transaction.atomic():
+            layaway = Layaway.objects.select_for_update().get(pk=layaway.pk)
+            if layaway.status != LayawayStatus.ACTIVE:
+                return Response({"code": "invalid_state", "detail": "Solo puedes extender apartados activos.", "fields": {}}, status=400)
+            facts = LayawayFacts()
+            facts.add_layaway(layaway, sign=-1)
             old_expires_at = layaway.expires_at
             layaway.expires_at = new_expires_at
             layaway.save(update_fields=["expires_at", "updated_at"])
+            facts.add_layaway(layaway)
+            facts.record()
             LayawayExtensionLog.objects.create(
                 layaway=layaway,
                 old_expires_at=old_expires_at,
@@ -321,8 +381,11 @@ class LayawayViewSet(viewsets.ModelViewSet):
                     {"code": "invalid_state", "detail": "El apartado aun no vence. Solo admin puede forzar vencimiento.", "fields": {}},
                     status=400,
                 )
+            facts = LayawayFacts()
+            facts.add_layaway(layaway, sign=-1)
             layaway.status = LayawayStatus.EXPIRED
             layaway.save(update_fields=["status", "updated_at"])
+            facts.record()
 
             for line in layaway.lines.all():
                 InventoryMovement.objects.create(
@@ -337,8 +400,10 @@ class LayawayViewSet(viewsets.ModelViewSet):
 
             if layaway.customer_id and layaway.amount_paid > 0:
                 credit = self._get_or_create_credit(layaway.customer)
+                balance_before = credit.balance
                 credit.balance = (credit.balance + layaway.amount_paid).quantize(Decimal("0.01"))
                 credit.save(update_fields=["balance", "updated_at", "customer_name", "customer_phone"])
+                record_credit_changes([(balance_before, credit.balance)])
 
             record_audit(
                 actor=request.user,
@@ -355,6 +420,8 @@ class LayawayViewSet(viewsets.ModelViewSet):
         due = (layaway.total - layaway.amount_paid).quantize(Decimal("0.01"))
         if payment_sum > due:
             raise ValueError("La suma de pagos excede el saldo pendiente.")
+        facts = LayawayFacts()
+        facts.add_layaway(layaway, sign=-1)
 
         if layaway.customer_id:
             credit_requested = sum(
@@ -363,11 +430,12 @@ class LayawayViewSet(viewsets.ModelViewSet):
             ).quantize(Decimal("0.01"))
             if credit_requested > 0:
                 credit = self._get_or_create_credit(layaway.customer)
-                credit = CustomerCredit.objects.select_for_update().get(pk=credit.pk)
                 if credit_requested > credit.balance:
                     raise ValueError("El saldo a favor solicitado excede el disponible.")
+                balance_before = credit.balance
                 credit.balance = (credit.balance - credit_requested).quantize(Decimal("0.01"))
                 credit.save(update_fields=["balance", "updated_at", "customer_name", "customer_phone"])
+                record_credit_changes([(balance_before, credit.balance)])
 
         for payment in payments:
             LayawayPayment.objects.create(
@@ -387,6 +455,8 @@ class LayawayViewSet(viewsets.ModelViewSet):
             layaway.save(update_fields=["amount_paid", "deposit_amount", "status", "settled_sale_id", "updated_at"])
         else:
             layaway.save(update_fields=["amount_paid", "deposit_amount", "updated_at"])
+        facts.add_layaway(layaway)
+        facts.record()
 
         record_audit(
             actor=user,
@@ -429,6 +499,7 @@ class LayawayViewSet(viewsets.ModelViewSet):
                 installments_months=payment.installments_months,
             )
         apply_sale_profitability(sale=sale)
+        record_sale_rollups(sale=sale)
 
         record_audit(
             actor=user,
@@ -475,8 +546,10 @@ class CustomerCreditViewSet(viewsets.ReadOnlyModelViewSet):
                     {"code": "invalid_payment", "detail": "El monto a aplicar excede el saldo disponible.", "fields": {}},
                     status=400,
                 )
+            balance_before = credit.balance
             credit.balance = (credit.balance - amount).quantize(Decimal("0.01"))
             credit.save(update_fields=["balance", "updated_at", "customer_name", "customer_phone"])
+            record_credit_changes([(balance_before, credit.balance)])
             record_audit(
                 actor=request.user,
                 action="customer_credit.apply",
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.ledger.services import rebuild_investor_balances, verify_investor_balances
+
+
+class Command(BaseCommand):
+    help = "Recalcula los balances materializados de inversionistas a partir del ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--investor", action="append", dest="investors", help="ID de inversionista (repetible). Por defecto todos.")
+
+    def handle(self, *args, **options):
+        investor_ids = options["investors"]
+        before = verify_investor_balances(investor_ids)
+        rebuilt = rebuild_investor_balances(investor_ids)
+        self.stdout.write(f"Balances recalculados: {rebuilt} (diferencias corregidas: {len(before)})")
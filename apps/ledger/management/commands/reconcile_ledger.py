@@ -1,85 +1,190 @@
+import json
 import sys
 from decimal import Decimal
+from functools import partial
 
-from django.core.management.base import BaseCommand
-from django.db.models import Sum
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
+from apps.common.dates import local_day_start
+from apps.common.sections import run_sections
 from apps.investors.models import Investor, InvestorAssignment
-from apps.ledger.services import current_balances
-from apps.sales.models import Sale, SaleLineProfitability, SaleStatus
+from apps.ledger.models import InvestorBalance, LedgerEntry
+from apps.ledger.services import verify_investor_balances
+from apps.sales.models import SaleLineProfitability, SaleStatus
+
+
+def assignment_mismatches(assignment_ids=None):
+    """Assignments whose ``qty_sold`` differs from the ``qty_consumed`` of their confirmed sales, in one query."""
+    consumed = (
+        SaleLineProfitability.objects.filter(assignment_id=OuterRef("pk"), snapshot__sale__status=SaleStatus.CONFIRMED)
+        .order_by()
+        .values("assignment_id")
+        .annotate(total=Sum("qty_consumed"))
+        .values("total")
+    )
+    assignments = InvestorAssignment.objects.annotate(
+        expected_qty_sold=Coalesce(Subquery(consumed), Value(0, output_field=DecimalField(max_digits=12, decimal_places=2)))
+    ).exclude(qty_sold=F("expected_qty_sold"))
+    if assignment_ids is not None:
+        assignments = assignments.filter(id__in=assignment_ids)
+    return [
+        {
+            "assignment_id": str(assignment.id),
+            "investor_id": str(assignment.investor_id),
+            "investor": assignment.investor.display_name,
+            "product": assignment.product.name,
+            "expected": f"{Decimal(assignment.expected_qty_sold):.2f}",
+            "found": f"{Decimal(assignment.qty_sold):.2f}",
+        }
+        for assignment in assignments.select_related("investor", "product").order_by("id")
+    ]
+
+
+def _chunks(ids, jobs):
+    size = max(1, -(-len(ids) // jobs))
+    return [ids[start : start + size] for start in range(0, len(ids), size)]
 
 
 class Command(BaseCommand):
     help = "Verifica integridad del ledger de inversionistas (solo lectura, sin efectos secundarios)."
 
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=1, help="Hilos en paralelo; cada uno verifica un bloque de ids.")
+        parser.add_argument("--json", action="store_true", help="Imprime el resultado como JSON.")
+        parser.add_argument(
+            "--since",
+            help="Solo inversionistas/asignaciones con movimientos desde esta fecha (YYYY-MM-DD local o ISO 8601).",
+        )
+        parser.add_argument("--timeout", type=int, default=3600, help="Segundos maximos por bloque con --jobs > 1.")
+
     def handle(self, *args, **options):
-        mismatches = 0
-
-        investors = list(Investor.objects.all())
-        self.stdout.write(f"Verificando {len(investors)} inversionistas...")
-
-        for inv in investors:
-            balances = current_balances(inv)
-            ledger_capital = balances["capital"]
-            ledger_inventory = balances["inventory"]
-            ledger_profit = balances["profit"]
-
-            # Re-aggregate directly to compare (service uses same query, this is a double-check)
-            from apps.ledger.models import LedgerEntry
-            raw = inv.ledger_entries.aggregate(
-                cap=Sum("capital_delta"),
-                inv=Sum("inventory_delta"),
-                pro=Sum("profit_delta"),
-            )
-            raw_capital = raw["cap"] or Decimal("0.00")
-            raw_inventory = raw["inv"] or Decimal("0.00")
-            raw_profit = raw["pro"] or Decimal("0.00")
-
-            if (
-                Decimal(str(ledger_capital)) != Decimal(str(raw_capital))
-                or Decimal(str(ledger_inventory)) != Decimal(str(raw_inventory))
-                or Decimal(str(ledger_profit)) != Decimal(str(raw_profit))
-            ):
-                mismatches += 1
-                self.stdout.write(
-                    f"  [MISMATCH] {inv.display_name} — "
-                    f"capital: servicio=${ledger_capital} / raw=${raw_capital} | "
-                    f"inventory: servicio=${ledger_inventory} / raw=${raw_inventory} | "
-                    f"profit: servicio=${ledger_profit} / raw=${raw_profit}"
-                )
-            else:
-                self.stdout.write(
-                    f"  [OK] {inv.display_name} — "
-                    f"capital: ${ledger_capital} / inventory: ${ledger_inventory} / profit: ${ledger_profit}"
-                )
-
-        assignments = list(InvestorAssignment.objects.select_related("investor", "product").all())
-        self.stdout.write(f"Verificando {len(assignments)} asignaciones...")
-
-        ok_count = 0
-        for asgn in assignments:
-            result = SaleLineProfitability.objects.filter(
-                assignment=asgn,
-                snapshot__sale__status=SaleStatus.CONFIRMED,
-            ).aggregate(total=Sum("qty_consumed"))
-            expected = result["total"] or Decimal("0.00")
-            actual = Decimal(str(asgn.qty_sold))
-
-            if actual != Decimal(str(expected)):
-                mismatches += 1
-                self.stdout.write(
-                    f"  [MISMATCH] Asignación #{asgn.id} "
-                    f"producto \"{asgn.product.name}\" ({asgn.investor.display_name}) — "
-                    f"qty_sold esperado: {expected} / encontrado: {actual}"
-                )
-            else:
-                ok_count += 1
-
-        if ok_count:
-            self.stdout.write(f"  [OK] {ok_count} asignaciones")
+        if options["jobs"] < 1:
+            raise CommandError("--jobs debe ser mayor o igual a 1.")
+        since = self._parse_since(options["since"])
+        investor_ids, assignment_ids = self._scope(since)
+
+        sections = {}
+        if options["jobs"] > 1:
+            for index, chunk in enumerate(_chunks(self._ids(Investor, investor_ids), options["jobs"])):
+                sections[f"balances_{index}"] = partial(verify_investor_balances, chunk)
+            for index, chunk in enumerate(_chunks(self._ids(InvestorAssignment, assignment_ids), options["jobs"])):
+                sections[f"assignments_{index}"] = partial(assignment_mismatches, chunk)
+        else:
+            sections = {
+                "balances_0": partial(verify_investor_balances, investor_ids),
+                "assignments_0": partial(assignment_mismatches, assignment_ids),
+            }
+        results, _ = run_sections(sections, max_workers=options["jobs"], timeout_seconds=options["timeout"])
+
+        balance_mismatches = [row for name, rows in sorted(results.items()) if name.startswith("balances_") for row in rows]
+        assignment_rows = [row for name, rows in sorted(results.items()) if name.startswith("assignments_") for row in rows]
+        report = {
+            "since": since.isoformat() if since else None,
+            "investors_checked": self._count(Investor, investor_ids),
+            "assignments_checked": self._count(InvestorAssignment, assignment_ids),
+            "balance_mismatches": [
+                {
+                    "investor_id": str(row["investor_id"]),
+                    "field": row["field"],
+                    "expected": f"{Decimal(row['expected']):.2f}",
+                    "stored": f"{Decimal(row['stored']):.2f}",
+                }
+                for row in balance_mismatches
+            ],
+            "assignment_mismatches": assignment_rows,
+        }
+        mismatches = len(report["balance_mismatches"]) + len(assignment_rows)
+        report["ok"] = mismatches == 0
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._write_text(report)
 
         if mismatches:
-            self.stderr.write(f"Resultado: {mismatches} inconsistencias encontradas")
+            if not options["json"]:
+                self.stderr.write(f"Resultado: {mismatches} inconsistencias encontradas")
             sys.exit(1)
-        else:
+        if not options["json"]:
             self.stdout.write("Resultado: todo consistente ✓")
+
+    def _write_text(self, report):
+        names = dict(
+            Investor.objects.filter(id__in={row["investor_id"] for row in report["balance_mismatches"]}).values_list("id", "display_name")
+        )
+        names = {str(investor_id): name for investor_id, name in names.items()}
+        if report["since"]:
+            self.stdout.write(f"Modo incremental desde {report['since']}")
+
+        self.stdout.write(f"Verificando {report['investors_checked']} inversionistas...")
+        for row in report["balance_mismatches"]:
+            self.stdout.write(
+                f"  [MISMATCH] {names.get(row['investor_id'], row['investor_id'])} — "
+                f"{row['field']}: materializado=${row['stored']} / ledger=${row['expected']}"
+            )
+        ok_investors = report["investors_checked"] - len({row["investor_id"] for row in report["balance_mismatches"]})
+        if ok_investors > 0:
+            self.stdout.write(f"  [OK] {ok_investors} inversionistas")
+
+        self.stdout.write(f"Verificando {report['assignments_checked']} asignaciones...")
+        for row in report["assignment_mismatches"]:
+            self.stdout.write(
+                f"  [MISMATCH] Asignación #{row['assignment_id']} "
+                f"producto \"{row['product']}\" ({row['investor']}) — "
+                f"qty_sold esperado: {row['expected']} / encontrado: {row['found']}"
+            )
+        ok_assignments = report["assignments_checked"] - len(report["assignment_mismatches"])
+        if ok_assignments > 0:
+            self.stdout.write(f"  [OK] {ok_assignments} asignaciones")
+
+    @staticmethod
+    def _parse_since(value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is not None:
+            return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+        day = parse_date(value)
+        if day is None:
+            raise CommandError("--since debe tener formato YYYY-MM-DD o ISO 8601.")
+        return local_day_start(day)
+
+    @staticmethod
+    def _scope(since):
+        """Ids touched since ``since`` (``None`` = everything) for investors and assignments."""
+        if since is None:
+            return None, None
+        investor_ids = set(
+            LedgerEntry.objects.filter(created_at__gte=since).order_by().values_list("investor_id", flat=True).distinct()
+        )
+        investor_ids |= set(InvestorBalance.objects.filter(updated_at__gte=since).values_list("investor_id", flat=True))
+
+        sales_touched = (
+            Q(snapshot__sale__confirmed_at__gte=since)
+            | Q(snapshot__sale__voided_at__gte=since)
+            | Q(snapshot__calculated_at__gte=since)
+        )
+        assignment_ids = set(
+            SaleLineProfitability.objects.filter(sales_touched, assignment__isnull=False)
+            .order_by()
+            .values_list("assignment_id", flat=True)
+            .distinct()
+        )
+        assignment_ids |= set(InvestorAssignment.objects.filter(created_at__gte=since).values_list("id", flat=True))
+        return sorted(investor_ids, key=str), sorted(assignment_ids, key=str)
+
+    @staticmethod
+    def _ids(model, ids):
+        if ids is not None:
+            return ids
+        return list(model.objects.order_by("pk").values_list("pk", flat=True))
+
+    @staticmethod
+    def _count(model, ids):
+        if ids is not None:
+            return len(ids)
+        return model.objects.count()
@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.common.dates import local_day_start
+from apps.ledger.models import LedgerEntry
+from apps.ledger.services import write_ledger_checkpoints
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = "Escribe checkpoints mensuales de balances por inversionista (por defecto el ultimo mes cerrado)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="Mes cerrado a escribir, YYYY-MM.")
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Escribe todos los meses cerrados desde la primera entrada del ledger.",
+        )
+
+    def handle(self, *args, **options):
+        current_month = timezone.localdate().replace(day=1)
+        if options["month"] and options["backfill"]:
+            raise CommandError("Usa --month o --backfill, no ambos.")
+
+        if options["backfill"]:
+            first_entry = LedgerEntry.objects.order_by("created_at").values_list("created_at", flat=True).first()
+            if first_entry is None:
+                self.stdout.write("Ledger vacio, no hay checkpoints que escribir.")
+                return
+            month = timezone.localtime(first_entry).date().replace(day=1)
+            months = []
+            while month < current_month:
+                months.append(month)
+                month = _next_month(month)
+        elif options["month"]:
+            try:
+                year, number = (int(part) for part in options["month"].split("-"))
+                months = [date(year, number, 1)]
+            except ValueError:
+                raise CommandError("--month debe tener formato YYYY-MM.")
+            if months[0] >= current_month:
+                raise CommandError("Solo se pueden escribir checkpoints de meses cerrados.")
+        else:
+            months = [(current_month - timedelta(days=1)).replace(day=1)]
+
+        # Oldest first: each month is built from the previous month's checkpoint.
+        for month in months:
+            try:
+                written = write_ledger_checkpoints(local_day_start(_next_month(month)))
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(f"Checkpoint {month:%Y-%m}: {written} inversionistas")
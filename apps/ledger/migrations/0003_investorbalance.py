@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_investor_balances(apps, schema_editor):
+    LedgerEntry = apps.get_model("ledger", "LedgerEntry")
+    InvestorBalance = apps.get_model("ledger", "InvestorBalance")
+
+    totals = (
+        LedgerEntry.objects.order_by()
+        .values("investor_id")
+        .annotate(capital=Sum("capital_delta"), inventory=Sum("inventory_delta"), profit=Sum("profit_delta"))
+    )
+    InvestorBalance.objects.bulk_create(
+        [
+            InvestorBalance(
+                investor_id=row["investor_id"],
+                capital=row["capital"],
+                inventory=row["inventory"],
+                profit=row["profit"],
+            )
+            for row in totals
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0003_alter_investor_user_nullable'),
+        ('ledger', '0002_ledgerentry_ledger_investor_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvestorBalance',
+            fields=[
+                ('investor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to='investors.investor')),
+                ('capital', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('inventory', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_investor_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:34
+
+from django.db import migrations, models
+
+RUNNING_FIELDS = ["sequence", "capital_after", "inventory_after", "profit_after"]
+
+
+def backfill_running_balances(apps, schema_editor):
+    LedgerEntry = apps.get_model("ledger", "LedgerEntry")
+    InvestorBalance = apps.get_model("ledger", "InvestorBalance")
+
+    pending = []
+    last_sequence = {}
+    running = {}
+    for entry in LedgerEntry.objects.order_by("investor_id", "created_at", "id").iterator(chunk_size=2000):
+        capital, inventory, profit = running.get(entry.investor_id, (0, 0, 0))
+        capital += entry.capital_delta
+        inventory += entry.inventory_delta
+        profit += entry.profit_delta
+        running[entry.investor_id] = (capital, inventory, profit)
+        last_sequence[entry.investor_id] = last_sequence.get(entry.investor_id, 0) + 1
+
+        entry.sequence = last_sequence[entry.investor_id]
+        entry.capital_after = capital
+        entry.inventory_after = inventory
+        entry.profit_after = profit
+        pending.append(entry)
+        if len(pending) >= 2000:
+            LedgerEntry.objects.bulk_update(pending, RUNNING_FIELDS)
+            pending = []
+    if pending:
+        LedgerEntry.objects.bulk_update(pending, RUNNING_FIELDS)
+
+    for investor_id, sequence in last_sequence.items():
+        InvestorBalance.objects.filter(investor_id=investor_id).update(last_sequence=sequence)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0003_alter_investor_user_nullable'),
+        ('ledger', '0003_investorbalance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='investorbalance',
+            name='last_sequence',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='capital_after',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='inventory_after',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='profit_after',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='sequence',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_running_balances, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.UniqueConstraint(fields=('investor', 'sequence'), name='ledger_investor_sequence_unique'),
+        ),
+    ]
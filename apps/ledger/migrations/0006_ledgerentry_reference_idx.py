@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0004_investor_assignment_performance'),
+        ('ledger', '0005_ledger_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['reference_type', 'reference_id'], name='ledger_reference_idx'),
+        ),
+    ]
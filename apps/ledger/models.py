@@ -1,7 +1,10 @@
 import uuid
 
+from decimal import Decimal
+
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 
 class LedgerEntryType(models.TextChoices):
@@ -13,6 +16,16 @@ class LedgerEntryType(models.TextChoices):
     REINVESTMENT = "REINVESTMENT", "Reinvestment"
 
 
+class LedgerEntryQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            balances = InvestorBalance.advance(objs)
+            created = super().bulk_create(objs, *args, **kwargs)
+            InvestorBalance.save_advanced(balances)
+        return created
+
+
 class LedgerEntry(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     investor = models.ForeignKey("investors.Investor", on_delete=models.CASCADE, related_name="ledger_entries")
@@ -24,17 +37,129 @@ class LedgerEntry(models.Model):
     reference_id = models.CharField(max_length=64)
     note = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Position in the investor's ledger and the balances right after this entry, stamped at
+    # insert time under the investor's balance row lock.
+    sequence = models.PositiveBigIntegerField(default=0)
+    capital_after = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    inventory_after = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    profit_after = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = LedgerEntryQuerySet.as_manager()
 
     def save(self, *args, **kwargs):
         if not self._state.adding:
             raise ValidationError(
                 "LedgerEntry es inmutable. Para corregir, crea una entrada compensatoria."
             )
-        super().save(*args, **kwargs)
+        with transaction.atomic(savepoint=False):
+            balances = InvestorBalance.advance([self])
+            super().save(*args, **kwargs)
+            InvestorBalance.save_advanced(balances)
 
     class Meta:
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["investor", "created_at"], name="ledger_investor_created_idx"),
             models.Index(fields=["entry_type", "created_at"], name="ledger_type_created_idx"),
+            models.Index(fields=["created_at"], name="ledger_created_idx"),
+            models.Index(fields=["reference_type", "reference_id"], name="ledger_reference_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["investor", "sequence"], name="ledger_investor_sequence_unique"),
+        ]
+
+
+class InvestorBalance(models.Model):
+    """Running capital/inventory/profit totals of an investor's ledger.
+
+    Locked and advanced in the same transaction as every ``LedgerEntry`` insert (``save`` and
+    ``bulk_create``), so it always equals the ledger sums; ``reconcile_ledger`` verifies that.
+    """
+
+    investor = models.OneToOneField("investors.Investor", on_delete=models.CASCADE, primary_key=True, related_name="balance")
+    capital = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    inventory = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_sequence = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def as_dict(self):
+        cents = Decimal("0.01")
+        return {
+            "capital": Decimal(self.capital).quantize(cents),
+            "inventory": Decimal(self.inventory).quantize(cents),
+            "profit": Decimal(self.profit).quantize(cents),
+        }
+
+    @classmethod
+    def lock(cls, investor_id):
+        """Row-lock (creating at zero if needed) the balance before checking it against a new entry."""
+        return cls.lock_many([investor_id])[investor_id]
+
+    @classmethod
+    def lock_many(cls, investor_ids):
+        investor_ids = sorted(set(investor_ids), key=str)
+        locked = {
+            balance.investor_id: balance
+            for balance in cls.objects.select_for_update().filter(investor_id__in=investor_ids).order_by("pk")
+        }
+        missing = [investor_id for investor_id in investor_ids if investor_id not in locked]
+        if missing:
+            cls.objects.bulk_create([cls(investor_id=investor_id) for investor_id in missing], ignore_conflicts=True)
+            locked.update(
+                {
+                    balance.investor_id: balance
+                    for balance in cls.objects.select_for_update().filter(investor_id__in=missing).order_by("pk")
+                }
+            )
+        return locked
+
+    @classmethod
+    def advance(cls, entries):
+        """Lock the entries' balances and stamp each entry with its sequence and balances after it.
+
+        Returns the advanced (unsaved) balances for ``save_advanced`` once the entries are inserted.
+        """
+        locked = cls.lock_many(entry.investor_id for entry in entries)
+        for entry in entries:
+            balance = locked[entry.investor_id]
+            balance.capital += Decimal(entry.capital_delta)
+            balance.inventory += Decimal(entry.inventory_delta)
+            balance.profit += Decimal(entry.profit_delta)
+            balance.last_sequence += 1
+            entry.sequence = balance.last_sequence
+            entry.capital_after = balance.capital
+            entry.inventory_after = balance.inventory
+            entry.profit_after = balance.profit
+        return list(locked.values())
+
+    @classmethod
+    def save_advanced(cls, balances):
+        now = timezone.now()
+        for balance in balances:
+            balance.updated_at = now
+        cls.objects.bulk_update(balances, ["capital", "inventory", "profit", "last_sequence", "updated_at"])
+
+
+class LedgerCheckpoint(models.Model):
+    """An investor's balances at a month boundary, written by ``write_ledger_checkpoints``.
+
+    ``period_end`` is exclusive: the row sums the entries created strictly before it. Historical
+    balance queries start from the latest checkpoint and only add the entries after it.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    investor = models.ForeignKey("investors.Investor", on_delete=models.CASCADE, related_name="ledger_checkpoints")
+    period_end = models.DateTimeField()
+    capital = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    inventory = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_sequence = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-period_end"]
+        indexes = [models.Index(fields=["period_end"], name="ledger_checkpoint_period_idx")]
+        constraints = [
+            models.UniqueConstraint(fields=["investor", "period_end"], name="ledger_checkpoint_unique"),
         ]
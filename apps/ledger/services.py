@@ -1,17 +1,177 @@
+from datetime import timedelta
 from decimal import Decimal
 
-from django.db.models import DecimalField, Sum
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, Max, OuterRef, Subquery, Sum
 from django.db.models.functions import Coalesce
+from django.utils import timezone
 
-from apps.ledger.models import LedgerEntry, LedgerEntryType
+from apps.ledger.models import InvestorBalance, LedgerCheckpoint, LedgerEntry, LedgerEntryType
 
+BALANCE_FIELDS = (("capital", "capital_delta"), ("inventory", "inventory_delta"), ("profit", "profit_delta"))
 
-def current_balances(investor):
-    return investor.ledger_entries.aggregate(
-        capital=Coalesce(Sum("capital_delta"), 0, output_field=DecimalField(max_digits=12, decimal_places=2)),
-        inventory=Coalesce(Sum("inventory_delta"), 0, output_field=DecimalField(max_digits=12, decimal_places=2)),
-        profit=Coalesce(Sum("profit_delta"), 0, output_field=DecimalField(max_digits=12, decimal_places=2)),
+
+def current_balances(investor, *, lock=False):
+    """Materialized balances of ``investor``; ``lock=True`` row-locks them until the transaction ends."""
+    if lock:
+        return InvestorBalance.lock(investor.pk).as_dict()
+    balance = InvestorBalance.objects.filter(investor_id=investor.pk).first()
+    if balance is None:
+        return InvestorBalance(investor_id=investor.pk).as_dict()
+    return balance.as_dict()
+
+
+def balances_as_of(investor, at, *, inclusive=True):
+    """Balances right after the investor's last entry created at (or, ``inclusive=False``, strictly
+    before) ``at``, in one index lookup.
+    """
+    lookup = "created_at__lte" if inclusive else "created_at__lt"
+    entry = (
+        LedgerEntry.objects.filter(investor_id=investor.pk, **{lookup: at})
+        .order_by("-created_at", "-sequence")
+        .values("capital_after", "inventory_after", "profit_after")
+        .first()
+    )
+    if entry is None:
+        return InvestorBalance(investor_id=investor.pk).as_dict()
+    return {name: entry[f"{name}_after"] for name, _ in BALANCE_FIELDS}
+
+
+def _summed_balances(entries):
+    rows = (
+        entries.order_by()
+        .values("investor_id")
+        .annotate(
+            **{
+                name: Coalesce(Sum(delta), 0, output_field=DecimalField(max_digits=14, decimal_places=2))
+                for name, delta in BALANCE_FIELDS
+            },
+            last_sequence=Max("sequence"),
+        )
+    )
+    return {row.pop("investor_id"): row for row in rows}
+
+
+def ledger_balances(investor_ids=None):
+    """Balances summed from the ledger itself, ``{investor_id: {capital, inventory, profit}}``."""
+    entries = LedgerEntry.objects.all()
+    if investor_ids is not None:
+        entries = entries.filter(investor_id__in=investor_ids)
+    return _summed_balances(entries)
+
+
+def ledger_balances_at(at, investor_ids=None, *, checkpoints=None):
+    """Balances of every investor over the entries created strictly before ``at``.
+
+    Starts from the latest ``LedgerCheckpoint`` at or before ``at`` and sums only the entries
+    after it, in three queries whatever the number of investors. Returns
+    ``(checkpoint_period_end, {investor_id: {capital, inventory, profit, last_sequence}})``;
+    investors without entries before ``at`` are left out.
+    """
+    if checkpoints is None:
+        checkpoints = LedgerCheckpoint.objects.all()
+    checkpoints = checkpoints.filter(period_end__lte=at)
+    period_end = checkpoints.aggregate(latest=Max("period_end"))["latest"]
+
+    balances = {}
+    if period_end is not None:
+        rows = checkpoints.filter(period_end=period_end)
+        if investor_ids is not None:
+            rows = rows.filter(investor_id__in=investor_ids)
+        for row in rows.values("investor_id", "last_sequence", *(name for name, _ in BALANCE_FIELDS)):
+            balances[row.pop("investor_id")] = row
+
+    entries = LedgerEntry.objects.filter(created_at__lt=at)
+    if period_end is not None:
+        entries = entries.filter(created_at__gte=period_end)
+    if investor_ids is not None:
+        entries = entries.filter(investor_id__in=investor_ids)
+    for investor_id, delta in _summed_balances(entries).items():
+        base = balances.setdefault(investor_id, {"last_sequence": 0, **InvestorBalance().as_dict()})
+        for name, _ in BALANCE_FIELDS:
+            base[name] = Decimal(base[name]) + Decimal(delta[name])
+        base["last_sequence"] = max(base["last_sequence"], delta["last_sequence"])
+
+    cents = Decimal("0.01")
+    for row in balances.values():
+        for name, _ in BALANCE_FIELDS:
+            row[name] = Decimal(row[name]).quantize(cents)
+    return period_end, balances
+
+
+@transaction.atomic
+def write_ledger_checkpoints(period_end):
+    """Write (or rewrite) every investor's ``LedgerCheckpoint`` at ``period_end``. Returns how many rows.
+
+    Built from the previous checkpoint plus the entries in between, so closing a month reads one
+    month of ledger. ``created_at`` is stamped at insert, not at commit: an entry stamped just before
+    ``period_end`` can still be uncommitted after it, and a checkpoint written then would miss it
+    for good. Boundaries are only accepted ``LEDGER_CHECKPOINT_SETTLE_MINUTES`` after they pass,
+    longer than any ledger transaction stays open; earlier calls raise ``ValueError``.
+    """
+    settled_at = period_end + timedelta(minutes=settings.LEDGER_CHECKPOINT_SETTLE_MINUTES)
+    if timezone.now() < settled_at:
+        raise ValueError(f"El corte {period_end.isoformat()} se puede escribir a partir de {settled_at.isoformat()}.")
+    _, balances = ledger_balances_at(period_end, checkpoints=LedgerCheckpoint.objects.filter(period_end__lt=period_end))
+    LedgerCheckpoint.objects.bulk_create(
+        [LedgerCheckpoint(investor_id=investor_id, period_end=period_end, **row) for investor_id, row in balances.items()],
+        update_conflicts=True,
+        unique_fields=["investor", "period_end"],
+        update_fields=["capital", "inventory", "profit", "last_sequence"],
+    )
+    return len(balances)
+
+
+def verify_investor_balances(investor_ids=None):
+    """Compare materialized balances, and the running balance stamped on each investor's last entry,
+    against the ledger sums. Returns one mismatch dict per field that differs.
+    """
+    expected_by_investor = ledger_balances(investor_ids)
+    last_entry = LedgerEntry.objects.filter(investor_id=OuterRef("investor_id")).order_by("-sequence")
+    stored = InvestorBalance.objects.annotate(
+        **{f"last_{name}_after": Subquery(last_entry.values(f"{name}_after")[:1]) for name, _ in BALANCE_FIELDS}
+    )
+    if investor_ids is not None:
+        stored = stored.filter(investor_id__in=investor_ids)
+    stored = list(stored)
+    stored_by_investor = {balance.investor_id: balance.as_dict() for balance in stored}
+
+    zero = InvestorBalance().as_dict()
+    mismatches = []
+    for investor_id in sorted(set(expected_by_investor) | set(stored_by_investor), key=str):
+        expected = expected_by_investor.get(investor_id, zero)
+        found = stored_by_investor.get(investor_id, zero)
+        for name, _ in BALANCE_FIELDS:
+            if Decimal(expected[name]) != Decimal(found[name]):
+                mismatches.append({"investor_id": investor_id, "field": name, "expected": expected[name], "stored": found[name]})
+
+    for balance in stored:
+        expected = expected_by_investor.get(balance.investor_id, zero)
+        for name, _ in BALANCE_FIELDS:
+            after = getattr(balance, f"last_{name}_after")
+            if after is not None and Decimal(after) != Decimal(expected[name]):
+                mismatches.append(
+                    {"investor_id": balance.investor_id, "field": f"{name}_after", "expected": expected[name], "stored": after}
+                )
+    return mismatches
+
+
+@transaction.atomic
+def rebuild_investor_balances(investor_ids=None):
+    """Recompute materialized balances from the ledger sums. Returns how many balance rows were written.
+
+    Entries' running ``*_after`` columns are immutable and are not rewritten here.
+    """
+    expected_by_investor = ledger_balances(investor_ids)
+    stored = InvestorBalance.objects.select_for_update()
+    if investor_ids is not None:
+        stored = stored.filter(investor_id__in=investor_ids)
+    stored.delete()
+    InvestorBalance.objects.bulk_create(
+        [InvestorBalance(investor_id=investor_id, **balances) for investor_id, balances in expected_by_investor.items()]
     )
+    return len(expected_by_investor)
 
 
 def create_capital_deposit(*, investor, amount, reference_type, reference_id, note=""):
@@ -30,11 +190,12 @@ def create_capital_deposit(*, investor, amount, reference_type, reference_id, no
     )
 
 
+@transaction.atomic
 def create_capital_withdrawal(*, investor, amount, reference_type, reference_id, note=""):
     amount = Decimal(amount).quantize(Decimal("0.01"))
     if amount <= 0:
         raise ValueError("El monto del retiro debe ser mayor a 0.")
-    balances = current_balances(investor)
+    balances = current_balances(investor, lock=True)
     if amount > balances["capital"]:
         raise ValueError("No hay capital liquido suficiente para retirar ese monto.")
     return LedgerEntry.objects.create(
@@ -49,11 +210,12 @@ def create_capital_withdrawal(*, investor, amount, reference_type, reference_id,
     )
 
 
+@transaction.atomic
 def create_reinvestment(*, investor, amount, reference_type, reference_id, note=""):
     amount = Decimal(amount).quantize(Decimal("0.01"))
     if amount <= 0:
         raise ValueError("El monto de reinversion debe ser mayor a 0.")
-    balances = current_balances(investor)
+    balances = current_balances(investor, lock=True)
     if amount > balances["profit"]:
         raise ValueError("No hay utilidad disponible suficiente para reinvertir ese monto.")
 
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0003_invoiceimportline_brand_invoiceimportline_brand_name_and_more'),
+        ('purchases', '0001_initial'),
+        ('suppliers', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchasereceipt',
+            index=models.Index(fields=['status', 'posted_at'], name='receipt_status_posted_idx'),
+        ),
+    ]
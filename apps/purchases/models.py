@@ -23,6 +23,11 @@ class PurchaseReceipt(models.Model):
     source_import_batch = models.ForeignKey("imports.InvoiceImportBatch", null=True, blank=True, on_delete=models.SET_NULL)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "posted_at"], name="receipt_status_posted_idx"),
+        ]
+
 
 class PurchaseReceiptLine(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
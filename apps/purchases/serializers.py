@@ -4,15 +4,24 @@ from apps.inventory.models import InventoryMovement
 from apps.purchases.models import PurchaseReceipt, PurchaseReceiptLine
 
 
-def receipt_can_delete(receipt: PurchaseReceipt) -> bool:
+def receipt_can_delete(receipt: PurchaseReceipt, stock_by_product: dict | None = None) -> bool:
     if receipt.status != "POSTED":
         return True
 
-    for line in receipt.lines.all():
-        current_stock = InventoryMovement.current_stock(line.product_id)
-        if current_stock < line.qty:
-            return False
-    return True
+    lines = list(receipt.lines.all())
+    if stock_by_product is None:
+        stock_by_product = InventoryMovement.current_stock_many(line.product_id for line in lines)
+    return all(stock_by_product[line.product_id] >= line.qty for line in lines)
+
+
+class PurchaseReceiptListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        receipts = data.all() if hasattr(data, "all") else data
+        # One stock aggregate for every product on the page instead of one per receipt line.
+        self.context["receipt_stock"] = InventoryMovement.current_stock_many(
+            line.product_id for receipt in receipts if receipt.status == "POSTED" for line in receipt.lines.all()
+        )
+        return super().to_representation(receipts)
 
 
 class PurchaseReceiptLineSerializer(serializers.ModelSerializer):
@@ -54,6 +63,7 @@ class PurchaseReceiptSerializer(serializers.ModelSerializer):
             "lines",
         ]
         read_only_fields = ["id", "status", "created_by", "posted_at", "created_at"]
+        list_serializer_class = PurchaseReceiptListSerializer
 
     def validate(self, attrs):
         lines = attrs.get("lines", [])
@@ -84,4 +94,4 @@ class PurchaseReceiptSerializer(serializers.ModelSerializer):
         return receipt
 
     def get_can_delete(self, obj):
-        return receipt_can_delete(obj)
+        return receipt_can_delete(obj, self.context.get("receipt_stock"))
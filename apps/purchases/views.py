@@ -4,6 +4,8 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from apps.common.metrics_cache import bump_metrics_data_version
+from apps.common.query_budget import QueryBudget
 from apps.common.permissions import RolePermission
 from apps.inventory.models import InventoryMovement, MovementType
 from apps.purchases.models import PurchaseReceipt, ReceiptStatus
@@ -11,7 +13,7 @@ from apps.purchases.serializers import PurchaseReceiptSerializer, receipt_can_de
 
 
 class PurchaseReceiptViewSet(viewsets.ModelViewSet):
-    queryset = PurchaseReceipt.objects.select_related("supplier", "created_by").prefetch_related("lines")
+    queryset = PurchaseReceipt.objects.select_related("supplier", "created_by").prefetch_related("lines__product")
     serializer_class = PurchaseReceiptSerializer
     permission_classes = [RolePermission]
     capability_map = {
@@ -21,6 +23,7 @@ class PurchaseReceiptViewSet(viewsets.ModelViewSet):
         "confirm": ["purchases.manage"],
         "destroy": ["imports.manage"],
     }
+    query_budgets = {"list": QueryBudget(7), "confirm": QueryBudget(11)}
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -33,19 +36,24 @@ class PurchaseReceiptViewSet(viewsets.ModelViewSet):
             return Response({"code": "already_confirmed", "detail": "Receipt already posted", "fields": {}}, status=200)
 
         with transaction.atomic():
-            for line in receipt.lines.all():
-                InventoryMovement.objects.create(
-                    product=line.product,
-                    movement_type=MovementType.INBOUND,
-                    quantity_delta=line.qty,
-                    reference_type="purchase_receipt",
-                    reference_id=str(receipt.id),
-                    note="Receipt posting",
-                    created_by=request.user,
-                )
+            InventoryMovement.bulk_record(
+                [
+                    InventoryMovement(
+                        product_id=line.product_id,
+                        movement_type=MovementType.INBOUND,
+                        quantity_delta=line.qty,
+                        reference_type="purchase_receipt",
+                        reference_id=str(receipt.id),
+                        note="Receipt posting",
+                        created_by=request.user,
+                    )
+                    for line in receipt.lines.all()
+                ]
+            )
             receipt.status = ReceiptStatus.POSTED
             receipt.posted_at = timezone.now()
             receipt.save(update_fields=["status", "posted_at"])
+            bump_metrics_data_version(timezone.localdate(receipt.posted_at))
 
         return Response(self.get_serializer(receipt).data, status=status.HTTP_200_OK)
 
@@ -62,7 +70,8 @@ class PurchaseReceiptViewSet(viewsets.ModelViewSet):
             )
 
         with transaction.atomic():
-            if receipt.status == ReceiptStatus.POSTED:
+            was_posted = receipt.status == ReceiptStatus.POSTED
+            if was_posted:
                 if receipt.source_import_batch_id:
                     InventoryMovement.objects.filter(
                         reference_type="import_batch_confirm",
@@ -78,5 +87,8 @@ class PurchaseReceiptViewSet(viewsets.ModelViewSet):
             receipt.delete()
             if source_import_batch is not None:
                 source_import_batch.delete()
+            if was_posted:
+                # Reports only count posted receipts, on the day they were posted.
+                bump_metrics_data_version(timezone.localdate(receipt.posted_at) if receipt.posted_at else None)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
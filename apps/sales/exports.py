@@ -0,0 +1,167 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+from apps.sales.models import SaleLine
+
+EXPORT_CHUNK_SIZE = 500
+
+EXPORT_COLUMNS = [
+    "record_type",
+    "sale_id",
+    "confirmed_at",
+    "cashier",
+    "customer_id",
+    "subtotal",
+    "discount_amount",
+    "total",
+    "operating_cost_amount",
+    "commission_amount",
+    "net_profit_total",
+    "investor_profit_total",
+    "store_profit_total",
+    "line_id",
+    "sku",
+    "product_name",
+    "qty",
+    "unit_price",
+    "unit_cost",
+    "discount_pct",
+    "ownership",
+    "investor_id",
+    "qty_consumed",
+    "line_revenue",
+    "line_cogs",
+    "line_operating_cost",
+    "line_commission_cost",
+    "line_net_profit",
+    "investor_profit_share",
+    "store_profit_share",
+    "method",
+    "amount",
+    "card_type",
+    "card_plan_code",
+    "commission_rate",
+]
+
+
+def _sale_row(sale):
+    row = {
+        "record_type": "sale",
+        "sale_id": sale.id,
+        "confirmed_at": timezone.localtime(sale.confirmed_at).isoformat() if sale.confirmed_at else None,
+        "cashier": sale.cashier.username,
+        "customer_id": sale.customer_id,
+        "subtotal": sale.subtotal,
+        "discount_amount": sale.discount_amount,
+        "total": sale.total,
+    }
+    snapshot = getattr(sale, "profitability_snapshot", None)
+    if snapshot is not None:
+        row.update(
+            operating_cost_amount=snapshot.operating_cost_amount,
+            commission_amount=snapshot.commission_amount,
+            net_profit_total=snapshot.net_profit_total,
+            investor_profit_total=snapshot.investor_profit_total,
+            store_profit_total=snapshot.store_profit_total,
+        )
+    return row
+
+
+def iter_sale_export_rows(sales, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield flat ``sale``/``line``/``profitability``/``payment`` rows for ``sales``.
+
+    Sales are read through ``iterator(chunk_size=...)`` (a server-side cursor on
+    PostgreSQL) with their children prefetched per chunk, so memory stays bounded
+    by the chunk size rather than the size of the export.
+    """
+    sales = (
+        sales.select_related("cashier", "profitability_snapshot")
+        .prefetch_related(
+            Prefetch(
+                "lines",
+                queryset=SaleLine.objects.select_related("product").prefetch_related("profitability_lines").order_by("id"),
+            ),
+            "payments",
+        )
+        .order_by("confirmed_at", "id")
+    )
+    for sale in sales.iterator(chunk_size=chunk_size):
+        yield _sale_row(sale)
+        for line in sale.lines.all():
+            yield {
+                "record_type": "line",
+                "sale_id": sale.id,
+                "line_id": line.id,
+                "sku": line.product.sku,
+                "product_name": line.product.name,
+                "qty": line.qty,
+                "unit_price": line.unit_price,
+                "unit_cost": line.unit_cost,
+                "discount_pct": line.discount_pct,
+            }
+            for profitability in line.profitability_lines.all():
+                yield {
+                    "record_type": "profitability",
+                    "sale_id": sale.id,
+                    "line_id": line.id,
+                    "ownership": profitability.ownership,
+                    "investor_id": profitability.investor_id,
+                    "qty_consumed": profitability.qty_consumed,
+                    "line_revenue": profitability.line_revenue,
+                    "line_cogs": profitability.line_cogs,
+                    "line_operating_cost": profitability.line_operating_cost,
+                    "line_commission_cost": profitability.line_commission_cost,
+                    "line_net_profit": profitability.line_net_profit,
+                    "investor_profit_share": profitability.investor_profit_share,
+                    "store_profit_share": profitability.store_profit_share,
+                }
+        for payment in sale.payments.all():
+            yield {
+                "record_type": "payment",
+                "sale_id": sale.id,
+                "method": payment.method,
+                "amount": payment.amount,
+                "card_type": payment.card_type,
+                "card_plan_code": payment.card_plan_code,
+                "commission_rate": payment.commission_rate,
+            }
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the formatted line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+class SalesCSVExportRenderer(BaseRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+    def stream(self, rows):
+        writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_COLUMNS, restval="")
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow({key: "" if value is None else value for key, value in row.items()})
+
+
+class SalesNDJSONExportRenderer(BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+    def stream(self, rows):
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
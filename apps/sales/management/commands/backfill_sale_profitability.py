@@ -0,0 +1,166 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from apps.common.metrics_cache import bump_metrics_data_version
+from apps.investors.models import InvestorAssignment
+from apps.ledger.models import LedgerEntry, LedgerEntryType
+from apps.sales.models import (
+    ProfitabilityRateSource,
+    Sale,
+    SaleLineProfitability,
+    SaleProfitabilitySnapshot,
+    SaleStatus,
+)
+from apps.sales.profitability import (
+    _line_revenue,
+    allocate_proportionally,
+    allocate_proportionally_many,
+    money,
+    sale_commission_total,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera SaleProfitabilitySnapshot para ventas confirmadas anteriores a los snapshots "
+        "(replay FIFO de asignaciones, una sola vez). No modifica ledger ni qty_sold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Calcula sin escribir.")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Ventas leidas por lote del cursor.")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        assignments_by_product = defaultdict(list)
+        for assignment in InvestorAssignment.objects.order_by("created_at", "id"):
+            assignments_by_product[assignment.product_id].append(assignment)
+
+        consumed_by_assignment = defaultdict(lambda: Decimal("0.00"))
+        backfilled = 0
+        skipped = 0
+
+        sales = (
+            Sale.objects.filter(status=SaleStatus.CONFIRMED)
+            .prefetch_related("lines", "payments", "profitability_snapshot__lines")
+            .order_by("confirmed_at", "created_at")
+        )
+        for sale in sales.iterator(chunk_size=options["chunk_size"]):
+            snapshot = getattr(sale, "profitability_snapshot", None)
+            if snapshot is not None:
+                # Keep the FIFO state in step with consumption that is already recorded.
+                for row in snapshot.lines.all():
+                    if row.assignment_id:
+                        consumed_by_assignment[row.assignment_id] += row.qty_consumed
+                skipped += 1
+                continue
+
+            rows = self._replay_sale(sale, assignments_by_product, consumed_by_assignment)
+            if not dry_run:
+                self._write_snapshot(sale, rows)
+            backfilled += 1
+
+        if backfilled and not dry_run:
+            bump_metrics_data_version()
+        prefix = "[dry-run] " if dry_run else ""
+        self.stdout.write(
+            self.style.SUCCESS(f"{prefix}Ventas con snapshot generado: {backfilled} / ya existentes: {skipped}")
+        )
+
+    @staticmethod
+    def _replay_sale(sale, assignments_by_product, consumed_by_assignment):
+        line_items = list(sale.lines.all())
+        line_revenues = [_line_revenue(line) for line in line_items]
+        (line_commission_alloc,) = allocate_proportionally_many([sale_commission_total(sale)], line_revenues)
+
+        rows = []
+        for index, line in enumerate(line_items):
+            remaining_qty = Decimal(line.qty)
+            chunks = []
+            for assignment in assignments_by_product.get(line.product_id, []):
+                if assignment.created_at > sale.confirmed_at:
+                    continue
+                available = assignment.qty_assigned - consumed_by_assignment[assignment.id]
+                if available <= 0 or remaining_qty <= 0:
+                    continue
+                consumed = min(available, remaining_qty)
+                consumed_by_assignment[assignment.id] += consumed
+                remaining_qty -= consumed
+                chunks.append((assignment, consumed, money(assignment.unit_cost * consumed)))
+            if remaining_qty > 0:
+                chunks.append((None, remaining_qty, money(line.unit_cost * remaining_qty)))
+            if not chunks:
+                continue
+
+            revenue_alloc, commission_alloc = allocate_proportionally_many(
+                [line_revenues[index], line_commission_alloc[index]],
+                [qty for _, qty, _ in chunks],
+            )
+            for chunk_index, (assignment, qty, cogs) in enumerate(chunks):
+                rows.append(
+                    SaleLineProfitability(
+                        sale_line=line,
+                        product_id=line.product_id,
+                        assignment=assignment,
+                        investor_id=assignment.investor_id if assignment else None,
+                        ownership=(
+                            SaleLineProfitability.Ownership.INVESTOR if assignment else SaleLineProfitability.Ownership.STORE
+                        ),
+                        qty_consumed=money(qty),
+                        line_revenue=revenue_alloc[chunk_index],
+                        line_cogs=cogs,
+                        line_operating_cost=Decimal("0.00"),
+                        line_commission_cost=commission_alloc[chunk_index],
+                        line_net_profit=money(revenue_alloc[chunk_index] - cogs - commission_alloc[chunk_index]),
+                    )
+                )
+        return rows
+
+    @staticmethod
+    @transaction.atomic
+    def _write_snapshot(sale, rows):
+        # Investor shares were already paid out through the ledger; spread them over the
+        # investor's chunks instead of recomputing them, so historical totals do not move.
+        paid_shares = dict(
+            LedgerEntry.objects.filter(
+                entry_type=LedgerEntryType.PROFIT_SHARE,
+                reference_type="sale",
+                reference_id=str(sale.id),
+            )
+            .values("investor_id")
+            .annotate(total=Sum("profit_delta"))
+            .values_list("investor_id", "total")
+        )
+        rows_by_investor = defaultdict(list)
+        for row in rows:
+            if row.investor_id:
+                rows_by_investor[row.investor_id].append(row)
+        for investor_id, investor_rows in rows_by_investor.items():
+            shares = allocate_proportionally(
+                paid_shares.get(investor_id) or Decimal("0.00"),
+                [row.line_revenue for row in investor_rows],
+            )
+            for row, share in zip(investor_rows, shares):
+                row.investor_profit_share = share
+        for row in rows:
+            row.store_profit_share = money(row.line_net_profit - row.investor_profit_share)
+
+        snapshot = SaleProfitabilitySnapshot.objects.create(
+            sale=sale,
+            operating_cost_rate_snapshot=Decimal("0.0000"),
+            operating_cost_rate_source=ProfitabilityRateSource.BACKFILL,
+            operating_cost_amount=Decimal("0.00"),
+            commission_amount=money(sum((row.line_commission_cost for row in rows), Decimal("0.00"))),
+            gross_profit_total=money(sum((row.line_revenue - row.line_cogs for row in rows), Decimal("0.00"))),
+            net_profit_total=money(sum((row.line_net_profit for row in rows), Decimal("0.00"))),
+            investor_profit_total=money(sum((row.investor_profit_share for row in rows), Decimal("0.00"))),
+            store_profit_total=money(sum((row.store_profit_share for row in rows), Decimal("0.00"))),
+            calc_version="backfill",
+        )
+        for row in rows:
+            row.snapshot = snapshot
+        SaleLineProfitability.objects.bulk_create(rows)
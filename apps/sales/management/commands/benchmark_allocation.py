@@ -0,0 +1,75 @@
+import random
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from apps.sales.profitability import (
+    _allocate_proportionally_decimal,
+    allocate_cents,
+    allocate_proportionally,
+    allocate_proportionally_many,
+    to_cents,
+    weight_units,
+)
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark del kernel de asignacion en centavos contra la implementacion Decimal original."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, default=200, help="Lineas por carrito sintetico.")
+        parser.add_argument("--chunks", type=int, default=3, help="Chunks (pesos) por linea.")
+        parser.add_argument("--repeat", type=int, default=5, help="Repeticiones; se reporta la mejor.")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        cart = []
+        for _ in range(options["lines"]):
+            weights = [Decimal(rng.randint(1, 500)).scaleb(-2) for _ in range(options["chunks"])]
+            totals = [Decimal(rng.randint(0, 10**6)).scaleb(-2) for _ in range(3)]
+            cart.append((totals, weights))
+
+        def legacy():
+            for totals, weights in cart:
+                for total in totals:
+                    _allocate_proportionally_decimal(total, weights)
+
+        def kernel():
+            for totals, weights in cart:
+                for total in totals:
+                    allocate_proportionally(total, weights)
+
+        def kernel_shared_weights():
+            for totals, weights in cart:
+                allocate_proportionally_many(totals, weights)
+
+        cart_in_cents = [([to_cents(total) for total in totals], weight_units(weights)) for totals, weights in cart]
+
+        def kernel_only():
+            for totals, weights in cart_in_cents:
+                for total in totals:
+                    allocate_cents(total, weights)
+
+        for totals, weights in cart:
+            for total in totals:
+                if allocate_proportionally(total, weights) != _allocate_proportionally_decimal(total, weights):
+                    self.stderr.write(f"Resultado distinto para total={total} weights={weights}")
+                    return
+
+        number = max(1, 20000 // max(1, options["lines"]))
+        timings = {}
+        for name, func in (
+            ("decimal", legacy),
+            ("cents", kernel),
+            ("cents_shared_weights", kernel_shared_weights),
+            ("cents_kernel_only", kernel_only),
+        ):
+            best = min(timeit.repeat(func, number=number, repeat=options["repeat"]))
+            timings[name] = best / number
+
+        baseline = timings["decimal"]
+        for name, seconds in timings.items():
+            speedup = baseline / seconds if seconds else 0
+            self.stdout.write(f"{name:>22}: {seconds * 1000:8.3f} ms/carrito  (x{speedup:.2f})")
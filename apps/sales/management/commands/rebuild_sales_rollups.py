@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from apps.sales.rollups import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcula los rollups diarios de ventas (cajero, producto, metodo de pago) desde las ventas confirmadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date-from", help="Dia local inicial (YYYY-MM-DD). Por defecto todo el historial.")
+        parser.add_argument("--date-to", help="Dia local final (YYYY-MM-DD).")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Ventas leidas por lote del cursor.")
+
+    def handle(self, *args, **options):
+        date_from = self._parse(options["date_from"], "--date-from")
+        date_to = self._parse(options["date_to"], "--date-to")
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--date-from debe ser menor o igual a --date-to.")
+
+        sales_count = rebuild_sales_rollups(date_from=date_from, date_to=date_to, chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rollups recalculados a partir de {sales_count} ventas confirmadas."))
+
+    @staticmethod
+    def _parse(value, flag):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f"{flag} debe tener formato YYYY-MM-DD.")
+        return parsed
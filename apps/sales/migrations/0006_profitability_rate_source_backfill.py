@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_sale_profitability_snapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='saleprofitabilitysnapshot',
+            name='operating_cost_rate_source',
+            field=models.CharField(choices=[('MTD_REAL', 'MTD real'), ('FALLBACK_BASE', 'Fallback base'), ('BACKFILL', 'Backfill (pre-snapshot sale)')], max_length=24),
+        ),
+    ]
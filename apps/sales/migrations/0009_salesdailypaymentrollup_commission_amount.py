@@ -0,0 +1,45 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+LEGACY_CARD_TYPE_TO_RATE = {"NORMAL": Decimal("0.02"), "MSI_3": Decimal("0.0558")}
+
+
+def backfill_payment_rollup_commissions(apps, schema_editor):
+    Payment = apps.get_model("sales", "Payment")
+    SalesDailyPaymentRollup = apps.get_model("sales", "SalesDailyPaymentRollup")
+
+    commissions = {}
+    payments = Payment.objects.filter(method="CARD", sale__status="CONFIRMED").select_related("sale")
+    for payment in payments.iterator(chunk_size=500):
+        rate = payment.commission_rate
+        if rate is None:
+            rate = LEGACY_CARD_TYPE_TO_RATE.get(payment.card_type, Decimal("0.00"))
+        key = (timezone.localdate(payment.sale.confirmed_at), payment.card_type or "", payment.card_plan_code or "")
+        commission = (payment.amount * rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        commissions[key] = commissions.get(key, Decimal("0.00")) + commission
+
+    for (day, card_type, card_plan_code), commission_amount in commissions.items():
+        SalesDailyPaymentRollup.objects.filter(
+            day=day,
+            method="CARD",
+            card_type=card_type,
+            card_plan_code=card_plan_code,
+        ).update(commission_amount=commission_amount)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sales", "0008_local_date_range_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="salesdailypaymentrollup",
+            name="commission_amount",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_payment_rollup_commissions, migrations.RunPython.noop),
+    ]
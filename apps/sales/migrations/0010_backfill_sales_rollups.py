@@ -0,0 +1,80 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations
+from django.utils import timezone
+
+LEGACY_CARD_TYPE_TO_RATE = {"NORMAL": Decimal("0.02"), "MSI_3": Decimal("0.0558")}
+MONEY = Decimal("0.01")
+
+
+def _money(value):
+    return Decimal(value).quantize(MONEY, rounding=ROUND_HALF_UP)
+
+
+def _accumulate(bucket, key, **deltas):
+    current = bucket.setdefault(key, {name: 0 for name in deltas})
+    for name, value in deltas.items():
+        current[name] += value
+
+
+def backfill_sales_rollups(apps, schema_editor):
+    """Same facts as ``apps.sales.rollups.rebuild_sales_rollups``, computed with the historical models.
+
+    0007 only created the tables, so closed days read as zero until the rollups were rebuilt by hand.
+    Replacing every row makes this safe on databases where ``rebuild_sales_rollups`` already ran.
+    """
+    Sale = apps.get_model("sales", "Sale")
+    SalesDailyCashierRollup = apps.get_model("sales", "SalesDailyCashierRollup")
+    SalesDailyProductRollup = apps.get_model("sales", "SalesDailyProductRollup")
+    SalesDailyPaymentRollup = apps.get_model("sales", "SalesDailyPaymentRollup")
+
+    cashiers, products, payments = {}, {}, {}
+    sales = Sale.objects.filter(status="CONFIRMED", confirmed_at__isnull=False).prefetch_related("lines", "payments")
+    for sale in sales.iterator(chunk_size=500):
+        day = timezone.localdate(sale.confirmed_at)
+        _accumulate(cashiers, (day, sale.cashier_id), sales_count=1, total_sales=sale.total)
+        for line in sale.lines.all():
+            gross = line.qty * line.unit_price
+            _accumulate(
+                products,
+                (day, line.product_id),
+                units_sold=line.qty,
+                sales_amount=_money(gross - gross * line.discount_pct / Decimal("100.00")),
+                cost_amount=_money(line.qty * line.unit_cost),
+            )
+        for payment in sale.payments.all():
+            rate = Decimal("0.00")
+            if payment.method == "CARD":
+                rate = payment.commission_rate
+                if rate is None:
+                    rate = LEGACY_CARD_TYPE_TO_RATE.get(payment.card_type, Decimal("0.00"))
+            _accumulate(
+                payments,
+                (day, payment.method, payment.card_type or "", payment.card_plan_code or ""),
+                transactions=1,
+                total_amount=payment.amount,
+                commission_amount=_money(payment.amount * rate),
+            )
+
+    targets = (
+        (SalesDailyCashierRollup, ("day", "cashier_id"), cashiers),
+        (SalesDailyProductRollup, ("day", "product_id"), products),
+        (SalesDailyPaymentRollup, ("day", "method", "card_type", "card_plan_code"), payments),
+    )
+    for model, key_fields, facts in targets:
+        model.objects.all().delete()
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key)), **deltas) for key, deltas in facts.items()],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sales", "0009_salesdailypaymentrollup_commission_amount"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sales_rollups, migrations.RunPython.noop),
+    ]
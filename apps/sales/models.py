@@ -46,6 +46,7 @@ class Sale(models.Model):
         indexes = [
             models.Index(fields=["status", "confirmed_at"], name="sale_status_confirmed_idx"),
             models.Index(fields=["cashier", "created_at"], name="sale_cashier_created_idx"),
+            models.Index(fields=["created_at"], name="sale_created_idx"),
         ]
 
 
@@ -73,6 +74,7 @@ class SaleLine(models.Model):
 class ProfitabilityRateSource(models.TextChoices):
     MTD_REAL = "MTD_REAL", "MTD real"
     FALLBACK_BASE = "FALLBACK_BASE", "Fallback base"
+    BACKFILL = "BACKFILL", "Backfill (pre-snapshot sale)"
 
 
 class SaleProfitabilitySnapshot(models.Model):
@@ -178,3 +180,46 @@ class VoidEvent(models.Model):
     reason = models.CharField(max_length=255)
     actor = models.ForeignKey("accounts.User", on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
+
+
+class SalesDailyCashierRollup(models.Model):
+    day = models.DateField()
+    cashier = models.ForeignKey("accounts.User", on_delete=models.PROTECT, related_name="+")
+    sales_count = models.IntegerField(default=0)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "cashier"], name="uniq_sales_rollup_day_cashier"),
+        ]
+
+
+class SalesDailyProductRollup(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey("catalog.Product", on_delete=models.PROTECT, related_name="+")
+    units_sold = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sales_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "product"], name="uniq_sales_rollup_day_product"),
+        ]
+
+
+class SalesDailyPaymentRollup(models.Model):
+    day = models.DateField()
+    method = models.CharField(max_length=20, choices=PaymentMethod.choices)
+    card_type = models.CharField(max_length=12, blank=True, default="")
+    card_plan_code = models.CharField(max_length=32, blank=True, default="")
+    transactions = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    commission_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "method", "card_type", "card_plan_code"],
+                name="uniq_sales_rollup_day_payment",
+            ),
+        ]
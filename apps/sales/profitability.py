@@ -3,17 +3,21 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Iterable
+from math import lcm
+from typing import Iterable, Sequence
 
 from django.db import transaction
-from django.db.models import Count, Sum
+from django.db.models import Count, Sum, prefetch_related_objects
 from django.utils import timezone
 
+from apps.common.dates import filter_local_date_range
 from apps.expenses.models import Expense, ExpenseStatus
 from apps.investors.models import InvestorAssignment
+from apps.investors.performance import record_assignment_performance
 from apps.ledger.models import LedgerEntry, LedgerEntryType
 from apps.sales.models import (
     LEGACY_CARD_TYPE_TO_RATE,
+    Payment,
     PaymentMethod,
     ProfitabilityRateSource,
     Sale,
@@ -46,7 +50,78 @@ def clamp_rate(raw: Decimal) -> Decimal:
     return max(MIN_RATE, min(MAX_RATE, raw))
 
 
+def to_cents(value: Decimal) -> int:
+    """Round ``value`` half-up to whole cents and return it as an integer."""
+    numerator, denominator = Decimal(value).as_integer_ratio()
+    if 100 % denominator == 0:
+        return numerator * (100 // denominator)
+    return int(money(value).scaleb(2))
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+def weight_units(weights: Iterable[Decimal]) -> list[int]:
+    """Scale decimal weights to integers over a common denominator, so their ratios are unchanged."""
+    ratios = [Decimal(w).as_integer_ratio() for w in weights]
+    common = 100
+    for _, denominator in ratios:
+        if common % denominator:
+            common = lcm(common, denominator)
+    return [numerator * (common // denominator) for numerator, denominator in ratios]
+
+
+def allocate_cents(total_cents: int, weights: Sequence[int]) -> list[int]:
+    """Integer-cents kernel behind ``allocate_proportionally``.
+
+    Every positive weight except the last gets ``total * weight / weight_sum`` rounded half-up and
+    the last one absorbs the remainder. Exact half-cent ties are resolved with the same Decimal
+    expression the original implementation used, so results are identical to it.
+    """
+    allocations = [0] * len(weights)
+    weight_sum = sum(weights)
+    if total_cents == 0 or weight_sum <= 0:
+        return allocations
+
+    last_index = len(weights) - 1
+    while last_index >= 0 and weights[last_index] <= 0:
+        last_index -= 1
+    if last_index < 0:
+        return allocations
+
+    magnitude = abs(total_cents)
+    divisor = 2 * weight_sum
+    remaining = total_cents
+    for idx in range(last_index):
+        weight = weights[idx]
+        if weight <= 0:
+            continue
+        numerator = 2 * magnitude * weight
+        if numerator % weight_sum == 0 and (numerator // weight_sum) % 2 == 1:
+            allocated = to_cents(from_cents(total_cents) * (Decimal(weight) / Decimal(weight_sum)))
+        else:
+            allocated = (numerator + weight_sum) // divisor
+            if total_cents < 0:
+                allocated = -allocated
+        allocations[idx] = allocated
+        remaining -= allocated
+    allocations[last_index] = remaining
+    return allocations
+
+
 def allocate_proportionally(total: Decimal, weights: Iterable[Decimal]) -> list[Decimal]:
+    return [from_cents(cents) for cents in allocate_cents(to_cents(total), weight_units(weights))]
+
+
+def allocate_proportionally_many(totals: Sequence[Decimal], weights: Iterable[Decimal]) -> list[list[Decimal]]:
+    """Allocate several totals over the same weights, scaling the weights only once."""
+    units = weight_units(weights)
+    return [[from_cents(cents) for cents in allocate_cents(to_cents(total), units)] for total in totals]
+
+
+def _allocate_proportionally_decimal(total: Decimal, weights: Iterable[Decimal]) -> list[Decimal]:
+    """Original Decimal implementation, kept as the reference for equivalence tests and benchmarks."""
     total = money(total)
     weight_list = [Decimal(w) for w in weights]
     weight_sum = sum(weight_list, Decimal("0.00"))
@@ -67,15 +142,33 @@ def allocate_proportionally(total: Decimal, weights: Iterable[Decimal]) -> list[
     return allocations
 
 
+def split_net_profit(line_net_profit: Decimal, *, investor_owned: bool) -> tuple[Decimal, Decimal]:
+    """Return ``(investor_share, store_share)`` for a chunk; losses stay entirely with the store."""
+    net_cents = to_cents(line_net_profit)
+    if not investor_owned or net_cents <= 0:
+        return Decimal("0.00"), from_cents(net_cents)
+    share_numerator, share_denominator = INVESTOR_SHARE_RATE.as_integer_ratio()
+    investor_cents = (2 * net_cents * share_numerator + share_denominator) // (2 * share_denominator)
+    return from_cents(investor_cents), from_cents(net_cents - investor_cents)
+
+
+def payment_commission_rate(payment: Payment) -> Decimal:
+    if payment.method != PaymentMethod.CARD:
+        return Decimal("0.00")
+    if payment.commission_rate is not None:
+        return payment.commission_rate
+    return LEGACY_CARD_TYPE_TO_RATE.get(payment.card_type, Decimal("0.00"))
+
+
+def payment_commission_amount(payment: Payment) -> Decimal:
+    """Commission the terminal withholds for one payment, rounded per transaction."""
+    return money(payment.amount * payment_commission_rate(payment))
+
+
 def sale_commission_total(sale: Sale) -> Decimal:
     commission_total = Decimal("0.00")
     for payment in sale.payments.all():
-        if payment.method != PaymentMethod.CARD:
-            continue
-        commission_rate = payment.commission_rate
-        if commission_rate is None:
-            commission_rate = LEGACY_CARD_TYPE_TO_RATE.get(payment.card_type, Decimal("0.00"))
-        commission_total += payment.amount * commission_rate
+        commission_total += payment.amount * payment_commission_rate(payment)
     return money(commission_total)
 
 
@@ -95,10 +188,11 @@ def current_operating_cost_rate_snapshot(*, now_dt: datetime | None = None) -> O
     month_start = local_now.date().replace(day=1)
     month_end = local_now.date()
 
-    sales_mtd = Sale.objects.filter(
-        status=SaleStatus.CONFIRMED,
-        confirmed_at__date__gte=month_start,
-        confirmed_at__date__lte=month_end,
+    sales_mtd = filter_local_date_range(
+        Sale.objects.filter(status=SaleStatus.CONFIRMED),
+        "confirmed_at",
+        month_start,
+        month_end,
     ).aggregate(total=Sum("total"), sales_count=Count("id"))
     paid_expenses_mtd = (
         Expense.objects.filter(
@@ -148,6 +242,20 @@ def _line_revenue(line: SaleLine) -> Decimal:
     return money(gross - discount)
 
 
+def _assignments_by_product(product_ids: Iterable, *, lock: bool) -> dict:
+    """Open assignments for every product of a sale in one query, oldest first (FIFO consumption).
+
+    Locked rows are taken in (product, created_at, id) order so concurrent sales never wait on each other in a cycle.
+    """
+    queryset = InvestorAssignment.objects.filter(product_id__in=set(product_ids), qty_assigned__gt=0).order_by("product_id", "created_at", "id")
+    if lock:
+        queryset = queryset.select_for_update()
+    grouped: dict = {}
+    for assignment in queryset:
+        grouped.setdefault(assignment.product_id, []).append(assignment)
+    return grouped
+
+
 def _build_line_chunks(
     *,
     sale_line: SaleLine,
@@ -155,11 +263,10 @@ def _build_line_chunks(
     line_operating_cost: Decimal,
     line_commission_cost: Decimal,
     lock_assignments: bool,
+    assignments: list[InvestorAssignment] | None = None,
 ) -> tuple[list[ChunkInput], list[InvestorAssignment]]:
-    assignments_qs = InvestorAssignment.objects.filter(product=sale_line.product, qty_assigned__gt=0).order_by("created_at", "id")
-    if lock_assignments:
-        assignments_qs = assignments_qs.select_for_update()
-    assignments = list(assignments_qs)
+    if assignments is None:
+        assignments = _assignments_by_product([sale_line.product_id], lock=lock_assignments).get(sale_line.product_id, [])
 
     chunks: list[ChunkInput] = []
     touched_assignments: list[InvestorAssignment] = []
@@ -204,13 +311,14 @@ def _build_line_chunks(
     if not chunks:
         return chunks, touched_assignments
 
-    revenue_alloc = allocate_proportionally(line_revenue, qty_weights)
-    op_alloc = allocate_proportionally(line_operating_cost, qty_weights)
-    comm_alloc = allocate_proportionally(line_commission_cost, qty_weights)
+    revenue_alloc, op_alloc, comm_alloc = allocate_proportionally_many(
+        [line_revenue, line_operating_cost, line_commission_cost],
+        qty_weights,
+    )
     for index, chunk in enumerate(chunks):
-        chunk.revenue = money(revenue_alloc[index])
-        chunk.operating_cost = money(op_alloc[index])
-        chunk.commission_cost = money(comm_alloc[index])
+        chunk.revenue = revenue_alloc[index]
+        chunk.operating_cost = op_alloc[index]
+        chunk.commission_cost = comm_alloc[index]
     return chunks, touched_assignments
 
 
@@ -228,8 +336,10 @@ def build_sale_profitability_preview(*, lines: list[dict], payments: list[dict])
 
     rate_snapshot = current_operating_cost_rate_snapshot()
     operating_cost_amount = money(sale_revenue_total * rate_snapshot.operating_cost_rate)
-    line_operating_alloc = allocate_proportionally(operating_cost_amount, sale_revenues)
-    line_commission_alloc = allocate_proportionally(commission_total, sale_revenues)
+    line_operating_alloc, line_commission_alloc = allocate_proportionally_many(
+        [operating_cost_amount, commission_total],
+        sale_revenues,
+    )
 
     preview_lines: list[dict] = []
     gross_profit_total = Decimal("0.00")
@@ -237,6 +347,7 @@ def build_sale_profitability_preview(*, lines: list[dict], payments: list[dict])
     investor_profit_total = Decimal("0.00")
     store_profit_total = Decimal("0.00")
 
+    assignments = _assignments_by_product([line["sale_line"].product_id for line in lines], lock=False)
     for index, line in enumerate(lines):
         line_revenue = sale_revenues[index]
         line_operating = line_operating_alloc[index]
@@ -249,14 +360,14 @@ def build_sale_profitability_preview(*, lines: list[dict], payments: list[dict])
             line_operating_cost=line_operating,
             line_commission_cost=line_commission,
             lock_assignments=False,
+            assignments=assignments.get(sale_line.product_id, []),
         )
         for chunk in chunks:
             line_net_profit = money(chunk.revenue - chunk.cogs - chunk.operating_cost - chunk.commission_cost)
-            if chunk.ownership == SaleLineProfitability.Ownership.INVESTOR:
-                investor_share = money(max(Decimal("0.00"), line_net_profit * INVESTOR_SHARE_RATE))
-            else:
-                investor_share = Decimal("0.00")
-            store_share = money(line_net_profit - investor_share)
+            investor_share, store_share = split_net_profit(
+                line_net_profit,
+                investor_owned=chunk.ownership == SaleLineProfitability.Ownership.INVESTOR,
+            )
 
             preview_lines.append(
                 {
@@ -293,15 +404,19 @@ def build_sale_profitability_preview(*, lines: list[dict], payments: list[dict])
 
 @transaction.atomic
 def apply_sale_profitability(*, sale: Sale) -> SaleProfitabilitySnapshot:
-    line_items = list(sale.lines.select_related("product"))
+    # No-op when the caller already prefetched them (confirm and create-and-confirm do).
+    prefetch_related_objects([sale], "lines__product")
+    line_items = list(sale.lines.all())
     line_revenues = [_line_revenue(line) for line in line_items]
     sale_revenue_total = money(sum(line_revenues, Decimal("0.00")))
     commission_total = sale_commission_total(sale)
 
     rate_snapshot = current_operating_cost_rate_snapshot()
     operating_cost_amount = money(sale_revenue_total * rate_snapshot.operating_cost_rate)
-    line_operating_alloc = allocate_proportionally(operating_cost_amount, line_revenues)
-    line_commission_alloc = allocate_proportionally(commission_total, line_revenues)
+    line_operating_alloc, line_commission_alloc = allocate_proportionally_many(
+        [operating_cost_amount, commission_total],
+        line_revenues,
+    )
 
     snapshot = SaleProfitabilitySnapshot.objects.create(
         sale=sale,
@@ -316,6 +431,9 @@ def apply_sale_profitability(*, sale: Sale) -> SaleProfitabilitySnapshot:
     investor_profit_total = Decimal("0.00")
     store_profit_total = Decimal("0.00")
     dirty_assignments: dict[str, InvestorAssignment] = {}
+    profitability_lines: list[SaleLineProfitability] = []
+    ledger_entries: list[LedgerEntry] = []
+    assignments = _assignments_by_product([line.product_id for line in line_items], lock=True)
 
     for index, line in enumerate(line_items):
         chunks, touched = _build_line_chunks(
@@ -324,6 +442,7 @@ def apply_sale_profitability(*, sale: Sale) -> SaleProfitabilitySnapshot:
             line_operating_cost=line_operating_alloc[index],
             line_commission_cost=line_commission_alloc[index],
             lock_assignments=True,
+            assignments=assignments.get(line.product_id, []),
         )
         for assignment in touched:
             dirty_assignments[str(assignment.id)] = assignment
@@ -333,59 +452,68 @@ def apply_sale_profitability(*, sale: Sale) -> SaleProfitabilitySnapshot:
                 chunk.assignment.qty_sold = money(Decimal(chunk.assignment.qty_sold) + Decimal(chunk.qty))
 
             line_net_profit = money(chunk.revenue - chunk.cogs - chunk.operating_cost - chunk.commission_cost)
-            if chunk.ownership == SaleLineProfitability.Ownership.INVESTOR:
-                investor_share = money(max(Decimal("0.00"), line_net_profit * INVESTOR_SHARE_RATE))
-            else:
-                investor_share = Decimal("0.00")
-            store_share = money(line_net_profit - investor_share)
-
-            SaleLineProfitability.objects.create(
-                snapshot=snapshot,
-                sale_line=line,
-                product=line.product,
-                assignment=chunk.assignment,
-                investor=chunk.assignment.investor if chunk.assignment else None,
-                ownership=chunk.ownership,
-                qty_consumed=money(chunk.qty),
-                line_revenue=money(chunk.revenue),
-                line_cogs=money(chunk.cogs),
-                line_operating_cost=money(chunk.operating_cost),
-                line_commission_cost=money(chunk.commission_cost),
-                line_net_profit=money(line_net_profit),
-                investor_profit_share=money(investor_share),
-                store_profit_share=money(store_share),
+            investor_share, store_share = split_net_profit(
+                line_net_profit,
+                investor_owned=chunk.ownership == SaleLineProfitability.Ownership.INVESTOR,
             )
 
-            if chunk.assignment:
-                LedgerEntry.objects.create(
-                    investor=chunk.assignment.investor,
-                    entry_type=LedgerEntryType.INVENTORY_TO_CAPITAL,
-                    capital_delta=money(chunk.cogs),
-                    inventory_delta=money(-chunk.cogs),
-                    profit_delta=Decimal("0.00"),
-                    reference_type="sale",
-                    reference_id=str(sale.id),
-                    note="Capital recovery",
+            profitability_lines.append(
+                SaleLineProfitability(
+                    snapshot=snapshot,
+                    sale_line=line,
+                    product_id=line.product_id,
+                    assignment=chunk.assignment,
+                    investor_id=chunk.assignment.investor_id if chunk.assignment else None,
+                    ownership=chunk.ownership,
+                    qty_consumed=money(chunk.qty),
+                    line_revenue=chunk.revenue,
+                    line_cogs=money(chunk.cogs),
+                    line_operating_cost=chunk.operating_cost,
+                    line_commission_cost=chunk.commission_cost,
+                    line_net_profit=line_net_profit,
+                    investor_profit_share=investor_share,
+                    store_profit_share=store_share,
                 )
-                if investor_share > Decimal("0.00"):
-                    LedgerEntry.objects.create(
-                        investor=chunk.assignment.investor,
-                        entry_type=LedgerEntryType.PROFIT_SHARE,
-                        capital_delta=Decimal("0.00"),
-                        inventory_delta=Decimal("0.00"),
-                        profit_delta=money(investor_share),
+            )
+
+            if chunk.assignment:
+                ledger_entries.append(
+                    LedgerEntry(
+                        investor_id=chunk.assignment.investor_id,
+                        entry_type=LedgerEntryType.INVENTORY_TO_CAPITAL,
+                        capital_delta=money(chunk.cogs),
+                        inventory_delta=money(-chunk.cogs),
+                        profit_delta=Decimal("0.00"),
                         reference_type="sale",
                         reference_id=str(sale.id),
-                        note="Profit share 50/50 (net)",
+                        note="Capital recovery",
+                    )
+                )
+                if investor_share > Decimal("0.00"):
+                    ledger_entries.append(
+                        LedgerEntry(
+                            investor_id=chunk.assignment.investor_id,
+                            entry_type=LedgerEntryType.PROFIT_SHARE,
+                            capital_delta=Decimal("0.00"),
+                            inventory_delta=Decimal("0.00"),
+                            profit_delta=investor_share,
+                            reference_type="sale",
+                            reference_id=str(sale.id),
+                            note="Profit share 50/50 (net)",
+                        )
                     )
 
             gross_profit_total += money(chunk.revenue - chunk.cogs)
-            net_profit_total += money(line_net_profit)
-            investor_profit_total += money(investor_share)
-            store_profit_total += money(store_share)
+            net_profit_total += line_net_profit
+            investor_profit_total += investor_share
+            store_profit_total += store_share
 
+    SaleLineProfitability.objects.bulk_create(profitability_lines)
+    if ledger_entries:
+        LedgerEntry.objects.bulk_create(ledger_entries)
     if dirty_assignments:
         InvestorAssignment.objects.bulk_update(list(dirty_assignments.values()), ["qty_sold"])
+    record_assignment_performance(profitability_lines, sold_at=sale.confirmed_at or timezone.now())
 
     snapshot.gross_profit_total = money(gross_profit_total)
     snapshot.net_profit_total = money(net_profit_total)
@@ -408,21 +536,27 @@ def revert_sale_profitability(*, sale: Sale) -> None:
     if not snapshot:
         return
 
-    sale_lines = list(snapshot.lines.select_related("assignment", "investor"))
-    dirty_assignments: dict[str, InvestorAssignment] = {}
+    sale_lines = list(snapshot.lines.filter(assignment__isnull=False))
+    # Locked in the same order apply_sale_profitability takes them, so a concurrent confirm cannot lose the update.
+    dirty_assignments: dict[str, InvestorAssignment] = {
+        str(assignment.id): assignment
+        for assignment in InvestorAssignment.objects.select_for_update()
+        .filter(id__in={line.assignment_id for line in sale_lines})
+        .order_by("product_id", "created_at", "id")
+    }
 
     for line in sale_lines:
-        if line.assignment:
-            line.assignment.qty_sold = money(max(Decimal("0.00"), Decimal(line.assignment.qty_sold) - Decimal(line.qty_consumed)))
-            dirty_assignments[str(line.assignment.id)] = line.assignment
+        line.assignment = dirty_assignments[str(line.assignment_id)]
+        line.assignment.qty_sold = money(max(Decimal("0.00"), Decimal(line.assignment.qty_sold) - Decimal(line.qty_consumed)))
 
     if dirty_assignments:
         InvestorAssignment.objects.bulk_update(list(dirty_assignments.values()), ["qty_sold"])
+    record_assignment_performance(sale_lines, sold_at=sale.confirmed_at or timezone.now(), sign=-1)
 
-    ledger_entries = LedgerEntry.objects.filter(reference_type="sale", reference_id=str(sale.id))
-    for entry in ledger_entries:
-        LedgerEntry.objects.create(
-            investor=entry.investor,
+    ledger_entries = LedgerEntry.objects.filter(reference_type="sale", reference_id=str(sale.id)).order_by("investor_id", "sequence")
+    reversals = [
+        LedgerEntry(
+            investor_id=entry.investor_id,
             entry_type=entry.entry_type,
             capital_delta=money(-entry.capital_delta),
             inventory_delta=money(-entry.inventory_delta),
@@ -431,3 +565,7 @@ def revert_sale_profitability(*, sale: Sale) -> None:
             reference_id=str(sale.id),
             note=f"{entry.note or 'Sale reversal'} (void)",
         )
+        for entry in ledger_entries
+    ]
+    if reversals:
+        LedgerEntry.objects.bulk_create(reversals)
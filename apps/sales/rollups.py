@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from apps.common.dates import filter_local_date_range
+from apps.common.metrics_cache import bump_metrics_data_version
+from apps.common.rollups import accumulate, apply_rollup_deltas
+from apps.sales.models import (
+    Sale,
+    SaleStatus,
+    SalesDailyCashierRollup,
+    SalesDailyPaymentRollup,
+    SalesDailyProductRollup,
+)
+from apps.sales.profitability import _line_revenue, money, payment_commission_amount
+
+# (SalesFacts attribute, rollup model, key fields in the order they appear in the fact keys)
+ROLLUP_TARGETS = (
+    ("cashiers", SalesDailyCashierRollup, ("day", "cashier_id")),
+    ("products", SalesDailyProductRollup, ("day", "product_id")),
+    ("payments", SalesDailyPaymentRollup, ("day", "method", "card_type", "card_plan_code")),
+)
+
+
+def sale_local_day(sale: Sale) -> date:
+    return timezone.localdate(sale.confirmed_at)
+
+
+@dataclass
+class SalesFacts:
+    """Additive per-day sale facts, keyed exactly like the rollup tables."""
+
+    cashiers: dict = field(default_factory=dict)
+    products: dict = field(default_factory=dict)
+    payments: dict = field(default_factory=dict)
+
+    def add_sale(self, sale: Sale, *, sign: int = 1) -> None:
+        day = sale_local_day(sale)
+        accumulate(self.cashiers, (day, sale.cashier_id), sales_count=sign, total_sales=sign * sale.total)
+        for line in sale.lines.all():
+            accumulate(
+                self.products,
+                (day, line.product_id),
+                units_sold=sign * line.qty,
+                sales_amount=sign * _line_revenue(line),
+                cost_amount=sign * money(line.qty * line.unit_cost),
+            )
+        for payment in sale.payments.all():
+            accumulate(
+                self.payments,
+                (day, payment.method, payment.card_type or "", payment.card_plan_code or ""),
+                transactions=sign,
+                total_amount=sign * payment.amount,
+                commission_amount=sign * payment_commission_amount(payment),
+            )
+
+    def rows(self):
+        for attr, model, key_fields in ROLLUP_TARGETS:
+            for key, deltas in getattr(self, attr).items():
+                yield model, dict(zip(key_fields, key)), deltas
+
+
+def collect_sales_facts(sales: QuerySet, *, chunk_size: int = 500) -> SalesFacts:
+    facts = SalesFacts()
+    for sale in sales.prefetch_related("lines", "payments").iterator(chunk_size=chunk_size):
+        facts.add_sale(sale)
+    return facts
+
+
+def record_sale_rollups(*, sale: Sale, sign: int = 1) -> None:
+    """Add (sign=1, confirm) or remove (sign=-1, void) a sale from the daily rollups.
+
+    Must run inside the confirm/void transaction, after ``confirmed_at`` is set.
+    """
+    facts = SalesFacts()
+    facts.add_sale(sale, sign=sign)
+    rows_by_model = {}
+    for model, keys, deltas in facts.rows():
+        rows_by_model.setdefault(model, []).append((keys, deltas))
+    for model, rows in rows_by_model.items():
+        apply_rollup_deltas(model, rows)
+    bump_metrics_data_version(sale_local_day(sale))
+
+
+@transaction.atomic
+def rebuild_sales_rollups(*, date_from: date | None = None, date_to: date | None = None, chunk_size: int = 500) -> int:
+    """Recompute the rollups for a local-day range from confirmed sales. Returns sales processed."""
+    sales = filter_local_date_range(Sale.objects.filter(status=SaleStatus.CONFIRMED), "confirmed_at", date_from, date_to)
+
+    for _, model, _ in ROLLUP_TARGETS:
+        existing = model.objects.all()
+        if date_from:
+            existing = existing.filter(day__gte=date_from)
+        if date_to:
+            existing = existing.filter(day__lte=date_to)
+        existing.delete()
+
+    facts = SalesFacts()
+    sales_count = 0
+    for sale in sales.prefetch_related("lines", "payments").iterator(chunk_size=chunk_size):
+        facts.add_sale(sale)
+        sales_count += 1
+
+    rows_by_model = {}
+    for model, keys, deltas in facts.rows():
+        rows_by_model.setdefault(model, []).append(model(**keys, **deltas))
+    for model, rows in rows_by_model.items():
+        model.objects.bulk_create(rows, batch_size=chunk_size)
+    bump_metrics_data_version()
+    return sales_count
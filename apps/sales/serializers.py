@@ -3,11 +3,15 @@ from decimal import Decimal
 
 from django.contrib.auth import authenticate
 from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
 from rest_framework import serializers
 
 from apps.accounts.models import UserRole
 from apps.audit.services import record_audit
+from apps.catalog.models import Product
+from apps.catalog.serializers import CartProductField, load_cart_products
+from apps.common.permissions import RolePermission
 from apps.layaway.models import Customer, CustomerCredit, normalize_phone
 from apps.sales.models import (
     CardCommissionPlan,
@@ -26,6 +30,7 @@ VOID_WINDOW_MINUTES = 10
 
 
 class SaleLineSerializer(serializers.ModelSerializer):
+    product = CartProductField(queryset=Product.objects.all())
     product_sku = serializers.CharField(source="product.sku", read_only=True)
     product_name = serializers.CharField(source="product.name", read_only=True)
 
@@ -171,13 +176,13 @@ class SaleSerializer(serializers.ModelSerializer):
             "profitability_breakdown",
         ]
 
+    def to_internal_value(self, data):
+        self.context["cart_products"] = load_cart_products(data)
+        return super().to_internal_value(data)
+
     @staticmethod
     def _resolve_role(user):
-        group_names = set(user.groups.values_list("name", flat=True))
-        for role in (UserRole.ADMIN, UserRole.CASHIER, UserRole.INVESTOR):
-            if role in group_names:
-                return role
-        return getattr(user, "role", UserRole.CASHIER)
+        return RolePermission._resolve_role(user)
 
     @staticmethod
     def _legacy_card_type_for_plan(plan):
@@ -327,16 +332,16 @@ class SaleSerializer(serializers.ModelSerializer):
         override_reason = validated_data.pop("override_reason", "")
         validated_data.pop("override_admin_username", None)
         validated_data.pop("override_admin_password", None)
-        customer = None
-        if customer_phone:
-            customer = preloaded_customer or Customer.get_or_create_by_phone(phone=customer_phone, name=customer_name or customer_phone)
         with transaction.atomic():
+            customer = None
+            if customer_phone:
+                customer = preloaded_customer or Customer.upsert_by_phone(phone=customer_phone, name=customer_name or customer_phone)
             sale = Sale.objects.create(cashier=self.context["request"].user, customer=customer)
 
             subtotal = Decimal("0")
             discount_total = Decimal("0")
-            for line in lines:
-                line_obj = SaleLine.objects.create(sale=sale, **line)
+            line_objs = SaleLine.objects.bulk_create([SaleLine(sale=sale, **line) for line in lines])
+            for line_obj in line_objs:
                 line_amount = line_obj.qty * line_obj.unit_price
                 discount = (line_amount * line_obj.discount_pct) / Decimal("100")
                 subtotal += line_amount
@@ -345,8 +350,7 @@ class SaleSerializer(serializers.ModelSerializer):
             subtotal = subtotal.quantize(Decimal("0.01"))
             discount_total = discount_total.quantize(Decimal("0.01"))
             total = (subtotal - discount_total).quantize(Decimal("0.01"))
-            for payment in payments:
-                Payment.objects.create(sale=sale, **payment)
+            Payment.objects.bulk_create([Payment(sale=sale, **payment) for payment in payments])
 
             sale.subtotal = subtotal
             sale.discount_amount = discount_total
@@ -371,13 +375,20 @@ class SaleSerializer(serializers.ModelSerializer):
         customer = getattr(obj, "customer", None)
         if not customer:
             return None
-        sales_qs = customer.sales.all()
+        counts = {
+            "sales_count": getattr(obj, "customer_sales_count", None),
+            "confirmed_sales_count": getattr(obj, "customer_confirmed_sales_count", None),
+        }
+        if None in counts.values():
+            counts = customer.sales.aggregate(
+                sales_count=Count("id"),
+                confirmed_sales_count=Count("id", filter=Q(status=SaleStatus.CONFIRMED)),
+            )
         return {
             "id": str(customer.id),
             "name": customer.name,
             "phone": customer.phone,
-            "sales_count": sales_qs.count(),
-            "confirmed_sales_count": sales_qs.filter(status=SaleStatus.CONFIRMED).count(),
+            **counts,
         }
 
 
@@ -420,7 +431,10 @@ class SaleListSerializer(serializers.ModelSerializer):
         if obj.status != SaleStatus.CONFIRMED:
             return False
 
-        user_role = SaleSerializer._resolve_role(user)
+        # Resolved once per request: the group lookup would otherwise repeat for every listed sale.
+        user_role = self.context.get("request_role")
+        if user_role is None:
+            user_role = self.context["request_role"] = SaleSerializer._resolve_role(user)
         if user_role == UserRole.ADMIN:
             return True
         if user_role != UserRole.CASHIER:
@@ -482,8 +496,6 @@ class SaleProfitabilityPreviewSerializer(serializers.Serializer):
         if not payments:
             raise serializers.ValidationError({"payments": "Debes incluir al menos un pago."})
 
-        from apps.catalog.models import Product
-
         products_by_id = {
             str(product.id): product
             for product in Product.objects.filter(id__in=[line["product"] for line in lines])
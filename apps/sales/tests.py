@@ -1,17 +1,31 @@
+import csv
+import json
+import os
+import random
+import tempfile
+import threading
+import time
 import uuid
-from datetime import timedelta
-from decimal import Decimal
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal
+from io import StringIO
 from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
 from django.db.models import Sum
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from django.utils import timezone
 from rest_framework.test import APITestCase
 
 from apps.audit.models import AuditLog
 from apps.catalog.models import Brand, Product, ProductType
+from apps.common.dates import filter_local_date_range, local_date_bounds
+from apps.common.sections import SectionTimeout, run_sections
 from apps.expenses.models import Expense, ExpenseStatus
 from apps.inventory.models import InventoryMovement
 from apps.imports.models import InvoiceImportLine
@@ -20,13 +34,17 @@ from apps.ledger.models import LedgerEntry
 from apps.ledger.services import current_balances
 from apps.layaway.models import CustomerCredit, Layaway
 from apps.purchases.models import PurchaseReceipt, ReceiptStatus
-from apps.sales.models import CardCommissionPlan, CardType, Payment, PaymentMethod, Sale, SaleLine, SaleLineProfitability, SaleProfitabilitySnapshot, SaleStatus, VoidEvent
+from apps.sales.models import CardCommissionPlan, CardType, Payment, PaymentMethod, ProfitabilityRateSource, Sale, SaleLine, SaleLineProfitability, SaleProfitabilitySnapshot, SaleStatus, SalesDailyCashierRollup, SalesDailyPaymentRollup, SalesDailyProductRollup, VoidEvent
 from apps.sales.profitability import (
+    _allocate_proportionally_decimal,
     _build_line_chunks,
     allocate_proportionally,
+    allocate_proportionally_many,
     apply_sale_profitability,
     revert_sale_profitability,
+    split_net_profit,
 )
+from apps.sales.views import SaleViewSet
 from apps.suppliers.models import Supplier, SupplierInvoiceParser
 
 User = get_user_model()
@@ -34,6 +52,7 @@ User = get_user_model()
 
 class ApiFlowTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.admin = User.objects.create_user(username="admin", password="admin123", role="ADMIN")
         self.cashier = User.objects.create_user(username="cashier", password="cashier123", role="CASHIER")
         self.investor_user = User.objects.create_user(username="investor", password="investor123", role="INVESTOR")
@@ -750,6 +769,8 @@ class ApiFlowTests(APITestCase):
             total=Decimal("500.00"),
         )
 
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+
         response = self.client.get(
             "/api/v1/metrics/",
             {
@@ -810,6 +831,7 @@ class ApiFlowTests(APITestCase):
             total=Decimal("150.00"),
             confirmed_at=now,
         )
+        call_command("rebuild_sales_rollups", stdout=StringIO())
 
         response = self.client.get(
             "/api/v1/reports/sales/",
@@ -1053,6 +1075,56 @@ class ApiFlowTests(APITestCase):
         self.assertEqual(Decimal(str(balances_after_void["profit"])), Decimal("0.00"))
         self.assertTrue(LedgerEntry.objects.filter(reference_type="sale_void", reference_id=str(sale_id)).exists())
 
+    def test_second_void_of_the_same_sale_writes_nothing(self):
+        self.auth_as("cashier", "cashier123")
+        InvestorAssignment.objects.create(
+            investor=self.investor,
+            product=self.product,
+            qty_assigned=Decimal("5.00"),
+            unit_cost=Decimal("40.00"),
+        )
+        sale_resp = self.client.post(
+            "/api/v1/sales/",
+            {
+                "lines": [
+                    {
+                        "product": str(self.product.id),
+                        "qty": "2.00",
+                        "unit_price": "100.00",
+                        "unit_cost": "40.00",
+                        "discount_pct": "0.00",
+                    }
+                ],
+                "payments": [{"method": "CASH", "amount": "200.00"}],
+            },
+            format="json",
+        )
+        sale_id = sale_resp.data["id"]
+        self.assertEqual(self.client.post(f"/api/v1/sales/{sale_id}/confirm/", {}, format="json").status_code, 200)
+        # A racing request that read the sale before the first void committed.
+        stale_sale = SaleViewSet(action="void")._base_queryset().get(pk=sale_id)
+        self.assertEqual(self.client.post(f"/api/v1/sales/{sale_id}/void/", {}, format="json").status_code, 200)
+
+        def written():
+            return (
+                InventoryMovement.objects.count(),
+                LedgerEntry.objects.count(),
+                VoidEvent.objects.count(),
+                AuditLog.objects.count(),
+                list(SalesDailyCashierRollup.objects.values_list("sales_count", "total_sales")),
+                self.stock(),
+            )
+
+        before = written()
+        again = self.client.post(f"/api/v1/sales/{sale_id}/void/", {}, format="json")
+        self.assertEqual(again.status_code, 400)
+        self.assertEqual(again.data["code"], "invalid_state")
+        with mock.patch.object(SaleViewSet, "get_object", return_value=stale_sale):
+            raced = self.client.post(f"/api/v1/sales/{sale_id}/void/", {}, format="json")
+        self.assertEqual(raced.status_code, 400)
+        self.assertEqual(raced.data["code"], "invalid_state")
+        self.assertEqual(written(), before)
+
     def test_voided_sale_is_excluded_from_metrics(self):
         self.auth_as("cashier", "cashier123")
         sale_resp = self.client.post(
@@ -1081,6 +1153,373 @@ class ApiFlowTests(APITestCase):
         self.assertEqual(metrics.data["sales_count"], 0)
         self.assertEqual(Decimal(str(metrics.data["total_sales"])), Decimal("0.00"))
 
+    def test_sales_rollups_follow_confirm_and_void(self):
+        self.auth_as("cashier", "cashier123")
+        sale_resp = self.client.post(
+            "/api/v1/sales/",
+            {
+                "lines": [
+                    {
+                        "product": str(self.product.id),
+                        "qty": "2.00",
+                        "unit_price": "100.00",
+                        "unit_cost": "40.00",
+                        "discount_pct": "10.00",
+                    }
+                ],
+                "payments": [{"method": "CASH", "amount": "180.00"}],
+            },
+            format="json",
+        )
+        self.assertEqual(sale_resp.status_code, 201)
+        sale_id = sale_resp.data["id"]
+        self.client.post(f"/api/v1/sales/{sale_id}/confirm/", {}, format="json")
+
+        today = timezone.localdate()
+        cashier_row = SalesDailyCashierRollup.objects.get(day=today, cashier=self.cashier)
+        self.assertEqual((cashier_row.sales_count, cashier_row.total_sales), (1, Decimal("180.00")))
+        product_row = SalesDailyProductRollup.objects.get(day=today, product=self.product)
+        self.assertEqual(product_row.units_sold, Decimal("2.00"))
+        self.assertEqual(product_row.sales_amount, Decimal("180.00"))
+        self.assertEqual(product_row.cost_amount, Decimal("80.00"))
+        payment_row = SalesDailyPaymentRollup.objects.get(day=today, method=PaymentMethod.CASH)
+        self.assertEqual((payment_row.transactions, payment_row.total_amount), (1, Decimal("180.00")))
+
+        incremental = sorted(SalesDailyProductRollup.objects.values_list("day", "product_id", "units_sold", "sales_amount", "cost_amount"))
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+        rebuilt = sorted(SalesDailyProductRollup.objects.values_list("day", "product_id", "units_sold", "sales_amount", "cost_amount"))
+        self.assertEqual(incremental, rebuilt)
+
+        self.client.post(f"/api/v1/sales/{sale_id}/void/", {"reason": "rollup-check"}, format="json")
+        cashier_row = SalesDailyCashierRollup.objects.get(day=today, cashier=self.cashier)
+        self.assertEqual((cashier_row.sales_count, cashier_row.total_sales), (0, Decimal("0.00")))
+        self.assertEqual(SalesDailyProductRollup.objects.get(day=today, product=self.product).units_sold, Decimal("0.00"))
+
+    @override_settings(SALES_ROLLUP_LIVE_TODAY=False)
+    def test_metrics_are_served_from_rollups(self):
+        self.auth_as("cashier", "cashier123")
+        sale_resp = self.client.post(
+            "/api/v1/sales/",
+            {
+                "lines": [
+                    {
+                        "product": str(self.product.id),
+                        "qty": "1.00",
+                        "unit_price": "100.00",
+                        "unit_cost": "40.00",
+                        "discount_pct": "0.00",
+                    }
+                ],
+                "payments": [{"method": "CASH", "amount": "100.00"}],
+            },
+            format="json",
+        )
+        self.client.post(f"/api/v1/sales/{sale_resp.data['id']}/confirm/", {}, format="json")
+
+        self.auth_as("admin", "admin123")
+        report = self.client.get("/api/v1/reports/sales/")
+        self.assertEqual(report.data["sales_count"], 1)
+        self.assertEqual(Decimal(str(report.data["gross_profit"])), Decimal("60.00"))
+        self.assertEqual(report.data["top_products"][0]["product__sku"], "SKU-001")
+        self.assertEqual(report.data["sales_by_cashier"][0]["cashier__username"], "cashier")
+
+        SalesDailyCashierRollup.objects.all().delete()
+        SalesDailyProductRollup.objects.all().delete()
+        SalesDailyPaymentRollup.objects.all().delete()
+        cache.clear()
+        report = self.client.get("/api/v1/reports/sales/")
+        self.assertEqual(report.data["sales_count"], 0)
+        self.assertEqual(report.data["top_products"], [])
+
+        cache.clear()
+        with override_settings(SALES_ROLLUP_LIVE_TODAY=True):
+            report = self.client.get("/api/v1/reports/sales/")
+        self.assertEqual(report.data["sales_count"], 1)
+        self.assertEqual(Decimal(str(report.data["payment_breakdown"]["by_method"][0]["total_amount"])), Decimal("100.00"))
+
+    def test_metrics_cache_reports_hit_miss_and_invalidates_on_write(self):
+        self.auth_as("admin", "admin123")
+        first = self.client.get("/api/v1/metrics/")
+        self.assertEqual(first["X-Metrics-Cache"], "MISS")
+        second = self.client.get("/api/v1/metrics/", {"top_limit": "10"})
+        self.assertEqual(second["X-Metrics-Cache"], "HIT")
+        self.assertEqual(second.data["sales_count"], 0)
+        self.assertIn("inventory_snapshot", second.data)
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get("/api/v1/reports/sales/", {"date_to": yesterday})["X-Metrics-Cache"], "MISS")
+
+        self.auth_as("cashier", "cashier123")
+        created = self.client.post(
+            "/api/v1/sales/create-and-confirm/",
+            {
+                "lines": [
+                    {
+                        "product": str(self.product.id),
+                        "qty": "1.00",
+                        "unit_price": "100.00",
+                        "unit_cost": "40.00",
+                        "discount_pct": "0.00",
+                    }
+                ],
+                "payments": [{"method": "CASH", "amount": "100.00"}],
+            },
+            format="json",
+        )
+        self.assertEqual(created.status_code, 201)
+
+        self.auth_as("admin", "admin123")
+        after_write = self.client.get("/api/v1/metrics/")
+        self.assertEqual(after_write["X-Metrics-Cache"], "MISS")
+        self.assertEqual(after_write.data["sales_count"], 1)
+
+        # A checkout today cannot change a range that ended yesterday; a backdated expense can.
+        self.assertEqual(self.client.get("/api/v1/reports/sales/", {"date_to": yesterday})["X-Metrics-Cache"], "HIT")
+        backdated = self.client.post(
+            "/api/v1/expenses/",
+            {"category": "Rent", "description": "Late invoice", "amount": "10.00", "expense_date": yesterday},
+            format="json",
+        )
+        self.assertEqual(backdated.status_code, 201)
+        self.assertEqual(self.client.get("/api/v1/reports/sales/", {"date_to": yesterday})["X-Metrics-Cache"], "MISS")
+        self.assertEqual(self.client.get("/api/v1/reports/sales/", {"date_to": yesterday})["X-Metrics-Cache"], "HIT")
+
+    def test_report_includes_per_section_timings(self):
+        self.auth_as("admin", "admin123")
+        response = self.client.get("/api/v1/reports/sales/")
+        self.assertEqual(response.status_code, 200)
+        timings = response.data["section_timings"]
+        self.assertEqual(
+            set(timings),
+            {
+                "sales",
+                "purchases",
+                "investor_profit_share_legacy",
+                "profitability",
+                "investor_sales_split",
+                "investor_assignments",
+                "confirmed_sales_count",
+                "expenses",
+                "inventory_snapshot",
+            },
+        )
+        self.assertTrue(all(timing["status"] == "ok" for timing in timings.values()))
+
+    def test_report_section_timeout_returns_503(self):
+        self.auth_as("admin", "admin123")
+        timeout = SectionTimeout({"detail": SectionTimeout.default_detail, "sections": {"sales": {"status": "timeout"}}})
+        with mock.patch("apps.sales.views_metrics.run_sections", side_effect=timeout):
+            response = self.client.get("/api/v1/reports/sales/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data["code"], "report_section_timeout")
+        self.assertEqual(response.data["fields"]["sections"]["sales"]["status"], "timeout")
+        self.assertEqual(self.client.get("/api/v1/reports/sales/")["X-Metrics-Cache"], "MISS")
+
+    def test_metrics_compare_returns_deltas_between_windows(self):
+        def confirmed_sale(day, total):
+            sale = Sale.objects.create(
+                cashier=self.cashier,
+                status=SaleStatus.CONFIRMED,
+                subtotal=total,
+                total=total,
+                confirmed_at=timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=22)),
+            )
+            SaleLine.objects.create(
+                sale=sale,
+                product=self.product,
+                qty=Decimal("1.00"),
+                unit_price=total,
+                unit_cost=Decimal("40.00"),
+                discount_pct=Decimal("0.00"),
+            )
+            Payment.objects.create(sale=sale, method=PaymentMethod.CASH, amount=total)
+
+        confirmed_sale(date(2025, 1, 31), Decimal("100.00"))
+        confirmed_sale(date(2025, 2, 10), Decimal("150.00"))
+        confirmed_sale(date(2025, 2, 28), Decimal("150.00"))
+        for day, amount in ((date(2025, 1, 5), Decimal("20.00")), (date(2025, 2, 5), Decimal("50.00"))):
+            Expense.objects.create(category="Rent", description="Rent", amount=amount, expense_date=day, created_by=self.admin)
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+        call_command("backfill_sale_profitability", stdout=StringIO())
+
+        self.auth_as("admin", "admin123")
+        with self.assertNumQueries(7):
+            # user + groups for the permission check, the metrics data version, then one grouped query per
+            # section covering both windows
+            response = self.client.get("/api/v1/metrics/compare/", {"period": "2025-02"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["previous"], {"date_from": date(2025, 1, 1), "date_to": date(2025, 1, 31)})
+        metrics = response.data["metrics"]
+        self.assertEqual(metrics["total_sales"], {
+            "current": Decimal("300.00"),
+            "previous": Decimal("100.00"),
+            "delta": Decimal("200.00"),
+            "change_pct": Decimal("200.00"),
+        })
+        self.assertEqual(metrics["sales_count"]["delta"], 1)
+        self.assertEqual(metrics["gross_profit"]["current"], Decimal("220.00"))
+        self.assertEqual(metrics["total_expenses"]["change_pct"], Decimal("150.00"))
+        shares = metrics["investor_profit_share_total"]["current"] + metrics["store_profit_share_total"]["current"]
+        self.assertGreater(shares, Decimal("0.00"))
+        self.assertEqual(
+            metrics["net_profit"]["current"],
+            metrics["store_profit_share_total"]["current"] - Decimal("50.00"),
+        )
+
+        explicit = self.client.get(
+            "/api/v1/metrics/compare/",
+            {"period": "2025-02-01..2025-02-28", "previous": "2024-02-01..2024-02-29"},
+        )
+        self.assertEqual(explicit.data["metrics"]["total_sales"]["previous"], Decimal("0.00"))
+        self.assertIsNone(explicit.data["metrics"]["total_sales"]["change_pct"])
+
+        invalid = self.client.get("/api/v1/metrics/compare/", {"period": "2025-02-28..2025-02-01"})
+        self.assertEqual(invalid.status_code, 400)
+        self.assertIn("period", invalid.data["fields"])
+
+    def test_card_commission_report_groups_rollups_by_plan_and_day(self):
+        normal = self.card_plan("NORMAL")
+        msi3 = self.card_plan("MSI_3")
+        self.auth_as("cashier", "cashier123")
+
+        def card_sale(plan, amount):
+            response = self.client.post(
+                "/api/v1/sales/create-and-confirm/",
+                {
+                    "lines": [
+                        {
+                            "product": str(self.product.id),
+                            "qty": "1.00",
+                            "unit_price": amount,
+                            "unit_cost": "10.00",
+                            "discount_pct": "0.00",
+                        }
+                    ],
+                    "payments": [{"method": "CARD", "amount": amount, "card_plan_id": str(plan.id)}],
+                },
+                format="json",
+            )
+            self.assertEqual(response.status_code, 201)
+            return response.data["id"]
+
+        card_sale(normal, "100.00")
+        card_sale(normal, "50.05")
+        card_sale(msi3, "200.00")
+        voided_id = card_sale(msi3, "80.00")
+        self.auth_as("admin", "admin123")
+        self.assertEqual(self.client.post(f"/api/v1/sales/{voided_id}/void/", {"reason": "Error"}, format="json").status_code, 200)
+
+        response = self.client.get("/api/v1/reports/card-commissions/")
+        self.assertEqual(response.status_code, 200)
+        by_plan = {row["card_plan_code"]: row for row in response.data["by_plan"]}
+        self.assertEqual(by_plan["NORMAL"]["transactions"], 2)
+        self.assertEqual(by_plan["NORMAL"]["gross_amount"], Decimal("150.05"))
+        self.assertEqual(by_plan["NORMAL"]["commission_amount"], Decimal("3.00"))
+        self.assertEqual(by_plan["NORMAL"]["net_expected_deposit"], Decimal("147.05"))
+        self.assertEqual(by_plan["MSI_3"]["card_plan_label"], msi3.label)
+        self.assertEqual(by_plan["MSI_3"]["transactions"], 1)
+        self.assertEqual(by_plan["MSI_3"]["commission_amount"], Decimal("11.16"))
+        self.assertEqual([row["day"] for row in response.data["by_day"]], [timezone.localdate()] * 2)
+        self.assertEqual(response.data["totals"]["net_expected_deposit"], Decimal("335.89"))
+
+        metrics = self.client.get("/api/v1/metrics/")
+        card_row = metrics.data["payment_breakdown"]["by_method"][0]
+        self.assertEqual(card_row["commission_amount"], Decimal("14.16"))
+
+    def test_sales_export_streams_csv_and_ndjson_rows(self):
+        self.auth_as("cashier", "cashier123")
+        created = self.client.post(
+            "/api/v1/sales/create-and-confirm/",
+            {
+                "lines": [
+                    {
+                        "product": str(self.product.id),
+                        "qty": "2.00",
+                        "unit_price": "100.00",
+                        "unit_cost": "40.00",
+                        "discount_pct": "0.00",
+                    }
+                ],
+                "payments": [{"method": "CASH", "amount": "200.00"}],
+            },
+            format="json",
+        )
+        self.assertEqual(created.status_code, 201)
+
+        self.auth_as("admin", "admin123")
+        today = timezone.localdate().isoformat()
+        response = self.client.get("/api/v1/reports/sales/export/", {"format": "csv", "date_from": today, "date_to": today})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response["Content-Type"].startswith("text/csv"))
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([row["record_type"] for row in rows], ["sale", "line", "profitability", "payment"])
+        self.assertEqual(rows[0]["sale_id"], created.data["id"])
+        self.assertEqual(rows[0]["total"], "200.00")
+        self.assertEqual(rows[1]["sku"], self.product.sku)
+        self.assertEqual(rows[2]["line_revenue"], "200.00")
+        self.assertEqual(rows[3]["method"], "CASH")
+
+        response = self.client.get("/api/v1/reports/sales/export/", {"format": "ndjson"})
+        self.assertEqual(response.status_code, 200)
+        records = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[3], {
+            "record_type": "payment",
+            "sale_id": created.data["id"],
+            "method": "CASH",
+            "amount": "200.00",
+            "card_type": None,
+            "card_plan_code": "",
+            "commission_rate": None,
+        })
+
+        invalid = self.client.get("/api/v1/reports/sales/export/", {"format": "csv", "date_from": "nope"})
+        self.assertEqual(invalid.status_code, 400)
+        self.assertIn("date_from", invalid.json()["fields"])
+
+        self.auth_as("cashier", "cashier123")
+        self.assertEqual(self.client.get("/api/v1/reports/sales/export/").status_code, 403)
+
+    def test_backfill_command_snapshots_legacy_sales_for_investor_split(self):
+        InvestorAssignment.objects.create(
+            investor=self.investor,
+            product=self.product,
+            qty_assigned=Decimal("1.00"),
+            unit_cost=Decimal("40.00"),
+        )
+        legacy_sale = Sale.objects.create(
+            cashier=self.cashier,
+            status=SaleStatus.CONFIRMED,
+            subtotal=Decimal("300.00"),
+            total=Decimal("300.00"),
+            confirmed_at=timezone.now(),
+        )
+        SaleLine.objects.create(
+            sale=legacy_sale,
+            product=self.product,
+            qty=Decimal("3.00"),
+            unit_price=Decimal("100.00"),
+            unit_cost=Decimal("40.00"),
+            discount_pct=Decimal("0.00"),
+        )
+        Payment.objects.create(sale=legacy_sale, method=PaymentMethod.CASH, amount=Decimal("300.00"))
+
+        ledger_count = LedgerEntry.objects.count()
+        call_command("backfill_sale_profitability", stdout=StringIO())
+        call_command("backfill_sale_profitability", stdout=StringIO())
+
+        snapshot = SaleProfitabilitySnapshot.objects.get(sale=legacy_sale)
+        self.assertEqual(snapshot.operating_cost_rate_source, ProfitabilityRateSource.BACKFILL)
+        self.assertEqual(snapshot.lines.count(), 2)
+        self.assertEqual(LedgerEntry.objects.count(), ledger_count)
+
+        self.auth_as("admin", "admin123")
+        response = self.client.get("/api/v1/reports/sales/")
+        self.assertEqual(response.status_code, 200)
+        investor_metrics = response.data["investor_metrics"]
+        self.assertEqual(Decimal(str(investor_metrics["investor_backed_sales_total"])), Decimal("100.00"))
+        self.assertEqual(Decimal(str(investor_metrics["store_owned_sales_total"])), Decimal("200.00"))
+
 
 class ProfitabilityUnitTests(TestCase):
     """Unit tests for pure profitability calculation logic — no HTTP, no fixtures needed."""
@@ -1111,6 +1550,36 @@ class ProfitabilityUnitTests(TestCase):
         result = allocate_proportionally(Decimal("50.00"), [Decimal("7")])
         self.assertEqual(result, [Decimal("50.00")])
 
+    def test_allocate_proportionally_matches_decimal_reference(self):
+        """Randomized equivalence check of the integer-cents kernel against the original Decimal code."""
+        rng = random.Random(20260)
+        for _ in range(20000):
+            size = rng.randint(1, 6)
+            if rng.random() < 0.5:
+                # Small totals and integer weights produce many exact half-cent ties.
+                total = Decimal(rng.randint(-500, 500)).scaleb(-2)
+                weights = [Decimal(rng.randint(0, 30)) for _ in range(size)]
+            else:
+                total = Decimal(rng.randint(0, 10**7)).scaleb(-rng.randint(0, 4))
+                weights = [Decimal(rng.randint(-3, 10**5)).scaleb(-rng.randint(0, 3)) for _ in range(size)]
+            expected = _allocate_proportionally_decimal(total, weights)
+            self.assertEqual(allocate_proportionally(total, weights), expected, msg=f"total={total} weights={weights}")
+
+    def test_allocate_proportionally_many_matches_single_allocations(self):
+        weights = [Decimal("1.50"), Decimal("2"), Decimal("0.25")]
+        totals = [Decimal("100.00"), Decimal("7.31"), Decimal("0.00")]
+        self.assertEqual(
+            allocate_proportionally_many(totals, weights),
+            [allocate_proportionally(total, weights) for total in totals],
+        )
+
+    def test_split_net_profit_matches_half_up_rounding(self):
+        for cents in range(-300, 301):
+            net = Decimal(cents).scaleb(-2)
+            legacy_investor = max(Decimal("0.00"), net * Decimal("0.50")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            self.assertEqual(split_net_profit(net, investor_owned=True), (legacy_investor, net - legacy_investor))
+            self.assertEqual(split_net_profit(net, investor_owned=False), (Decimal("0.00"), net))
+
     # ------------------------------------------------------------------ #
     # _build_line_chunks                                                   #
     # ------------------------------------------------------------------ #
@@ -1336,7 +1805,7 @@ class ProfitabilityChaosTests(TestCase):
         sale, assignment = self._setup_investor_sale()
 
         with mock.patch(
-            "apps.sales.profitability.LedgerEntry.objects.create",
+            "apps.sales.profitability.LedgerEntry.objects.bulk_create",
             side_effect=Exception("DB error simulado"),
         ):
             with self.assertRaises(Exception):
@@ -1356,7 +1825,7 @@ class ProfitabilityChaosTests(TestCase):
         self.assertEqual(assignment.qty_sold, Decimal("2.00"))
 
         with mock.patch(
-            "apps.sales.profitability.LedgerEntry.objects.create",
+            "apps.sales.profitability.LedgerEntry.objects.bulk_create",
             side_effect=Exception("DB error simulado"),
         ):
             with self.assertRaises(Exception):
@@ -1473,3 +1942,145 @@ class CreateAndConfirmTests(APITestCase):
         resp = self.client.post("/api/v1/sales/create-and-confirm/", self._payload(), format="json")
         self.assertEqual(resp.status_code, 201)
         self.assertEqual(resp.data["status"], "CONFIRMED")
+
+
+class LocalDateRangeTests(TestCase):
+    def test_local_date_bounds_are_half_open_utc_instants(self):
+        start, end = local_date_bounds(date(2025, 3, 1), date(2025, 3, 31))
+        self.assertEqual(start, datetime(2025, 3, 1, 6, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(end, datetime(2025, 4, 1, 6, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(local_date_bounds(None, None), (None, None))
+
+    def test_filter_keeps_late_evening_sales_on_their_local_day(self):
+        cashier = User.objects.create_user(username="tz_cashier", password="x", role="CASHIER")
+        late_evening = timezone.make_aware(datetime(2025, 3, 10, 23, 30))
+        sale = Sale.objects.create(cashier=cashier, status=SaleStatus.CONFIRMED, total=Decimal("10.00"), confirmed_at=late_evening)
+        confirmed = Sale.objects.filter(status=SaleStatus.CONFIRMED)
+
+        self.assertEqual(list(filter_local_date_range(confirmed, "confirmed_at", date(2025, 3, 10), date(2025, 3, 10))), [sale])
+        self.assertFalse(filter_local_date_range(confirmed, "confirmed_at", date(2025, 3, 11), None).exists())
+
+    def test_date_range_filters_use_index_range_scans(self):
+        day_from, day_to = date(2025, 1, 1), date(2025, 1, 31)
+        cases = [
+            (Sale.objects.filter(status=SaleStatus.CONFIRMED), "confirmed_at", "sale_status_confirmed_idx"),
+            (Sale.objects.all(), "created_at", "sale_created_idx"),
+            (PurchaseReceipt.objects.filter(status=ReceiptStatus.POSTED), "posted_at", "receipt_status_posted_idx"),
+            (Layaway.objects.all(), "expires_at", "layaway_expires_idx"),
+        ]
+        if connection.vendor == "postgresql":
+            # Empty test tables make a sequential scan cheapest; ask for the plan the index allows.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+        for queryset, column, index_name in cases:
+            with self.subTest(index=index_name):
+                plan = filter_local_date_range(queryset, column, day_from, day_to).explain()
+                self.assertIn(index_name, plan)
+                if connection.vendor == "sqlite":
+                    self.assertIn(f"{column}>?", plan)
+                    self.assertIn(f"{column}<?", plan)
+                elif connection.vendor == "postgresql":
+                    self.assertRegex(plan, rf"Index Cond: .*{column} >=")
+
+
+class SectionExecutorTests(SimpleTestCase):
+    def test_sections_run_concurrently(self):
+        def slow(value):
+            time.sleep(0.2)
+            return value
+
+        started = time.perf_counter()
+        results, timings = run_sections({"a": lambda: slow(1), "b": lambda: slow(2), "c": lambda: slow(3)}, max_workers=3)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(results, {"a": 1, "b": 2, "c": 3})
+        self.assertTrue(all(timing["status"] == "ok" and timing["elapsed_ms"] >= 200 for timing in timings.values()))
+
+    def test_slow_section_raises_timeout_with_timings(self):
+        with self.assertRaises(SectionTimeout) as raised:
+            run_sections({"fast": lambda: 1, "slow": lambda: time.sleep(1)}, max_workers=2, timeout_seconds=0.1)
+        sections = raised.exception.detail["sections"]
+        self.assertEqual(sections["slow"]["status"], "timeout")
+        self.assertEqual(sections["fast"]["status"], "ok")
+
+    def test_errors_propagate(self):
+        def broken():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            run_sections({"ok": lambda: 1, "broken": broken}, max_workers=2)
+
+
+
+class SectionExecutorDatabaseTests(TransactionTestCase):
+    """Sections that query the ORM, run on the pool's threads against committed rows."""
+
+    def test_orm_sections_run_on_their_own_connections(self):
+        cashier = User.objects.create_user(username="sections", password="sections123", role="CASHIER")
+        now = timezone.now()
+        Sale.objects.bulk_create(
+            [Sale(cashier=cashier, status=SaleStatus.CONFIRMED, total=Decimal("100.00"), confirmed_at=now) for _ in range(3)]
+            + [Sale(cashier=cashier, status=SaleStatus.VOID, total=Decimal("50.00"), confirmed_at=now, voided_at=now)]
+        )
+        threads = {}
+
+        def section(name, queryset):
+            threads[name] = threading.current_thread().name
+            return queryset()
+
+        self.assertFalse(connection.in_atomic_block)
+        results, timings = run_sections(
+            {
+                "confirmed_total": lambda: section(
+                    "confirmed_total", lambda: Sale.objects.filter(status=SaleStatus.CONFIRMED).aggregate(total=Sum("total"))["total"]
+                ),
+                "void_count": lambda: section("void_count", lambda: Sale.objects.filter(status=SaleStatus.VOID).count()),
+            },
+            max_workers=2,
+        )
+
+        self.assertEqual(results, {"confirmed_total": Decimal("300.00"), "void_count": 1})
+        self.assertEqual(set(timings), {"confirmed_total", "void_count"})
+        self.assertTrue(all(timing["status"] == "ok" and timing["elapsed_ms"] >= 0 for timing in timings.values()))
+        self.assertTrue(all(name.startswith("report-section") for name in threads.values()))
+
+
+class LoadDataBenchmarkTests(TestCase):
+    def test_generated_data_is_consistent_and_benchmark_writes_baseline(self):
+        call_command(
+            "generate_load_data",
+            "--products=25",
+            "--days=10",
+            "--sales-per-day=4",
+            "--investors=1",
+            "--customers=10",
+            "--void-rate=0.1",
+            stdout=StringIO(),
+        )
+        products = Product.objects.filter(sku__startswith="LOAD-")
+        self.assertEqual(products.count(), 25)
+        stock = products.filter(is_active=True).annotate(stock=Sum("movements__quantity_delta")).values_list("stock", flat=True)
+        self.assertTrue(all(value is not None and value >= 0 for value in stock))
+
+        confirmed = Sale.objects.filter(status=SaleStatus.CONFIRMED)
+        self.assertGreater(confirmed.count(), 0)
+        self.assertEqual(SaleProfitabilitySnapshot.objects.filter(sale__in=confirmed).count(), confirmed.count())
+        self.assertFalse(confirmed.filter(confirmed_at__date__gte=timezone.localdate()).exists())
+        rollup_total = SalesDailyCashierRollup.objects.aggregate(total=Sum("total_sales"))["total"]
+        self.assertEqual(rollup_total, confirmed.aggregate(total=Sum("total"))["total"])
+
+        with self.assertRaises(CommandError):
+            call_command("generate_load_data", "--products=1", "--days=1", stdout=StringIO())
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "baseline.json")
+            call_command("benchmark_endpoints", "--iterations=2", f"--output={path}", stdout=StringIO())
+            with open(path, encoding="utf-8") as handle:
+                baseline = json.load(handle)
+        self.assertEqual(set(baseline["endpoints"]), {"sales_list", "sales_create_and_confirm", "metrics", "sales_report", "products_list", "public_catalog"})
+        for name, stats in baseline["endpoints"].items():
+            self.assertTrue(all(200 <= code < 300 for code in stats["status_codes"]), name)
+            self.assertGreater(stats["queries"], 0, name)
+            self.assertLessEqual(stats["p50_ms"], stats["p95_ms"])
+        self.assertEqual(baseline["endpoints"]["sales_create_and_confirm"]["status_codes"], [201])
+        self.assertTrue(baseline["endpoints"]["metrics"]["slowest_queries"][0]["plan"])
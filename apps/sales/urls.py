@@ -7,7 +7,13 @@ from apps.sales.views import (
     SaleProfitabilityPreviewView,
     SaleViewSet,
 )
-from apps.sales.views_metrics import SalesMetricsView, SalesReportView
+from apps.sales.views_metrics import (
+    CardCommissionReportView,
+    SalesExportView,
+    SalesMetricsCompareView,
+    SalesMetricsView,
+    SalesReportView,
+)
 
 router = DefaultRouter()
 router.register("sales", SaleViewSet, basename="sale")
@@ -17,6 +23,9 @@ urlpatterns = [
     path("sales/preview-profitability/", SaleProfitabilityPreviewView.as_view(), name="sales-preview-profitability"),
     path("profitability/operating-cost-rate/", OperatingCostRateView.as_view(), name="operating-cost-rate"),
     path("metrics/", SalesMetricsView.as_view(), name="sales-metrics"),
+    path("metrics/compare/", SalesMetricsCompareView.as_view(), name="sales-metrics-compare"),
     path("reports/sales/", SalesReportView.as_view(), name="sales-report"),
+    path("reports/sales/export/", SalesExportView.as_view(), name="sales-report-export"),
+    path("reports/card-commissions/", CardCommissionReportView.as_view(), name="card-commission-report"),
 ]
 urlpatterns += router.urls
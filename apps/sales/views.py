@@ -1,15 +1,19 @@
 from datetime import timedelta
 
 from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, prefetch_related_objects
 from django.utils import timezone
-from rest_framework import generics, viewsets
+from rest_framework import generics, serializers, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from apps.accounts.models import UserRole
-from apps.audit.services import record_audit
+from apps.audit.services import record_audit, record_audit_many
+from apps.common.dates import filter_local_date_range
+from apps.common.query_budget import QueryBudget
 from apps.common.permissions import RolePermission
 from apps.inventory.models import InventoryMovement, MovementType
+from apps.layaway.counters import record_credit_changes
 from apps.layaway.models import CustomerCredit, Layaway, LayawayStatus
 from apps.sales.models import CardCommissionPlan, PaymentMethod, Sale, SaleStatus, VoidEvent
 from apps.sales.profitability import (
@@ -18,6 +22,7 @@ from apps.sales.profitability import (
     current_operating_cost_rate_snapshot,
     revert_sale_profitability,
 )
+from apps.sales.rollups import record_sale_rollups
 from apps.sales.serializers import (
     CardCommissionPlanSerializer,
     OperatingCostRateSerializer,
@@ -81,39 +86,86 @@ class SaleViewSet(viewsets.ModelViewSet):
         "void": ["sales.void.own_window"],
         "create_and_confirm": ["sales.create", "sales.confirm"],
     }
+    # Writes are flat in the number of lines: the cart's products, movements, profitability
+    # lines, ledger entries, investor balances and rollup rows are each read or written in one statement.
+    # These are limits the code has to meet, not measurements to raise: create_and_confirm is
+    # auth 2, cart products 1, customer 1, sale/lines/payments/totals 4, prefetch 3, stock lock and
+    # check 2, movements 1, profitability 6, status 1, rollups 3, metrics version 1, audit 1,
+    # response 7, savepoints 6. void is budgeted for the worst case, investor-backed store credit,
+    # and includes the row lock that serialises concurrent voids.
+    query_budgets = {
+        "list": QueryBudget(5),
+        "retrieve": QueryBudget(9),
+        "create": QueryBudget(14),
+        "confirm": QueryBudget(33),
+        "void": QueryBudget(46),
+        "create_and_confirm": QueryBudget(39),
+    }
 
-    def get_queryset(self):
-        qs = (
-            Sale.objects.select_related("cashier", "void_event", "customer")
-            .prefetch_related(
-                "lines",
+    def _base_queryset(self):
+        qs = Sale.objects.select_related("cashier", "void_event", "customer").order_by("-created_at")
+        if self.action == "list":
+            # SaleListSerializer only renders payment summaries; lines and profitability stay unloaded.
+            qs = qs.prefetch_related("payments")
+        else:
+            qs = qs.prefetch_related(
+                "lines__product",
                 "payments__card_commission_plan",
                 "profitability_snapshot__lines__investor",
                 "profitability_snapshot__lines__product",
             )
-            .order_by("-created_at")
-        )
+            customer_sales = Sale.objects.filter(customer_id=OuterRef("customer_id")).order_by().values("customer_id")
+            qs = qs.annotate(
+                customer_sales_count=Subquery(customer_sales.annotate(total=Count("id")).values("total")),
+                customer_confirmed_sales_count=Subquery(
+                    customer_sales.filter(status=SaleStatus.CONFIRMED).annotate(total=Count("id")).values("total")
+                ),
+            )
+        return qs
+
+    def _reloaded(self, sale):
+        """Re-read ``sale`` with the related rows the response needs prefetched in a fixed number of queries."""
+        return self._base_queryset().get(pk=sale.pk)
+
+    def get_queryset(self):
+        qs = self._base_queryset()
         params = self.request.query_params
-        date_from = params.get("date_from")
-        date_to = params.get("date_to")
         status = params.get("status")
         cashier = params.get("cashier")
 
-        if date_from:
-            qs = qs.filter(created_at__date__gte=date_from)
-        if date_to:
-            qs = qs.filter(created_at__date__lte=date_to)
+        qs = filter_local_date_range(
+            qs,
+            "created_at",
+            self._date_param(params, "date_from"),
+            self._date_param(params, "date_to"),
+        )
         if status and status in (SaleStatus.CONFIRMED, SaleStatus.VOID, SaleStatus.DRAFT):
             qs = qs.filter(status=status)
         if cashier:
             qs = qs.filter(cashier__username__icontains=cashier)
         return qs
 
+    @staticmethod
+    def _date_param(params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            return serializers.DateField().to_internal_value(value)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({name: exc.detail}) from exc
+
     def get_serializer_class(self):
         if self.action == "list":
             return SaleListSerializer
         return SaleSerializer
 
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sale = serializer.save()
+        return Response(self.get_serializer(self._reloaded(sale)).data, status=201)
+
     @action(detail=False, methods=["post"], url_path="create-and-confirm")
     def create_and_confirm(self, request):
         """Crea y confirma una venta en una sola transacción atómica.
@@ -125,22 +177,23 @@ class SaleViewSet(viewsets.ModelViewSet):
         try:
             with transaction.atomic():
                 sale = serializer.save()
+                # Credit, movements, profitability and rollups all walk the lines and payments.
+                prefetch_related_objects([sale], "lines__product", "payments")
                 self._apply_customer_credit_if_needed(sale)
-                for line in sale.lines.all():
-                    InventoryMovement.objects.create(
-                        product=line.product,
-                        movement_type=MovementType.OUTBOUND,
-                        quantity_delta=-line.qty,
-                        reference_type="sale_confirm",
-                        reference_id=str(sale.id),
-                        note="Sale confirmation",
-                        created_by=request.user,
-                    )
+                self._record_line_movements(
+                    sale,
+                    movement_type=MovementType.OUTBOUND,
+                    sign=-1,
+                    reference_type="sale_confirm",
+                    note="Sale confirmation",
+                    user=request.user,
+                )
+                sale.confirmed_at = timezone.now()
                 apply_sale_profitability(sale=sale)
 
                 sale.status = SaleStatus.CONFIRMED
-                sale.confirmed_at = timezone.now()
                 sale.save(update_fields=["status", "confirmed_at"])
+                record_sale_rollups(sale=sale)
 
                 if sale.discount_amount > 0:
                     record_audit(
@@ -160,7 +213,7 @@ class SaleViewSet(viewsets.ModelViewSet):
         except ValueError as exc:
             return Response({"code": "invalid_payment", "detail": str(exc), "fields": {}}, status=400)
 
-        return Response(self.get_serializer(sale).data, status=201)
+        return Response(self.get_serializer(self._reloaded(sale)).data, status=201)
 
     @action(detail=True, methods=["post"])
     def confirm(self, request, pk=None):
@@ -173,21 +226,20 @@ class SaleViewSet(viewsets.ModelViewSet):
         try:
             with transaction.atomic():
                 self._apply_customer_credit_if_needed(sale)
-                for line in sale.lines.all():
-                    InventoryMovement.objects.create(
-                        product=line.product,
-                        movement_type=MovementType.OUTBOUND,
-                        quantity_delta=-line.qty,
-                        reference_type="sale_confirm",
-                        reference_id=str(sale.id),
-                        note="Sale confirmation",
-                        created_by=request.user,
-                    )
+                self._record_line_movements(
+                    sale,
+                    movement_type=MovementType.OUTBOUND,
+                    sign=-1,
+                    reference_type="sale_confirm",
+                    note="Sale confirmation",
+                    user=request.user,
+                )
+                sale.confirmed_at = timezone.now()
                 apply_sale_profitability(sale=sale)
 
                 sale.status = SaleStatus.CONFIRMED
-                sale.confirmed_at = timezone.now()
                 sale.save(update_fields=["status", "confirmed_at"])
+                record_sale_rollups(sale=sale)
 
                 if sale.discount_amount > 0:
                     record_audit(
@@ -208,7 +260,7 @@ class SaleViewSet(viewsets.ModelViewSet):
         except ValueError as exc:
             return Response({"code": "invalid_payment", "detail": str(exc), "fields": {}}, status=400)
 
-        return Response(self.get_serializer(sale).data, status=200)
+        return Response(self.get_serializer(self._reloaded(sale)).data, status=200)
 
     @action(detail=True, methods=["post"])
     def void(self, request, pk=None):
@@ -236,35 +288,52 @@ class SaleViewSet(viewsets.ModelViewSet):
         reason = request.data.get("reason", "Sin motivo")
 
         with transaction.atomic():
-            self._restore_customer_credit_if_needed(sale)
-            for line in sale.lines.all():
-                InventoryMovement.objects.create(
-                    product=line.product,
-                    movement_type=MovementType.INBOUND,
-                    quantity_delta=line.qty,
-                    reference_type="sale_void",
-                    reference_id=str(sale.id),
-                    note="Sale void",
-                    created_by=request.user,
+            # Two voids can both pass the check above; the row lock lets only the first one write.
+            if Sale.objects.select_for_update().only("status").get(pk=sale.pk).status != SaleStatus.CONFIRMED:
+                return Response(
+                    {"code": "invalid_state", "detail": "Solo puedes anular ventas confirmadas.", "fields": {}},
+                    status=400,
                 )
+            self._restore_customer_credit_if_needed(sale)
+            self._record_line_movements(
+                sale,
+                movement_type=MovementType.INBOUND,
+                sign=1,
+                reference_type="sale_void",
+                note="Sale void",
+                user=request.user,
+            )
             revert_sale_profitability(sale=sale)
+            record_sale_rollups(sale=sale, sign=-1)
 
-            self._mark_layaway_refunded_if_linked(sale, request.user)
+            audit_records = self._mark_layaway_refunded_if_linked(sale)
 
             sale.status = SaleStatus.VOID
             sale.voided_at = timezone.now()
             sale.save(update_fields=["status", "voided_at"])
             VoidEvent.objects.create(sale=sale, reason=reason, actor=request.user)
 
-            record_audit(
-                actor=request.user,
-                action="sale.void",
-                entity_type="sale",
-                entity_id=sale.id,
-                payload={"reason": reason},
-            )
+            audit_records.append({"action": "sale.void", "entity_type": "sale", "entity_id": sale.id, "payload": {"reason": reason}})
+            record_audit_many(actor=request.user, records=audit_records)
 
-        return Response(self.get_serializer(sale).data, status=200)
+        return Response(self.get_serializer(self._reloaded(sale)).data, status=200)
+
+    @staticmethod
+    def _record_line_movements(sale, *, movement_type, sign, reference_type, note, user):
+        InventoryMovement.bulk_record(
+            [
+                InventoryMovement(
+                    product_id=line.product_id,
+                    movement_type=movement_type,
+                    quantity_delta=sign * line.qty,
+                    reference_type=reference_type,
+                    reference_id=str(sale.id),
+                    note=note,
+                    created_by=user,
+                )
+                for line in sale.lines.all()
+            ]
+        )
 
     @staticmethod
     def _apply_customer_credit_if_needed(sale):
@@ -278,12 +347,14 @@ class SaleViewSet(viewsets.ModelViewSet):
             return
         if not sale.customer_id:
             raise ValueError("La venta no tiene cliente asociado para aplicar saldo a favor.")
-        credit = CustomerCredit.objects.select_for_update().filter(customer=sale.customer).first()
+        credit = CustomerCredit.objects.select_for_update().select_related("customer").filter(customer=sale.customer).first()
         available = credit.balance if credit else Decimal("0.00")
         if credit_amount > available:
             raise ValueError("El saldo a favor del cliente ya no es suficiente para confirmar la venta.")
+        balance_before = credit.balance
         credit.balance = (credit.balance - credit_amount).quantize(Decimal("0.01"))
         credit.save(update_fields=["balance", "updated_at", "customer_name", "customer_phone"])
+        record_credit_changes([(balance_before, credit.balance)])
 
     @staticmethod
     def _restore_customer_credit_if_needed(sale):
@@ -295,7 +366,7 @@ class SaleViewSet(viewsets.ModelViewSet):
         ).quantize(Decimal("0.01"))
         if credit_amount <= 0 or not sale.customer_id:
             return
-        credit = CustomerCredit.objects.select_for_update().filter(customer=sale.customer).first()
+        credit = CustomerCredit.objects.select_for_update().select_related("customer").filter(customer=sale.customer).first()
         if not credit:
             credit = CustomerCredit.objects.create(
                 customer=sale.customer,
@@ -303,28 +374,21 @@ class SaleViewSet(viewsets.ModelViewSet):
                 customer_phone=sale.customer.phone,
                 balance=Decimal("0.00"),
             )
+        balance_before = credit.balance
         credit.balance = (credit.balance + credit_amount).quantize(Decimal("0.01"))
         credit.save(update_fields=["balance", "updated_at", "customer_name", "customer_phone"])
+        record_credit_changes([(balance_before, credit.balance)])
 
     @staticmethod
-    def _mark_layaway_refunded_if_linked(sale, user):
+    def _mark_layaway_refunded_if_linked(sale):
+        """Refund the layaway settled by ``sale``, if any. Returns the audit records to write."""
         layaway = Layaway.objects.select_for_update().filter(settled_sale_id=sale.id).first()
         if not layaway or layaway.status != LayawayStatus.SETTLED:
-            return
+            return []
         layaway.status = LayawayStatus.REFUNDED
         layaway.save(update_fields=["status", "updated_at"])
-        record_audit(
-            actor=user,
-            action="layaway.refund",
-            entity_type="layaway",
-            entity_id=layaway.id,
-            payload={"sale_id": str(sale.id)},
-        )
+        return [{"action": "layaway.refund", "entity_type": "layaway", "entity_id": layaway.id, "payload": {"sale_id": str(sale.id)}}]
 
     @staticmethod
     def _resolve_role(user):
-        group_names = set(user.groups.values_list("name", flat=True))
-        for role in (UserRole.ADMIN, UserRole.CASHIER, UserRole.INVESTOR):
-            if role in group_names:
-                return role
-        return getattr(user, "role", UserRole.CASHIER)
+        return RolePermission._resolve_role(user)
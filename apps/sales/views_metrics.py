@@ -1,27 +1,53 @@
-from collections import defaultdict
+from datetime import date, timedelta
 from decimal import Decimal
 
-from django.db.models import Avg, Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Avg, Count, DecimalField, ExpressionWrapper, F, IntegerField, Sum, Value
 from django.db.models import Q
 from django.db.models.functions import Coalesce, Greatest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import generics
 from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from apps.catalog.models import Product
 from apps.catalog.querysets import with_inventory_metrics
+from apps.common.dates import filter_local_date_range, local_date_bounds
+from apps.common.metrics_cache import cached_metrics_result
 from apps.common.permissions import RolePermission
+from apps.common.rollups import accumulate
+from apps.common.sections import run_sections
 from apps.expenses.models import Expense, ExpenseStatus
+from apps.inventory.valuation import current_inventory_valuation
 from apps.investors.models import InvestorAssignment
 from apps.ledger.models import LedgerEntry, LedgerEntryType
 from apps.purchases.models import PurchaseReceipt, ReceiptStatus
-from apps.sales.models import Payment, PaymentMethod, Sale, SaleLine, SaleProfitabilitySnapshot, SaleStatus
-
-
-class SalesMetricsQuerySerializer(serializers.Serializer):
+from apps.sales.models import (
+    CardCommissionPlan,
+    PaymentMethod,
+    ProfitabilityRateSource,
+    Sale,
+    SaleLineProfitability,
+    SaleProfitabilitySnapshot,
+    SaleStatus,
+    SalesDailyCashierRollup,
+    SalesDailyPaymentRollup,
+    SalesDailyProductRollup,
+)
+from apps.sales.exports import SalesCSVExportRenderer, SalesNDJSONExportRenderer, iter_sale_export_rows
+from apps.sales.profitability import money
+from apps.sales.rollups import collect_sales_facts
+
+
+CACHE_STATUS_HEADER = "X-Metrics-Cache"
+
+
+class SalesDateRangeQuerySerializer(serializers.Serializer):
     date_from = serializers.DateField(required=False)
     date_to = serializers.DateField(required=False)
-    top_limit = serializers.IntegerField(required=False, min_value=1, max_value=50, default=10)
 
     def validate(self, attrs):
         date_from = attrs.get("date_from")
@@ -31,125 +57,215 @@ class SalesMetricsQuerySerializer(serializers.Serializer):
         return attrs
 
 
+class SalesMetricsQuerySerializer(SalesDateRangeQuerySerializer):
+    top_limit = serializers.IntegerField(required=False, min_value=1, max_value=50, default=10)
+
+
+class DateWindowField(serializers.Field):
+    """A ``YYYY-MM`` month or an inclusive ``YYYY-MM-DD..YYYY-MM-DD`` range, as ``(date_from, date_to)``."""
+
+    default_error_messages = {
+        "invalid": "Use YYYY-MM or YYYY-MM-DD..YYYY-MM-DD.",
+        "order": "The range start must be before or equal to its end.",
+    }
+
+    def to_internal_value(self, data):
+        value = str(data).strip()
+        try:
+            if ".." in value:
+                start, end = (date.fromisoformat(part.strip()) for part in value.split("..", 1))
+            else:
+                start = date.fromisoformat(f"{value}-01")
+                end = date(start.year + start.month // 12, start.month % 12 + 1, 1) - timedelta(days=1)
+        except ValueError:
+            self.fail("invalid")
+        if start > end:
+            self.fail("order")
+        return start, end
+
+    def to_representation(self, value):
+        return {"date_from": value[0], "date_to": value[1]}
+
+
+class SalesMetricsCompareQuerySerializer(serializers.Serializer):
+    period = DateWindowField()
+    previous = DateWindowField(required=False)
+
+    def validate(self, attrs):
+        if "previous" not in attrs:
+            period_from, period_to = attrs["period"]
+            if period_from.day == 1 and (period_to + timedelta(days=1)).day == 1:
+                # Whole months compare against the same number of preceding calendar months.
+                months = (period_to.year - period_from.year) * 12 + period_to.month - period_from.month + 1
+                previous_to = period_from - timedelta(days=1)
+                month_index = previous_to.year * 12 + previous_to.month - months
+                attrs["previous"] = (date(month_index // 12, month_index % 12 + 1, 1), previous_to)
+            else:
+                length = period_to - period_from
+                previous_to = period_from - timedelta(days=1)
+                attrs["previous"] = (previous_to - length, previous_to)
+        return attrs
+
+
 class SalesMetricsMixin:
     permission_classes = [RolePermission]
     capability_map = {"get": ["metrics.view"]}
 
     @staticmethod
     def _apply_date_range(queryset, date_from, date_to):
+        return filter_local_date_range(queryset, "confirmed_at", date_from, date_to)
+
+    @staticmethod
+    def _live_day(date_from, date_to):
+        if not settings.SALES_ROLLUP_LIVE_TODAY:
+            return None
+        today = timezone.localdate()
+        if (date_from and date_from > today) or (date_to and date_to < today):
+            return None
+        return today
+
+    @staticmethod
+    def _rollup_queryset(model, date_from, date_to, live_day):
+        queryset = model.objects.all()
         if date_from:
-            queryset = queryset.filter(confirmed_at__date__gte=date_from)
+            queryset = queryset.filter(day__gte=date_from)
         if date_to:
-            queryset = queryset.filter(confirmed_at__date__lte=date_to)
+            queryset = queryset.filter(day__lte=date_to)
+        if live_day:
+            queryset = queryset.exclude(day=live_day)
         return queryset
 
-    @staticmethod
-    def _line_net_amount():
-        return ExpressionWrapper(
-            F("qty") * F("unit_price") * (Value(Decimal("1.00")) - (F("discount_pct") / Value(Decimal("100.00")))),
-            output_field=DecimalField(max_digits=16, decimal_places=2),
-        )
+    def _sales_facts_for(self, date_from, date_to):
+        """Group the daily rollups over the range; today's sales are folded in live when enabled."""
+        live_day = self._live_day(date_from, date_to)
+        facts = {"by_day": {}, "by_cashier": {}, "by_product": {}, "by_payment": {}}
+
+        cashier_rollups = self._rollup_queryset(SalesDailyCashierRollup, date_from, date_to, live_day)
+        cashier_totals = {"sales_count": Sum("sales_count"), "total_sales": Sum("total_sales")}
+        for row in cashier_rollups.values("day").annotate(**cashier_totals).order_by():
+            accumulate(facts["by_day"], row.pop("day"), **row)
+        for row in cashier_rollups.values("cashier_id").annotate(**cashier_totals).order_by():
+            accumulate(facts["by_cashier"], row.pop("cashier_id"), **row)
+        product_rollups = self._rollup_queryset(SalesDailyProductRollup, date_from, date_to, live_day)
+        for row in (
+            product_rollups.values("product_id")
+            .annotate(units_sold=Sum("units_sold"), sales_amount=Sum("sales_amount"), cost_amount=Sum("cost_amount"))
+            .order_by()
+        ):
+            accumulate(facts["by_product"], row.pop("product_id"), **row)
+        payment_rollups = self._rollup_queryset(SalesDailyPaymentRollup, date_from, date_to, live_day)
+        for row in (
+            payment_rollups.values("method", "card_type")
+            .annotate(
+                transactions=Sum("transactions"),
+                total_amount=Sum("total_amount"),
+                commission_amount=Sum("commission_amount"),
+            )
+            .order_by()
+        ):
+            accumulate(facts["by_payment"], (row.pop("method"), row.pop("card_type")), **row)
 
-    @staticmethod
-    def _line_cost_amount():
-        return ExpressionWrapper(
-            F("qty") * F("unit_cost"),
-            output_field=DecimalField(max_digits=16, decimal_places=2),
-        )
+        if live_day:
+            live = collect_sales_facts(
+                self._apply_date_range(Sale.objects.filter(status=SaleStatus.CONFIRMED), live_day, live_day)
+            )
+            for (_, cashier_id), deltas in live.cashiers.items():
+                accumulate(facts["by_day"], live_day, **deltas)
+                accumulate(facts["by_cashier"], cashier_id, **deltas)
+            for (_, product_id), deltas in live.products.items():
+                accumulate(facts["by_product"], product_id, **deltas)
+            for (_, method, card_type, _), deltas in live.payments.items():
+                accumulate(facts["by_payment"], (method, card_type), **deltas)
+        return facts
 
     @staticmethod
-    def _summary_for(confirmed_sales):
-        return confirmed_sales.aggregate(
-            total_sales=Coalesce(
-                Sum("total"),
-                Value(Decimal("0.00")),
-                output_field=DecimalField(max_digits=16, decimal_places=2),
-            ),
-            avg_ticket=Coalesce(
-                Avg("total"),
-                Value(Decimal("0.00")),
-                output_field=DecimalField(max_digits=16, decimal_places=2),
-            ),
-            sales_count=Count("id"),
-        )
+    def _summary_for(facts):
+        sales_count = sum(int(row["sales_count"]) for row in facts["by_day"].values())
+        total_sales = money(sum((row["total_sales"] for row in facts["by_day"].values()), Decimal("0.00")))
+        return {
+            "total_sales": total_sales,
+            "avg_ticket": money(total_sales / sales_count) if sales_count else Decimal("0.00"),
+            "sales_count": sales_count,
+        }
 
     @staticmethod
-    def _top_products_for(confirmed_sales, top_limit):
-        return list(
-            SaleLine.objects.filter(sale__in=confirmed_sales)
-            .values("product_id", "product__sku", "product__name")
-            .annotate(
-                units_sold=Coalesce(Sum("qty"), 0, output_field=DecimalField(max_digits=12, decimal_places=2)),
-                sales_amount=Coalesce(
-                    Sum(SalesMetricsMixin._line_net_amount()),
-                    0,
-                    output_field=DecimalField(max_digits=16, decimal_places=2),
-                ),
-            )
-            .order_by("-units_sold", "-sales_amount")[:top_limit]
-        )
+    def _top_products_for(facts, top_limit):
+        ranked = sorted(
+            ((product_id, row) for product_id, row in facts["by_product"].items() if row["units_sold"] > 0),
+            key=lambda item: (-item[1]["units_sold"], -item[1]["sales_amount"]),
+        )[:top_limit]
+        products = Product.objects.in_bulk([product_id for product_id, _ in ranked])
+        return [
+            {
+                "product_id": product_id,
+                "product__sku": products[product_id].sku,
+                "product__name": products[product_id].name,
+                "units_sold": money(row["units_sold"]),
+                "sales_amount": money(row["sales_amount"]),
+            }
+            for product_id, row in ranked
+        ]
 
     @staticmethod
-    def _gross_profit_for(confirmed_sales):
-        profit_expr = ExpressionWrapper(
-            SalesMetricsMixin._line_net_amount() - SalesMetricsMixin._line_cost_amount(),
-            output_field=DecimalField(max_digits=16, decimal_places=2),
+    def _gross_profit_for(facts):
+        return money(
+            sum((row["sales_amount"] - row["cost_amount"] for row in facts["by_product"].values()), Decimal("0.00"))
         )
-        return SaleLine.objects.filter(sale__in=confirmed_sales).aggregate(
-            gross_profit=Coalesce(
-                Sum(profit_expr),
-                Value(Decimal("0.00")),
-                output_field=DecimalField(max_digits=16, decimal_places=2),
-            )
-        )["gross_profit"]
 
     @staticmethod
-    def _payment_breakdown_for(confirmed_sales):
-        by_method = list(
-            Payment.objects.filter(sale__in=confirmed_sales)
-            .values("method")
-            .annotate(
-                total_amount=Coalesce(Sum("amount"), 0, output_field=DecimalField(max_digits=16, decimal_places=2)),
-                transactions=Count("id"),
-            )
-            .order_by("method")
-        )
-        card_types = list(
-            Payment.objects.filter(sale__in=confirmed_sales, method=PaymentMethod.CARD)
-            .values("card_type")
-            .annotate(
-                total_amount=Coalesce(Sum("amount"), 0, output_field=DecimalField(max_digits=16, decimal_places=2)),
-                transactions=Count("id"),
-            )
-            .order_by("card_type")
-        )
+    def _payment_breakdown_for(facts):
+        by_method = {}
+        card_types = {}
+        for (method, card_type), row in facts["by_payment"].items():
+            if not row["transactions"]:
+                continue
+            accumulate(by_method, method, **row)
+            if method == PaymentMethod.CARD:
+                accumulate(card_types, card_type or None, **row)
         return {
-            "by_method": by_method,
-            "card_types": card_types,
+            "by_method": [
+                {
+                    "method": method,
+                    "total_amount": money(row["total_amount"]),
+                    "transactions": int(row["transactions"]),
+                    "commission_amount": money(row["commission_amount"]),
+                }
+                for method, row in sorted(by_method.items())
+            ],
+            "card_types": [
+                {
+                    "card_type": card_type,
+                    "total_amount": money(row["total_amount"]),
+                    "transactions": int(row["transactions"]),
+                    "commission_amount": money(row["commission_amount"]),
+                }
+                for card_type, row in sorted(card_types.items(), key=lambda item: (item[0] is None, item[0] or ""))
+            ],
         }
 
     @staticmethod
-    def _sales_by_day(confirmed_sales):
-        return list(
-            confirmed_sales.values("confirmed_at__date")
-            .annotate(
-                total_sales=Coalesce(Sum("total"), Value(Decimal("0.00")), output_field=DecimalField(max_digits=16, decimal_places=2)),
-                sales_count=Count("id"),
-            )
-            .order_by("confirmed_at__date")
-        )
+    def _sales_by_day(facts):
+        return [
+            {"confirmed_at__date": day, "total_sales": money(row["total_sales"]), "sales_count": int(row["sales_count"])}
+            for day, row in sorted(facts["by_day"].items())
+            if row["sales_count"]
+        ]
 
     @staticmethod
-    def _sales_by_cashier(confirmed_sales):
-        return list(
-            confirmed_sales.values("cashier_id", "cashier__username")
-            .annotate(
-                total_sales=Coalesce(Sum("total"), Value(Decimal("0.00")), output_field=DecimalField(max_digits=16, decimal_places=2)),
-                sales_count=Count("id"),
-                avg_ticket=Coalesce(Avg("total"), Value(Decimal("0.00")), output_field=DecimalField(max_digits=16, decimal_places=2)),
-            )
-            .order_by("-total_sales")
-        )
+    def _sales_by_cashier(facts):
+        rows = {cashier_id: row for cashier_id, row in facts["by_cashier"].items() if row["sales_count"]}
+        usernames = dict(get_user_model().objects.filter(id__in=rows).values_list("id", "username"))
+        by_cashier = [
+            {
+                "cashier_id": cashier_id,
+                "cashier__username": usernames.get(cashier_id),
+                "total_sales": money(row["total_sales"]),
+                "sales_count": int(row["sales_count"]),
+                "avg_ticket": money(row["total_sales"] / row["sales_count"]),
+            }
+            for cashier_id, row in rows.items()
+        ]
+        return sorted(by_cashier, key=lambda row: row["total_sales"], reverse=True)
 
     @staticmethod
     def _expenses_queryset(date_from, date_to):
@@ -188,12 +304,12 @@ class SalesMetricsMixin:
 
     @staticmethod
     def _purchase_receipts_queryset(date_from, date_to):
-        queryset = PurchaseReceipt.objects.filter(status=ReceiptStatus.POSTED)
-        if date_from:
-            queryset = queryset.filter(posted_at__date__gte=date_from)
-        if date_to:
-            queryset = queryset.filter(posted_at__date__lte=date_to)
-        return queryset
+        return filter_local_date_range(
+            PurchaseReceipt.objects.filter(status=ReceiptStatus.POSTED),
+            "posted_at",
+            date_from,
+            date_to,
+        )
 
     @staticmethod
     def _purchase_summary(receipts):
@@ -208,12 +324,7 @@ class SalesMetricsMixin:
 
     @staticmethod
     def _assignments_queryset(date_from=None, date_to=None):
-        queryset = InvestorAssignment.objects.select_related("product")
-        if date_from:
-            queryset = queryset.filter(created_at__date__gte=date_from)
-        if date_to:
-            queryset = queryset.filter(created_at__date__lte=date_to)
-        return queryset
+        return filter_local_date_range(InvestorAssignment.objects.select_related("product"), "created_at", date_from, date_to)
 
     @staticmethod
     def _investor_profit_share_total(confirmed_sales):
@@ -244,11 +355,14 @@ class SalesMetricsMixin:
                 output_field=DecimalField(max_digits=16, decimal_places=2),
             ),
             operating_cost_rate_avg=Coalesce(
-                Avg("operating_cost_rate_snapshot"),
+                Avg(
+                    "operating_cost_rate_snapshot",
+                    filter=~Q(operating_cost_rate_source=ProfitabilityRateSource.BACKFILL),
+                ),
                 Value(Decimal("0.0000")),
                 output_field=DecimalField(max_digits=6, decimal_places=4),
             ),
-            fallback_usage_count=Count("id", filter=Q(operating_cost_rate_source="FALLBACK_BASE")),
+            fallback_usage_count=Count("id", filter=Q(operating_cost_rate_source=ProfitabilityRateSource.FALLBACK_BASE)),
             investor_profit_total=Coalesce(
                 Sum("investor_profit_total"),
                 Value(Decimal("0.00")),
@@ -263,62 +377,33 @@ class SalesMetricsMixin:
         summary["snapshots_count"] = snapshots.count()
         return summary
 
-    @classmethod
-    def _investor_sales_split(cls, *, date_to, confirmed_sales):
-        replay_sales = Sale.objects.filter(status=SaleStatus.CONFIRMED)
-        if date_to:
-            replay_sales = replay_sales.filter(confirmed_at__date__lte=date_to)
-        replay_sales = replay_sales.prefetch_related("lines").order_by("confirmed_at", "created_at")
-
-        range_sale_ids = {str(sale_id) for sale_id in confirmed_sales.values_list("id", flat=True)}
-        if not range_sale_ids:
-            return {
-                "investor_backed_sales_total": Decimal("0.00"),
-                "store_owned_sales_total": Decimal("0.00"),
-            }
-
-        assignments_by_product = defaultdict(list)
-        for assignment in cls._assignments_queryset(date_to=date_to).order_by("created_at", "id"):
-            assignments_by_product[str(assignment.product_id)].append(assignment)
-
-        consumed_by_assignment = defaultdict(lambda: Decimal("0.00"))
-        investor_backed_sales_total = Decimal("0.00")
-        store_owned_sales_total = Decimal("0.00")
-
-        for sale in replay_sales:
-            for line in sale.lines.all():
-                line_amount = line.qty * line.unit_price
-                line_discount = line_amount * line.discount_pct / Decimal("100.00")
-                line_net_revenue = line_amount - line_discount
-                remaining_qty = line.qty
-                consumed_revenue = Decimal("0.00")
-
-                for assignment in assignments_by_product.get(str(line.product_id), []):
-                    if assignment.created_at > sale.confirmed_at:
-                        continue
-
-                    available = assignment.qty_assigned - consumed_by_assignment[str(assignment.id)]
-                    if available <= 0 or remaining_qty <= 0:
-                        continue
-
-                    consumed = min(available, remaining_qty)
-                    consumed_by_assignment[str(assignment.id)] += consumed
-                    remaining_qty -= consumed
-                    consumed_revenue += line_net_revenue * (consumed / line.qty)
-
-                if str(sale.id) not in range_sale_ids:
-                    continue
-
-                investor_backed_sales_total += consumed_revenue
-                store_owned_sales_total += line_net_revenue - consumed_revenue
+    @staticmethod
+    def _investor_sales_split(confirmed_sales):
+        ownership = SaleLineProfitability.Ownership
+        split = SaleLineProfitability.objects.filter(snapshot__sale__in=confirmed_sales).aggregate(
+            investor_backed_sales_total=Coalesce(
+                Sum("line_revenue", filter=Q(ownership=ownership.INVESTOR)),
+                Value(Decimal("0.00")),
+                output_field=DecimalField(max_digits=16, decimal_places=2),
+            ),
+            store_owned_sales_total=Coalesce(
+                Sum("line_revenue", filter=Q(ownership=ownership.STORE)),
+                Value(Decimal("0.00")),
+                output_field=DecimalField(max_digits=16, decimal_places=2),
+            ),
+        )
+        return {key: Decimal(str(value)).quantize(Decimal("0.01")) for key, value in split.items()}
 
-        return {
-            "investor_backed_sales_total": investor_backed_sales_total.quantize(Decimal("0.01")),
-            "store_owned_sales_total": store_owned_sales_total.quantize(Decimal("0.01")),
-        }
+    @classmethod
+    def _inventory_snapshot(cls):
+        """Latest nightly valuation plus live deltas; full live computation until the first snapshot exists."""
+        valuation = current_inventory_valuation()
+        if valuation is not None:
+            return valuation
+        return {**cls._live_inventory_snapshot(), "snapshot_taken_at": None}
 
     @staticmethod
-    def _inventory_snapshot():
+    def _live_inventory_snapshot():
         store_owned_units_expr = Greatest(F("stock") - F("investor_reserved_qty"), Value(Decimal("0.00")))
         store_owned_cost_expr = ExpressionWrapper(
             store_owned_units_expr * Coalesce(F("cost_price"), Value(Decimal("0.00"))),
@@ -418,21 +503,32 @@ class SalesMetricsMixin:
         )
         return snapshot
 
-    def _build_metrics_payload(self, params):
-        date_from = params.get("date_from")
-        date_to = params.get("date_to")
-        confirmed_sales = self._apply_date_range(
-            Sale.objects.filter(status=SaleStatus.CONFIRMED),
-            date_from,
-            date_to,
-        )
-        purchases = self._purchase_receipts_queryset(date_from, date_to)
-        purchase_summary = self._purchase_summary(purchases)
-        gross_profit_total = self._gross_profit_for(confirmed_sales)
-        investor_profit_share_total_legacy = self._investor_profit_share_total(confirmed_sales)
-        profitability_summary = self._profitability_summary_for(confirmed_sales)
-        sales_split = self._investor_sales_split(date_to=date_to, confirmed_sales=confirmed_sales)
-        investor_assignment_summary = self._assignments_queryset(date_from=date_from, date_to=date_to).aggregate(
+    def _metrics_response(self, payload, cache_status):
+        # The inventory snapshot reflects current stock rather than the requested range,
+        # so it is never served from the result cache.
+        results, timings = run_sections({"inventory_snapshot": self._inventory_snapshot})
+        response = Response({**payload, **results, "section_timings": {**payload["section_timings"], **timings}})
+        response[CACHE_STATUS_HEADER] = cache_status
+        return response
+
+    def _confirmed_sales(self, date_from, date_to):
+        return self._apply_date_range(Sale.objects.filter(status=SaleStatus.CONFIRMED), date_from, date_to)
+
+    def _sales_section(self, date_from, date_to, top_limit, include_series=False):
+        sales_facts = self._sales_facts_for(date_from, date_to)
+        section = {
+            "summary": self._summary_for(sales_facts),
+            "gross_profit": self._gross_profit_for(sales_facts),
+            "top_products": self._top_products_for(sales_facts, top_limit),
+            "payment_breakdown": self._payment_breakdown_for(sales_facts),
+        }
+        if include_series:
+            section["sales_by_day"] = self._sales_by_day(sales_facts)
+            section["sales_by_cashier"] = self._sales_by_cashier(sales_facts)
+        return section
+
+    def _assignment_summary(self, date_from, date_to):
+        return self._assignments_queryset(date_from=date_from, date_to=date_to).aggregate(
             inventory_cost_assigned_to_investors=Coalesce(
                 Sum(
                     ExpressionWrapper(
@@ -444,8 +540,35 @@ class SalesMetricsMixin:
                 output_field=DecimalField(max_digits=16, decimal_places=2),
             ),
         )
+
+    def _metrics_sections(self, params, include_series=False):
+        """Independent queries behind the metrics payload, keyed by section name.
+
+        Every section builds its own querysets so they can run on separate threads.
+        """
+        date_from = params.get("date_from")
+        date_to = params.get("date_to")
+        return {
+            "sales": lambda: self._sales_section(date_from, date_to, params["top_limit"], include_series),
+            "purchases": lambda: self._purchase_summary(self._purchase_receipts_queryset(date_from, date_to)),
+            "investor_profit_share_legacy": lambda: self._investor_profit_share_total(
+                self._confirmed_sales(date_from, date_to)
+            ),
+            "profitability": lambda: self._profitability_summary_for(self._confirmed_sales(date_from, date_to)),
+            "investor_sales_split": lambda: self._investor_sales_split(self._confirmed_sales(date_from, date_to)),
+            "investor_assignments": lambda: self._assignment_summary(date_from, date_to),
+            "confirmed_sales_count": lambda: self._confirmed_sales(date_from, date_to).count(),
+        }
+
+    def _compose_metrics_payload(self, params, results):
+        sales = results["sales"]
+        purchase_summary = results["purchases"]
+        gross_profit_total = sales["gross_profit"]
+        investor_profit_share_total_legacy = results["investor_profit_share_legacy"]
+        profitability_summary = results["profitability"]
+        investor_assignment_summary = results["investor_assignments"]
         snapshots_count = int(profitability_summary["snapshots_count"] or 0)
-        sales_count = int(confirmed_sales.count())
+        sales_count = int(results["confirmed_sales_count"])
         all_sales_have_snapshot = sales_count > 0 and snapshots_count == sales_count
         if all_sales_have_snapshot:
             investor_profit_share_total = Decimal(str(profitability_summary["investor_profit_total"])).quantize(Decimal("0.01"))
@@ -461,60 +584,287 @@ class SalesMetricsMixin:
         ).quantize(Decimal("0.01"))
 
         return {
-            **self._summary_for(confirmed_sales),
+            **sales["summary"],
             "gross_profit": gross_profit_total,
             "gross_profit_total": gross_profit_total,
             **purchase_summary,
-            "inventory_snapshot": self._inventory_snapshot(),
             "investor_metrics": {
-                **sales_split,
+                **results["investor_sales_split"],
                 "investor_profit_share_total": investor_profit_share_total,
                 "store_profit_share_total": store_profit_share_total,
                 "inventory_cost_assigned_to_investors": investor_assignment_summary["inventory_cost_assigned_to_investors"],
                 "store_net_inventory_exposure_change": store_net_inventory_exposure_change,
             },
-            "range": {"date_from": date_from, "date_to": date_to},
-            "top_products": self._top_products_for(confirmed_sales, params["top_limit"]),
-            "payment_breakdown": self._payment_breakdown_for(confirmed_sales),
+            "range": {"date_from": params.get("date_from"), "date_to": params.get("date_to")},
+            "top_products": sales["top_products"],
+            "payment_breakdown": sales["payment_breakdown"],
             "profitability_metrics": {
                 "operating_cost_rate_avg": profitability_summary["operating_cost_rate_avg"],
                 "operating_cost_total_allocated": profitability_summary["operating_cost_total_allocated"],
                 "fallback_usage_count": profitability_summary["fallback_usage_count"] if all_sales_have_snapshot else 0,
             },
-        }, confirmed_sales, store_profit_share_total
+        }, store_profit_share_total
+
+    def _build_metrics_payload(self, params):
+        results, timings = run_sections(self._metrics_sections(params))
+        payload, _ = self._compose_metrics_payload(params, results)
+        return {**payload, "section_timings": timings}
 
 
 class SalesMetricsView(SalesMetricsMixin, generics.GenericAPIView):
     def get(self, request, *args, **kwargs):
         query_serializer = SalesMetricsQuerySerializer(data=request.query_params)
         query_serializer.is_valid(raise_exception=True)
-        metrics_payload, _, _ = self._build_metrics_payload(query_serializer.validated_data)
-        return Response(metrics_payload)
+        params = query_serializer.validated_data
+        metrics_payload, cache_status = cached_metrics_result(
+            "metrics",
+            params,
+            lambda: self._build_metrics_payload(params),
+        )
+        return self._metrics_response(metrics_payload, cache_status)
 
 
 class SalesReportView(SalesMetricsMixin, generics.GenericAPIView):
     def get(self, request, *args, **kwargs):
         query_serializer = SalesMetricsQuerySerializer(data=request.query_params)
         query_serializer.is_valid(raise_exception=True)
-        metrics_payload, confirmed_sales, store_profit_share_total = self._build_metrics_payload(query_serializer.validated_data)
-        expenses = self._expenses_queryset(
-            query_serializer.validated_data.get("date_from"),
-            query_serializer.validated_data.get("date_to"),
+        params = query_serializer.validated_data
+        report_payload, cache_status = cached_metrics_result(
+            "sales-report",
+            params,
+            lambda: self._build_report_payload(params),
         )
-        expense_summary = self._expenses_summary(expenses)
-        report_payload = {
+        return self._metrics_response(report_payload, cache_status)
+
+    def _build_report_payload(self, params):
+        def expenses_section():
+            expenses = self._expenses_queryset(params.get("date_from"), params.get("date_to"))
+            return {**self._expenses_summary(expenses), "by_category": self._expenses_by_category(expenses)}
+
+        results, timings = run_sections({**self._metrics_sections(params, include_series=True), "expenses": expenses_section})
+        metrics_payload, store_profit_share_total = self._compose_metrics_payload(params, results)
+        expenses_summary = results["expenses"]
+        return {
             **metrics_payload,
-            "sales_by_day": self._sales_by_day(confirmed_sales),
-            "sales_by_cashier": self._sales_by_cashier(confirmed_sales),
-            "expenses_summary": {
-                **expense_summary,
-                "by_category": self._expenses_by_category(expenses),
-            },
+            "sales_by_day": results["sales"]["sales_by_day"],
+            "sales_by_cashier": results["sales"]["sales_by_cashier"],
+            "expenses_summary": expenses_summary,
             "net_sales_after_expenses": (
-                Decimal(str(metrics_payload["total_sales"])) - Decimal(str(expense_summary["total_expenses"]))
+                Decimal(str(metrics_payload["total_sales"])) - Decimal(str(expenses_summary["total_expenses"]))
             ).quantize(Decimal("0.01")),
             "net_profit": (
-                Decimal(str(store_profit_share_total)) - Decimal(str(expense_summary["total_expenses"]))
+                Decimal(str(store_profit_share_total)) - Decimal(str(expenses_summary["total_expenses"]))
             ).quantize(Decimal("0.01")),
+            "section_timings": timings,
+        }
+
+
+class SalesExportView(SalesMetricsMixin, generics.GenericAPIView):
+    """Stream confirmed sales with their lines, profitability and payments as CSV or NDJSON.
+
+    The format is chosen with ``?format=csv|ndjson`` (CSV by default).
+    """
+
+    renderer_classes = [SalesCSVExportRenderer, SalesNDJSONExportRenderer]
+
+    def handle_exception(self, exc):
+        # Errors are reported as regular JSON even when an export format was negotiated.
+        self.request.accepted_renderer = JSONRenderer()
+        self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    def get(self, request, *args, **kwargs):
+        query_serializer = SalesDateRangeQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        date_from = query_serializer.validated_data.get("date_from")
+        date_to = query_serializer.validated_data.get("date_to")
+        sales = self._apply_date_range(Sale.objects.filter(status=SaleStatus.CONFIRMED), date_from, date_to)
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(iter_sale_export_rows(sales)),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        filename = f"ventas_{date_from or 'inicio'}_{date_to or 'hoy'}.{renderer.format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class SalesMetricsCompareView(SalesMetricsMixin, generics.GenericAPIView):
+    """Compare two date windows; each section computes both windows in a single grouped query.
+
+    Sales and gross profit come from the daily rollups, investor/store shares from the
+    profitability snapshots (see ``backfill_sale_profitability`` for legacy sales) and
+    expenses from paid expenses.
+    """
+
+    WINDOWS = ("period", "previous")
+    METRICS = (
+        "total_sales",
+        "sales_count",
+        "gross_profit",
+        "investor_profit_share_total",
+        "store_profit_share_total",
+        "total_expenses",
+        "net_profit",
+    )
+
+    def get(self, request, *args, **kwargs):
+        query_serializer = SalesMetricsCompareQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        windows = {label: query_serializer.validated_data[label] for label in self.WINDOWS}
+        cache_params = {
+            f"{label}_{bound}": value
+            for label, window in windows.items()
+            for bound, value in zip(("from", "to"), window)
+        }
+        cache_params["date_to"] = max(window[1] for window in windows.values())
+        payload, cache_status = cached_metrics_result("metrics-compare", cache_params, lambda: self._build_compare_payload(windows))
+        response = Response(payload)
+        response[CACHE_STATUS_HEADER] = cache_status
+        return response
+
+    @staticmethod
+    def _day_window(field, window):
+        return Q(**{f"{field}__gte": window[0], f"{field}__lte": window[1]})
+
+    @staticmethod
+    def _instant_window(field, window):
+        start, end = local_date_bounds(*window)
+        return Q(**{f"{field}__gte": start, f"{field}__lt": end})
+
+    def _windowed_totals(self, queryset, window_q, fields):
+        """Aggregate ``fields`` once per window in one query using ``FILTER``/``CASE`` sums."""
+        aggregates = {}
+        for label in self.WINDOWS:
+            for name, (expression, output_field) in fields.items():
+                aggregates[f"{label}__{name}"] = Coalesce(
+                    Sum(expression, filter=window_q[label]),
+                    Value(0, output_field=output_field),
+                    output_field=output_field,
+                )
+        covering = window_q[self.WINDOWS[0]]
+        for label in self.WINDOWS[1:]:
+            covering |= window_q[label]
+        row = queryset.filter(covering).aggregate(**aggregates)
+        return {label: {name: row[f"{label}__{name}"] for name in fields} for label in self.WINDOWS}
+
+    def _build_compare_payload(self, windows):
+        money_field = DecimalField(max_digits=16, decimal_places=2)
+        day_windows = {label: self._day_window("day", window) for label, window in windows.items()}
+        results, timings = run_sections(
+            {
+                "sales": lambda: self._windowed_totals(
+                    SalesDailyCashierRollup.objects.all(),
+                    day_windows,
+                    {
+                        "total_sales": ("total_sales", money_field),
+                        "sales_count": ("sales_count", IntegerField()),
+                    },
+                ),
+                "gross_profit": lambda: self._windowed_totals(
+                    SalesDailyProductRollup.objects.all(),
+                    day_windows,
+                    {"gross_profit": (F("sales_amount") - F("cost_amount"), money_field)},
+                ),
+                "profit_shares": lambda: self._windowed_totals(
+                    SaleProfitabilitySnapshot.objects.filter(sale__status=SaleStatus.CONFIRMED),
+                    {label: self._instant_window("sale__confirmed_at", window) for label, window in windows.items()},
+                    {
+                        "investor_profit_share_total": ("investor_profit_total", money_field),
+                        "store_profit_share_total": ("store_profit_total", money_field),
+                    },
+                ),
+                "expenses": lambda: self._windowed_totals(
+                    Expense.objects.filter(status=ExpenseStatus.PAID),
+                    {label: self._day_window("expense_date", window) for label, window in windows.items()},
+                    {"total_expenses": ("amount", money_field)},
+                ),
+            }
+        )
+
+        totals = {label: {} for label in self.WINDOWS}
+        for section in results.values():
+            for label, values in section.items():
+                totals[label].update(values)
+        for values in totals.values():
+            for name, value in values.items():
+                values[name] = value if name == "sales_count" else money(Decimal(str(value)))
+            values["net_profit"] = money(values["store_profit_share_total"] - values["total_expenses"])
+
+        return {
+            **{label: {"date_from": windows[label][0], "date_to": windows[label][1]} for label in self.WINDOWS},
+            "metrics": {name: self._comparison(totals["period"][name], totals["previous"][name]) for name in self.METRICS},
+            "section_timings": timings,
+        }
+
+    @staticmethod
+    def _comparison(current, previous):
+        delta = current - previous
+        change_pct = None
+        if previous:
+            change_pct = (Decimal(delta) / abs(Decimal(previous)) * Decimal("100")).quantize(Decimal("0.01"))
+        return {"current": current, "previous": previous, "delta": delta, "change_pct": change_pct}
+
+
+class CardCommissionReportView(SalesMetricsMixin, generics.GenericAPIView):
+    """Card gross, commission and expected net deposit per plan and local day, from the payment rollups."""
+
+    def get(self, request, *args, **kwargs):
+        query_serializer = SalesDateRangeQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        params = query_serializer.validated_data
+        payload, cache_status = cached_metrics_result("card-commissions", params, lambda: self._build_payload(params))
+        response = Response(payload)
+        response[CACHE_STATUS_HEADER] = cache_status
+        return response
+
+    @staticmethod
+    def _row(totals, **keys):
+        gross_amount = money(totals["gross_amount"])
+        commission_amount = money(totals["commission_amount"])
+        return {
+            **keys,
+            "transactions": int(totals["transactions"]),
+            "gross_amount": gross_amount,
+            "commission_amount": commission_amount,
+            "net_expected_deposit": gross_amount - commission_amount,
+        }
+
+    def _build_payload(self, params):
+        date_from = params.get("date_from")
+        date_to = params.get("date_to")
+        rollups = (
+            self._rollup_queryset(SalesDailyPaymentRollup, date_from, date_to, live_day=None)
+            .filter(method=PaymentMethod.CARD)
+            .values("day", "card_plan_code")
+            .annotate(
+                transactions=Sum("transactions"),
+                gross_amount=Sum("total_amount"),
+                commission_amount=Sum("commission_amount"),
+            )
+            .order_by("day", "card_plan_code")
+        )
+        labels = dict(CardCommissionPlan.objects.values_list("code", "label"))
+
+        by_day = []
+        by_plan = {}
+        totals = {}
+        for row in rollups:
+            if not row["transactions"]:
+                continue
+            day = row.pop("day")
+            code = row.pop("card_plan_code")
+            by_day.append(self._row(row, day=day, card_plan_code=code, card_plan_label=labels.get(code, "")))
+            accumulate(by_plan, code, **row)
+            accumulate(totals, "all", **row)
+
+        return {
+            "range": {"date_from": date_from, "date_to": date_to},
+            "by_day": by_day,
+            "by_plan": [
+                self._row(row, card_plan_code=code, card_plan_label=labels.get(code, ""))
+                for code, row in sorted(by_plan.items())
+            ],
+            "totals": self._row(totals.get("all", {"transactions": 0, "gross_amount": 0, "commission_amount": 0})),
         }
-        return Response(report_payload)
@@ -27,6 +27,7 @@ CORS_ALLOWED_ORIGINS = [
 ]
 CORS_ALLOW_CREDENTIALS = env.bool("DJANGO_CORS_ALLOW_CREDENTIALS", default=True)
 CORS_ALLOW_ALL_ORIGINS = env.bool("DJANGO_CORS_ALLOW_ALL_ORIGINS", default=False)
+CORS_EXPOSE_HEADERS = ["X-Metrics-Cache"]
 
 if not DEBUG and SECRET_KEY in {"unsafe-dev-key", "change-me"}:
     raise ImproperlyConfigured("DJANGO_SECRET_KEY must be set to a secure value when DJANGO_DEBUG=False.")
@@ -115,6 +116,12 @@ CACHES = {
 
 PUBLIC_CATALOG_CACHE_TTL_SECONDS = env.int("PUBLIC_CATALOG_CACHE_TTL_SECONDS", default=60)
 PUBLIC_CATALOG_THROTTLE_RATE = env("PUBLIC_CATALOG_THROTTLE_RATE", default="120/min")
+SALES_ROLLUP_LIVE_TODAY = env.bool("SALES_ROLLUP_LIVE_TODAY", default=True)
+METRICS_CACHE_TODAY_TTL_SECONDS = env.int("METRICS_CACHE_TODAY_TTL_SECONDS", default=300)
+METRICS_CACHE_CLOSED_TTL_SECONDS = env.int("METRICS_CACHE_CLOSED_TTL_SECONDS", default=86400)
+LEDGER_CHECKPOINT_SETTLE_MINUTES = env.int("LEDGER_CHECKPOINT_SETTLE_MINUTES", default=60)
+REPORT_SECTION_WORKERS = env.int("REPORT_SECTION_WORKERS", default=4)
+REPORT_SECTION_TIMEOUT_SECONDS = env.float("REPORT_SECTION_TIMEOUT_SECONDS", default=10.0)
 
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"